@@ -11,6 +11,11 @@ def create_app():
 
     app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'default-fallback-secret-key') # Use env var
     app.config['JWT_TOKEN_LOCATION'] = ['headers']
+    app.config['ALLOCATION_POLICY'] = os.getenv('ALLOCATION_POLICY', 'best-fit') # For location-only booking requests
+    app.config['PROFILE_SAMPLE_RATE'] = float(os.getenv('PROFILE_SAMPLE_RATE', '0')) # Share of requests to cProfile (0 = off)
+    app.config['PROFILE_DIR'] = os.getenv('PROFILE_DIR', os.path.join(app.instance_path, 'profiles'))
+    app.config['METRICS_TOKEN'] = os.getenv('METRICS_TOKEN', '') # Bearer token for scraping /api/metrics without an admin login
+    app.logger.setLevel(os.getenv('LOG_LEVEL', 'INFO').upper()) # The app.* module loggers (services, storage, ...) inherit it
     
     # Ensure instance folder exists for SQLite DB
     try:
@@ -23,14 +28,24 @@ def create_app():
     print(f"Database path: {os.path.abspath(DATABASE_FILE)}")
 
 
-    CORS(app, resources={r"/api/*": {"origins": "*"}}) # Allow all origins for dev
-    JWTManager(app)
+    CORS(app, resources={r"/api/*": {"origins": "*"}}, expose_headers=['X-Next-Cursor', 'ETag']) # Allow all origins for dev
+    jwt = JWTManager(app)
+    from .auth import init_app as init_auth
+    init_auth(jwt) # Revoked tokens (logout, per-user revocation) fail verification
+
+    from .metrics import init_app as init_metrics
+    init_metrics(app) # Request timings for /api/metrics, optional sampling profiler
 
     from .routes import api_bp
     app.register_blueprint(api_bp)
     
-    from .services import init_bookings_csv
-    with app.app_context(): # ensure bookings.csv is initialized if needed within app context
-        init_bookings_csv()
+    # Services are built lazily on first use; only record which storage backend to use
+    from .registry import registry
+    from .storage import init_bookings_csv
+    app.config['STORAGE_BACKEND'] = os.getenv('STORAGE_BACKEND', 'csv').lower()
+    registry.configure(app.config['STORAGE_BACKEND'])
+    app.extensions['services'] = registry
+    if app.config['STORAGE_BACKEND'] == 'csv':
+        init_bookings_csv() # Header-only check, cheap regardless of history size
 
     return app
\ No newline at end of file
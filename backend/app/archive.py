@@ -0,0 +1,294 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+import numpy as np
+from .utils import ARCHIVE_DIR, BOOKING_COLUMNS, ACTIVE_BOOKING_STATUSES
+from .records import Booking, MISSING_DAY
+from .interval_index import IntervalIndex
+from .storage import file_stamp
+from .metrics import record_cache_lookup, timed
+
+# Cold storage for finished bookings (cancelled/rejected, or stays that ended
+# a while ago), moved out of bookings.csv so the in-memory working set only
+# holds bookings that can still change or block availability. Each partition
+# is one year (by start date) of bookings in a compressed columnar .npz file,
+# one array per CSV column; manifest.json records per-partition counts and
+# date bounds so most reads (availability of future dates, counts) never open
+# a partition. Partitions are loaded lazily, when history is actually asked
+# for, and only the most recently used few are kept in memory. index.db maps
+# each archived booking_id to its partition (and username), so lookups by id
+# or user open only the partitions that hold matches.
+
+ARCHIVE_CACHE_PARTITIONS = int(os.getenv('ARCHIVE_CACHE_PARTITIONS', '4'))
+MANIFEST_FILE = 'manifest.json'
+INDEX_FILE = 'index.db'
+UNDATED_PARTITION = 0 # Bookings without a valid start date
+
+
+def partition_key(booking):
+    return date.fromordinal(booking.start_day).year if booking.start_day != MISSING_DAY else UNDATED_PARTITION
+
+
+def _partition_stats(bookings):
+    starts = [booking.start_day for booking in bookings if booking.start_day != MISSING_DAY]
+    ends = [booking.end_day for booking in bookings if booking.end_day != MISSING_DAY]
+    active_ends = [booking.end_day for booking in bookings
+                   if booking.status in ACTIVE_BOOKING_STATUSES and booking.end_day != MISSING_DAY]
+    statuses = {}
+    for booking in bookings:
+        statuses[booking.status] = statuses.get(booking.status, 0) + 1
+    return {
+        'count': len(bookings),
+        'statuses': statuses,
+        'min_start_day': min(starts, default=None),
+        'max_end_day': max(ends, default=None),
+        'active_max_end_day': max(active_ends, default=None), # Last day an archived pending/confirmed stay covers
+    }
+
+
+def _atomic_write(path, write):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class BookingArchive:
+    """Year-partitioned columnar archive of bookings that no longer change."""
+
+    def __init__(self, directory=ARCHIVE_DIR, cache_partitions=ARCHIVE_CACHE_PARTITIONS):
+        self.directory = directory
+        self.cache_partitions = cache_partitions
+        self._lock = threading.Lock()
+        self._manifest = None
+        self._manifest_stamp = None
+        self._partitions = OrderedDict() # (year, file stamp) -> [Booking], least recently used first
+        self._active_index = (None, None) # (manifest it was built from, IntervalIndex of archived active stays)
+        self._index_checked = None # Manifest the id index was last checked against
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def partition_path(self, year):
+        return self._path(f'bookings-{year:04d}.npz')
+
+    def manifest(self):
+        """{'partitions': {year: stats}, 'archived_at': epoch or None}; re-read when the file changes."""
+        path = self._path(MANIFEST_FILE)
+        stamp = file_stamp(path)
+        with self._lock:
+            if self._manifest is None or stamp != self._manifest_stamp:
+                manifest = {'partitions': {}, 'archived_at': None}
+                if stamp is not None:
+                    with open(path) as f:
+                        raw = json.load(f)
+                    manifest['archived_at'] = raw.get('archived_at')
+                    manifest['partitions'] = {int(year): stats for year, stats in raw.get('partitions', {}).items()}
+                self._manifest, self._manifest_stamp = manifest, stamp
+            return self._manifest
+
+    def count(self):
+        return sum(stats['count'] for stats in self.manifest()['partitions'].values())
+
+    def status_counts(self):
+        counts = {}
+        for stats in self.manifest()['partitions'].values():
+            for status, count in stats['statuses'].items():
+                counts[status] = counts.get(status, 0) + count
+        return counts
+
+    def active_end_day(self):
+        """Last day covered by any archived pending/confirmed booking (MISSING_DAY if none)."""
+        return max((stats['active_max_end_day'] for stats in self.manifest()['partitions'].values()
+                    if stats['active_max_end_day'] is not None), default=MISSING_DAY)
+
+    def years(self, date_from=None, date_to=None):
+        """Partitions that can hold bookings ending on/after date_from and starting on/before date_to."""
+        years = []
+        for year, stats in sorted(self.manifest()['partitions'].items()):
+            if date_from is not None and (stats['max_end_day'] is None or stats['max_end_day'] < date_from):
+                continue
+            if date_to is not None and (stats['min_start_day'] is None or stats['min_start_day'] > date_to):
+                continue
+            years.append(year)
+        return years
+
+    def _read_partition(self, path):
+        with np.load(path, allow_pickle=False) as data:
+            columns = [data[col].tolist() for col in BOOKING_COLUMNS]
+        return [Booking(*values) for values in zip(*columns)]
+
+    def partition(self, year):
+        """The bookings of one partition, loaded on first use and kept in a small LRU."""
+        path = self.partition_path(year)
+        stamp = file_stamp(path)
+        if stamp is None:
+            return []
+        key = (year, stamp)
+        with self._lock:
+            bookings = self._partitions.get(key)
+            if bookings is not None:
+                self._partitions.move_to_end(key)
+        record_cache_lookup('archive_partition', bookings is not None)
+        if bookings is None:
+            bookings = self._read_partition(path)
+            with self._lock:
+                self._partitions[key] = bookings
+                while len(self._partitions) > self.cache_partitions:
+                    self._partitions.popitem(last=False)
+        return bookings
+
+    def _connect_index(self):
+        conn = sqlite3.connect(self._path(INDEX_FILE))
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS archived_bookings (booking_id TEXT PRIMARY KEY, year INTEGER NOT NULL, username TEXT)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_archived_bookings_username ON archived_bookings (username, year)")
+        return conn
+
+    @staticmethod
+    def _index_rows(year, bookings):
+        return ((booking.booking_id, year, booking.username) for booking in bookings)
+
+    def _index(self):
+        """Connection to the id index, or None while nothing is archived.
+
+        Checked against the manifest's count whenever the manifest changes and
+        rebuilt from the partitions if they disagree (e.g. an older archive, or
+        a crash between writing a partition and the index).
+        """
+        manifest = self.manifest()
+        if not manifest['partitions']:
+            return None
+        conn = self._connect_index()
+        with self._lock:
+            checked = self._index_checked is manifest
+        if not checked:
+            if conn.execute("SELECT COUNT(*) FROM archived_bookings").fetchone()[0] != self.count():
+                with conn:
+                    conn.execute("DELETE FROM archived_bookings")
+                    for year in manifest['partitions']:
+                        conn.executemany("INSERT OR REPLACE INTO archived_bookings VALUES (?, ?, ?)",
+                                         self._index_rows(year, self.partition(year)))
+            with self._lock:
+                self._index_checked = manifest
+        return conn
+
+    def _indexed_years(self, sql, params):
+        conn = self._index()
+        if conn is None:
+            return set()
+        try:
+            return {row[0] for row in conn.execute(sql, params)}
+        finally:
+            conn.close()
+
+    def iter_bookings(self, date_from=None, date_to=None, username=None, skip_ids=()):
+        """Archived bookings, oldest partition first, skipping ids in `skip_ids` (still live copies)."""
+        years = self.years(date_from, date_to)
+        if username is not None: # Only the partitions holding this user's bookings
+            user_years = self._indexed_years("SELECT DISTINCT year FROM archived_bookings WHERE username = ?", (username,))
+            years = [year for year in years if year in user_years]
+        for year in years:
+            for booking in self.partition(year):
+                if username is not None and booking.username != username:
+                    continue
+                if booking.booking_id in skip_ids:
+                    continue
+                yield booking
+
+    def find(self, booking_id):
+        """The archived booking with this id, or None; reads at most the one partition holding it."""
+        for year in self._indexed_years("SELECT year FROM archived_bookings WHERE booking_id = ?", (booking_id,)):
+            for booking in self.partition(year):
+                if booking.booking_id == booking_id:
+                    return booking
+        return None
+
+    def _active_stays(self):
+        """Interval index of archived pending/confirmed stays, built on the first past-date query."""
+        manifest = self.manifest()
+        with self._lock:
+            if self._active_index[0] is manifest:
+                return self._active_index[1]
+        stays = [
+            booking for booking in self.iter_bookings()
+            if booking.status in ACTIVE_BOOKING_STATUSES and booking.start_day != MISSING_DAY and booking.end_day != MISSING_DAY
+        ]
+        index = IntervalIndex()
+        index.load((booking.guesthouse_id, booking.booking_id, booking.start_day, booking.end_day) for booking in stays)
+        with self._lock:
+            self._active_index = (manifest, index)
+        return index
+
+    def active_entries(self, window_start, window_end, guesthouse_id=None, skip_ids=()):
+        """(guesthouse_id, start, end, booking_id) of archived pending/confirmed stays overlapping the window."""
+        if window_start > self.active_end_day(): # The usual case: asking about dates after all archived stays
+            return
+        index = self._active_stays()
+        guesthouse_ids = index.guesthouse_ids() if guesthouse_id is None else (guesthouse_id,)
+        for gid in guesthouse_ids:
+            for start, end, booking_id in index.overlapping_entries(gid, window_start, window_end):
+                if booking_id not in skip_ids:
+                    yield gid, start, end, booking_id
+
+    @timed('archive_write')
+    def add(self, bookings):
+        """Merges bookings into their year partitions, then updates the manifest.
+
+        Each file is replaced atomically. A booking already in a partition is
+        overwritten by the new copy. The id index is updated before the manifest.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        groups = {}
+        for booking in bookings:
+            groups.setdefault(partition_key(booking), []).append(booking)
+        manifest = self.manifest()
+        partitions = dict(manifest['partitions'])
+        index_rows = []
+        for year, new_bookings in groups.items():
+            path = self.partition_path(year)
+            merged = {booking.booking_id: booking for booking in (self._read_partition(path) if os.path.exists(path) else [])}
+            merged.update((booking.booking_id, booking) for booking in new_bookings)
+            merged = list(merged.values())
+            columns = {col: np.array([getattr(booking, col) for booking in merged], dtype=str) for col in BOOKING_COLUMNS}
+            _atomic_write(path, lambda f: np.savez_compressed(f, **columns))
+            partitions[year] = _partition_stats(merged)
+            index_rows.extend(self._index_rows(year, merged))
+        # The index goes between the partitions and the manifest, so a crash leaves a count mismatch that _index() repairs
+        conn = self._connect_index()
+        try:
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO archived_bookings VALUES (?, ?, ?)", index_rows)
+        finally:
+            conn.close()
+        self._write_manifest(partitions, time.time())
+
+    def touch(self):
+        """Records an archival run that found nothing to move."""
+        self._write_manifest(self.manifest()['partitions'], time.time())
+
+    def _write_manifest(self, partitions, archived_at):
+        os.makedirs(self.directory, exist_ok=True)
+        payload = {'archived_at': archived_at, 'partitions': {str(year): stats for year, stats in sorted(partitions.items())}}
+        _atomic_write(self._path(MANIFEST_FILE), lambda f: f.write(json.dumps(payload, indent=1).encode('utf-8')))
+
+
+booking_archive = BookingArchive()
+
+
+if __name__ == '__main__':
+    # Usage (from backend/): python -m app.archive   (e.g. from cron, instead of or as well as ARCHIVE_INTERVAL_HOURS)
+    from . import create_app
+    from .registry import registry
+    from .write_behind import write_behind
+    create_app()
+    moved = registry.bookings.archive_cold_bookings()
+    write_behind.flush()
+    print(f"Archived {moved} bookings into {ARCHIVE_DIR}.")
@@ -1,36 +1,126 @@
-from flask import request, jsonify
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity, get_jwt
+import time
+from flask import request, jsonify, current_app, g
+from flask_jwt_extended import create_access_token, verify_jwt_in_request, get_jwt
+from flask_jwt_extended.config import config
 from functools import wraps
-from .services import user_service
+from .registry import registry as services
+from .passwords import password_verifier, PasswordVerifierBusy, DUMMY_PASSWORD_HASH
+from .metrics import span
+from .tokens import claims_cache, token_revocations
+
+LOGIN_RETRY_AFTER_SECONDS = 1 # Sent with 503s when the password pool is saturated
 
 def login():
     data = request.get_json()
     username = data.get('username')
     password = data.get('password')
 
-    user = user_service.get_user(username)
+    user = services.users.get_user(username)
+
+    valid = False
+    if password:
+        # Unknown users are checked against a dummy hash, so response times do not reveal which usernames exist
+        stored = user['password'] if user else DUMMY_PASSWORD_HASH
+        try:
+            with span('password_check'):
+                valid, upgraded_hash = password_verifier.verify(password, stored)
+        except PasswordVerifierBusy: # Pool full, or the check timed out in the queue
+            response = jsonify({"msg": "Too many login attempts, please try again shortly"})
+            response.headers['Retry-After'] = str(LOGIN_RETRY_AFTER_SECONDS)
+            return response, 503
+        valid = valid and user is not None
+        if valid and upgraded_hash:
+            services.users.set_password_hash(username, upgraded_hash)
 
-    if user and user['password'] == password:
+    if valid:
         additional_claims = {"role": user['role']}
         access_token = create_access_token(identity=username, additional_claims=additional_claims)
         return jsonify(access_token=access_token, username=user['username'], role=user['role']), 200
     
     return jsonify({"msg": "incorrect username or password"}), 401
 
+def logout():
+    """Revokes the token the request was made with."""
+    claims = current_claims()
+    claims_cache.discard(g.auth_token_key)
+    token_revocations.revoke_token(claims['jti'], claims.get('exp'))
+    return jsonify(msg="Logged out."), 200
+
+def revoke_user_tokens(username):
+    """Revokes every token issued to `username` so far; they must log in again."""
+    lifetime = config.access_expires
+    token_revocations.revoke_user(username, None if lifetime is False else lifetime.total_seconds())
+    return jsonify(msg=f"Tokens of {username} revoked."), 200
+
+def init_app(jwt_manager):
+    """Makes full token verification consult the revocation list too."""
+    @jwt_manager.token_in_blocklist_loader
+    def _token_revoked(jwt_header, jwt_data):
+        return token_revocations.is_revoked(jwt_data, config.identity_claim_key)
+
+    @jwt_manager.additional_claims_loader
+    def _issued_at_ms(identity):
+        # Lets a per-user revocation tell apart tokens issued in the same second (see tokens.py)
+        return {'iat_ms': int(time.time() * 1000)}
+
+def _bearer_token():
+    if 'headers' not in config.token_location:
+        return None
+    parts = request.headers.get(config.header_name, '').split()
+    if config.header_type:
+        return parts[1] if len(parts) == 2 and parts[0] == config.header_type else None
+    return parts[0] if len(parts) == 1 else None
+
+def _verify_request():
+    """verify_jwt_in_request(), answered from the claims cache for tokens verified before.
+
+    Returns the token's claims and keeps them for current_claims(). A cached
+    token is still checked against its exp and the revocation list; anything
+    else (missing, malformed, expired, revoked or unknown tokens) goes through
+    full verification and its usual error responses.
+    """
+    with span('jwt_verify'):
+        token = _bearer_token() if request.method not in config.exempt_methods else None
+        key = claims_cache.key(token, current_app.config['JWT_SECRET_KEY']) if token else None
+        claims = claims_cache.get(key) if key else None
+        if claims is not None and token_revocations.is_revoked(claims, config.identity_claim_key):
+            claims_cache.discard(key)
+            claims = None
+        if claims is None:
+            verify_jwt_in_request() # Raises (e.g. RevokedTokenError) with the library's own responses
+            claims = get_jwt()
+            if key:
+                claims_cache.put(key, claims.get('exp'), claims)
+    g.auth_claims, g.auth_token_key = claims, key
+    return claims
+
+def current_claims():
+    """Claims of the token the current request was verified with (set by the decorators below)."""
+    return g.auth_claims
+
+def current_identity():
+    """Identity of the current request's token; use instead of get_jwt_identity(), which misses cache hits."""
+    return current_claims().get(config.identity_claim_key)
+
+def jwt_required():
+    """flask_jwt_extended's jwt_required(), with verified tokens cached and verification timed as the jwt_verify span."""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            _verify_request()
+            return current_app.ensure_sync(fn)(*args, **kwargs)
+        return wrapper
+    return decorator
+
 def admin_required(fn):
     @wraps(fn)
-    @jwt_required()
     def wrapper(*args, **kwargs):
-        claims = get_jwt()
-        if claims.get("role") != "admin":
+        # One layer: verification and the role check share the claims
+        if _verify_request().get("role") != "admin":
             return jsonify(msg="Admins only!"), 403
-        return fn(*args, **kwargs)
+        return current_app.ensure_sync(fn)(*args, **kwargs)
     return wrapper
 
 def user_required(fn): # General user, can be admin too
-    @wraps(fn)
-    @jwt_required()
-    def wrapper(*args, **kwargs):
-        # No specific role check beyond being logged in
-        return fn(*args, **kwargs)
-    return wrapper
\ No newline at end of file
+    # No specific role check beyond being logged in
+    return jwt_required()(fn)
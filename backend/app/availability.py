@@ -0,0 +1,109 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+from .utils import format_day
+from .metrics import record_cache_lookup
+
+MAX_WINDOW_DAYS = 366 # Longest window /api/availability will compute in one request
+
+
+def occupancy_matrix(guesthouse_ids, booking_guesthouse_ids, starts, ends, window_start, window_end):
+    """Per-day count of active bookings for each guesthouse over [window_start, window_end].
+
+    All dates are day ordinals. Each booking adds +1 at its (clipped) first day
+    and -1 the day after its last one in a difference array; a cumulative sum
+    along the day axis then gives the occupancy, with no per-day Python loop.
+    Returns an int array of shape (len(guesthouse_ids), number of days).
+    """
+    days = window_end - window_start + 1
+    diff = np.zeros((len(guesthouse_ids), days + 1), dtype=np.int32)
+    if len(booking_guesthouse_ids) and len(guesthouse_ids):
+        rows = _row_numbers(guesthouse_ids, booking_guesthouse_ids)
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.asarray(ends, dtype=np.int64)
+        keep = (rows >= 0) & (starts <= window_end) & (ends >= window_start)
+        rows = rows[keep]
+        first = np.clip(starts[keep], window_start, window_end) - window_start
+        after_last = np.clip(ends[keep], window_start, window_end) - window_start + 1
+        np.add.at(diff, (rows, first), 1)
+        np.add.at(diff, (rows, after_last), -1)
+    return np.cumsum(diff[:, :-1], axis=1)
+
+
+def _row_numbers(guesthouse_ids, booking_guesthouse_ids):
+    """Position of each booking's guesthouse in guesthouse_ids (-1 if absent), via a sorted lookup."""
+    ids = np.asarray(guesthouse_ids, dtype=str)
+    order = np.argsort(ids)
+    sorted_ids = ids[order]
+    wanted = np.asarray(booking_guesthouse_ids, dtype=str)
+    pos = np.minimum(np.searchsorted(sorted_ids, wanted), len(sorted_ids) - 1)
+    return np.where(sorted_ids[pos] == wanted, order[pos], -1)
+
+
+class WindowCache:
+    """Small thread-safe LRU cache for computed availability windows."""
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+availability_cache = WindowCache()
+
+
+def get_availability(booking_service, guesthouse_service, window_start, window_end, location=None):
+    """Free/busy matrix for every guesthouse (optionally in one location) over a date window.
+
+    Results are cached per window and location, keyed on the booking and
+    guesthouse data versions so any change invalidates them.
+    """
+    cache_key = (
+        window_start, window_end, (location or '').lower(),
+        booking_service.current_version(), guesthouse_service.current_version()
+    )
+    cached = availability_cache.get(cache_key)
+    record_cache_lookup('availability', cached is not None)
+    if cached is not None:
+        return cached
+
+    guesthouses = guesthouse_service.get_all_guesthouses()
+    if location:
+        guesthouses = [g for g in guesthouses if str(g.get('location', '')).lower() == location.lower()]
+    guesthouse_ids = [str(g['id']) for g in guesthouses]
+
+    booking_guesthouse_ids, starts, ends = booking_service.active_intervals(window_start, window_end)
+    occupancy = occupancy_matrix(guesthouse_ids, booking_guesthouse_ids, starts, ends, window_start, window_end)
+
+    result = {
+        'from': format_day(window_start),
+        'to': format_day(window_end),
+        'dates': [format_day(day) for day in range(window_start, window_end + 1)],
+        'guesthouses': [
+            {
+                'id': str(g['id']),
+                'name': g.get('name'),
+                'location': g.get('location'),
+                'capacity': g.get('capacity'),
+                'occupancy': row.tolist(), # Active (pending + confirmed) bookings per day
+                'available': not row.any(), # Free for the whole window
+            }
+            for g, row in zip(guesthouses, occupancy)
+        ],
+    }
+    availability_cache.put(cache_key, result)
+    return result
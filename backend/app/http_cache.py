@@ -0,0 +1,65 @@
+import threading
+from collections import OrderedDict
+from flask import current_app, request, Response
+from .metrics import record_cache_lookup
+
+# Conditional GETs for the listing endpoints. Each response's ETag is built
+# from the data versions the services keep (per collection, and per user for
+# a user's own bookings), so checking it never touches the data. Serialized
+# JSON bodies are cached under the same ETag: a mutation bumps the version,
+# the ETag changes and the stale body is simply replaced on the next request.
+
+RESPONSE_CACHE_SIZE = 1024 # Cached bodies (one per listing, one per user for /bookings/my)
+
+
+class JsonResponseCache:
+    """LRU of pre-serialized JSON response bodies: key -> (etag, bytes)."""
+
+    def __init__(self, max_entries=RESPONSE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_build(self, key, etag, build):
+        with self._lock:
+            entry = self._entries.get(key)
+            hit = entry is not None and entry[0] == etag
+            if hit:
+                self._entries.move_to_end(key)
+        record_cache_lookup('http_json', hit)
+        if hit:
+            return entry[1]
+        # Same bytes jsonify() would send
+        body = current_app.json.response(build()).get_data()
+        with self._lock:
+            self._entries[key] = (etag, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return body
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+response_cache = JsonResponseCache()
+
+
+def make_etag(*parts):
+    return '-'.join(str(part) for part in parts)
+
+
+def conditional_json(key, etag, build):
+    """304 if the client already has `etag`, else the cached (or freshly built) JSON body.
+
+    The caller must read the versions in `etag` before `build` runs, so a body
+    is never older than the ETag it is served with.
+    """
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = Response(response_cache.get_or_build(key, etag, build), mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache' # Always revalidate; 304s are cheap
+    return response
@@ -0,0 +1,185 @@
+import random
+
+_priorities = random.Random()
+
+
+class _Node:
+    __slots__ = ('key', 'start', 'end', 'booking_id', 'priority', 'left', 'right', 'max_end')
+
+    def __init__(self, start, end, booking_id):
+        self.key = (start, booking_id)
+        self.start = start
+        self.end = end
+        self.booking_id = booking_id
+        self.priority = _priorities.random()
+        self.left = None
+        self.right = None
+        self.max_end = end
+
+
+def _update(node):
+    max_end = node.end
+    if node.left is not None and node.left.max_end > max_end:
+        max_end = node.left.max_end
+    if node.right is not None and node.right.max_end > max_end:
+        max_end = node.right.max_end
+    node.max_end = max_end
+
+
+def _split(node, key):
+    """Splits a subtree into (keys < key, keys >= key)."""
+    if node is None:
+        return None, None
+    if node.key < key:
+        node.right, right = _split(node.right, key)
+        _update(node)
+        return node, right
+    left, node.left = _split(node.left, key)
+    _update(node)
+    return left, node
+
+
+def _merge(left, right):
+    """Joins two subtrees where every key in `left` is below every key in `right`."""
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if left.priority > right.priority:
+        left.right = _merge(left.right, right)
+        _update(left)
+        return left
+    right.left = _merge(left, right.left)
+    _update(right)
+    return right
+
+
+def _insert(node, new):
+    if node is None:
+        return new
+    if new.priority > node.priority:
+        new.left, new.right = _split(node, new.key)
+        _update(new)
+        return new
+    if new.key < node.key:
+        node.left = _insert(node.left, new)
+    else:
+        node.right = _insert(node.right, new)
+    _update(node)
+    return node
+
+
+def _delete(node, key):
+    if node is None:
+        return None
+    if node.key == key:
+        return _merge(node.left, node.right)
+    if key < node.key:
+        node.left = _delete(node.left, key)
+    else:
+        node.right = _delete(node.right, key)
+    _update(node)
+    return node
+
+
+def _build(nodes, lo, hi, depth, height):
+    """Balanced subtree of nodes[lo:hi] (sorted by key); priorities fall with depth so the heap order holds."""
+    if lo >= hi:
+        return None
+    mid = (lo + hi) // 2
+    node = nodes[mid]
+    node.priority = 1 - (depth + _priorities.random()) / height
+    node.left = _build(nodes, lo, mid, depth + 1, height)
+    node.right = _build(nodes, mid + 1, hi, depth + 1, height)
+    _update(node)
+    return node
+
+
+class IntervalIndex:
+    """In-memory index of booked date intervals, keyed by guesthouse.
+
+    Each guesthouse has an interval tree: a treap ordered by (start, booking_id)
+    whose nodes also hold the largest end date in their subtree. Adding or
+    removing a booking costs O(log n) expected, and an overlap query skips
+    every subtree that ends before the requested start or begins after the
+    requested end, so it visits O(log n) nodes plus the ones it reports.
+    Dates are (start, end) day ordinals, both inclusive.
+    """
+
+    def __init__(self):
+        self._roots = {}      # guesthouse_id -> root _Node
+        self._bookings = {}   # booking_id -> (guesthouse_id, start, end)
+
+    def __len__(self):
+        return len(self._bookings)
+
+    def __contains__(self, booking_id):
+        return booking_id in self._bookings
+
+    def clear(self):
+        self._roots.clear()
+        self._bookings.clear()
+
+    def load(self, entries):
+        """Replaces the index with (guesthouse_id, booking_id, start, end) entries (unique booking_ids).
+
+        Builds balanced trees in O(n log n) for the sort, instead of n separate adds.
+        """
+        self.clear()
+        by_guesthouse = {}
+        for guesthouse_id, booking_id, start, end in entries:
+            guesthouse_id = str(guesthouse_id)
+            by_guesthouse.setdefault(guesthouse_id, []).append(_Node(start, end, booking_id))
+            self._bookings[booking_id] = (guesthouse_id, start, end)
+        for guesthouse_id, nodes in by_guesthouse.items():
+            nodes.sort(key=lambda node: node.key)
+            self._roots[guesthouse_id] = _build(nodes, 0, len(nodes), 0, len(nodes).bit_length() + 1)
+
+    def add(self, guesthouse_id, booking_id, start, end):
+        """Adds (or moves) a booking interval. Dates are day ordinals."""
+        if booking_id in self._bookings:
+            self.remove(booking_id)
+        guesthouse_id = str(guesthouse_id)
+        self._roots[guesthouse_id] = _insert(self._roots.get(guesthouse_id), _Node(start, end, booking_id))
+        self._bookings[booking_id] = (guesthouse_id, start, end)
+
+    def remove(self, booking_id):
+        """Removes a booking interval. Returns False if it was not indexed."""
+        location = self._bookings.pop(booking_id, None)
+        if location is None:
+            return False
+        guesthouse_id, start, _ = location
+        root = _delete(self._roots[guesthouse_id], (start, booking_id))
+        if root is None:
+            del self._roots[guesthouse_id]
+        else:
+            self._roots[guesthouse_id] = root
+        return True
+
+    def guesthouse_ids(self):
+        return list(self._roots)
+
+    def overlapping(self, guesthouse_id, start, end):
+        """Yields booking_ids whose interval overlaps [start, end]."""
+        for _, _, booking_id in self.overlapping_entries(guesthouse_id, start, end):
+            yield booking_id
+
+    def overlapping_entries(self, guesthouse_id, start, end):
+        """Yields (start, end, booking_id) for intervals overlapping [start, end]."""
+        stack = [self._roots.get(str(guesthouse_id))]
+        while stack:
+            node = stack.pop()
+            if node is None or node.max_end < start:
+                continue # Nothing in this subtree reaches the requested start
+            stack.append(node.left)
+            if node.start <= end: # Otherwise this node and everything right of it start too late
+                if node.end >= start:
+                    yield node.start, node.end, node.booking_id
+                stack.append(node.right)
+
+    def overlaps(self, guesthouse_id, start, end, exclude=None):
+        """True if any indexed interval (other than `exclude`) overlaps [start, end]."""
+        for booking_id in self.overlapping(guesthouse_id, start, end):
+            if booking_id != exclude:
+                return True
+        return False
@@ -0,0 +1,203 @@
+import cProfile
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+# In-process counters and timing histograms, rendered in the Prometheus text
+# format by /api/metrics. Each worker process keeps its own numbers, so under
+# gunicorn every worker reports separately (scrape them per process or add a
+# `worker` label at the collector).
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRIC_HELP = {
+    'guesthouse_http_request_duration_seconds': ('histogram', 'Time spent in a route handler, by endpoint, method and status.'),
+    'guesthouse_span_seconds': ('histogram', 'Time spent in instrumented hot-path sections (availability check, CSV writes, SQLite export and sync, report summaries, JWT verification).'),
+    'guesthouse_lock_wait_seconds': ('histogram', 'Time spent waiting to acquire the bookings lock.'),
+    'guesthouse_cache_requests_total': ('counter', 'Cache lookups by cache and result (hit or miss).'),
+    'guesthouse_profiles_total': ('counter', 'Requests captured by the sampling profiler.'),
+    'guesthouse_bookings': ('gauge', 'Current bookings by status.'),
+    'guesthouse_write_behind_pending': ('gauge', 'Background tasks queued or running.'),
+    'guesthouse_write_behind_tasks_total': ('counter', 'Background tasks run, by task and result (ok or error).'),
+}
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels_text(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+
+def _number(value):
+    if isinstance(value, float):
+        return repr(value) if value != int(value) or abs(value) >= 1e15 else str(int(value))
+    return str(value)
+
+
+class Metrics:
+    """Thread-safe counters and fixed-bucket histograms keyed by (name, labels)."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counters = {}   # (name, sorted label pairs) -> value
+        self._histograms = {} # (name, sorted label pairs) -> [bucket counts..., sum, count]
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            series = self._histograms.get(key)
+            if series is None:
+                series = self._histograms[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render(self, gauges=None):
+        """Prometheus text exposition (format 0.0.4).
+
+        `gauges` maps a gauge name to a list of (labels dict, value) sampled by the caller.
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: list(series) for key, series in self._histograms.items()}
+        families = {} # name -> [(labels, lines)], so each series keeps its lines together and in order
+        for (name, labels), value in counters.items():
+            families.setdefault(name, []).append((labels, [f'{name}{_labels_text(labels)} {_number(value)}']))
+        for (name, labels), series in histograms.items():
+            lines = [
+                f'{name}_bucket{_labels_text(labels, [("le", _number(float(bound)))])} {count}'
+                for bound, count in zip(self.buckets, series)
+            ]
+            lines.append(f'{name}_bucket{_labels_text(labels, [("le", "+Inf")])} {series[-1]}')
+            lines.append(f'{name}_sum{_labels_text(labels)} {_number(series[-2])}')
+            lines.append(f'{name}_count{_labels_text(labels)} {series[-1]}')
+            families.setdefault(name, []).append((labels, lines))
+        for name, samples in (gauges or {}).items():
+            for labels, value in samples:
+                labels = tuple(sorted((key, str(label_value)) for key, label_value in labels.items()))
+                families.setdefault(name, []).append((labels, [f'{name}{_labels_text(labels)} {_number(value)}']))
+
+        output = []
+        for name in sorted(families):
+            kind, help_text = METRIC_HELP.get(name, ('untyped', name))
+            output.append(f'# HELP {name} {help_text}')
+            output.append(f'# TYPE {name} {kind}')
+            for _, lines in sorted(families[name], key=lambda entry: [(key, str(value)) for key, value in entry[0]]):
+                output.extend(lines)
+        return '\n'.join(output) + '\n'
+
+
+metrics = Metrics()
+
+
+@contextmanager
+def span(name):
+    """Times the enclosed block into guesthouse_span_seconds{span=name}."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.observe('guesthouse_span_seconds', time.perf_counter() - started, span=name)
+
+
+def timed(name):
+    """Decorator form of span()."""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_cache_lookup(cache, hit):
+    metrics.inc('guesthouse_cache_requests_total', cache=cache, result='hit' if hit else 'miss')
+
+
+class RequestProfiler:
+    """Profiles a random sample of requests with cProfile and dumps .prof files.
+
+    Only one request is profiled at a time (cProfile cannot profile two
+    threads at once); requests sampled while another profile runs are skipped.
+    Inspect the output with `python -m pstats <file>` or snakeviz.
+    """
+
+    def __init__(self, sample_rate, output_dir):
+        self.sample_rate = sample_rate
+        self.output_dir = output_dir
+        self._busy = threading.Lock()
+
+    def start(self):
+        if random.random() >= self.sample_rate or not self._busy.acquire(blocking=False):
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError: # Another profiler (e.g. a debugger) is already active
+            self._busy.release()
+            return None
+        return profiler
+
+    def stop(self, profiler, endpoint):
+        try:
+            profiler.disable()
+            os.makedirs(self.output_dir, exist_ok=True)
+            safe_endpoint = re.sub(r'[^A-Za-z0-9_.-]', '_', endpoint or 'unmatched')
+            path = os.path.join(self.output_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{time.time_ns() // 1000000 % 1000:03d}-{os.getpid()}-{safe_endpoint}.prof")
+            profiler.dump_stats(path)
+            metrics.inc('guesthouse_profiles_total', endpoint=endpoint or 'unmatched')
+        finally:
+            self._busy.release()
+
+
+def init_app(app):
+    """Times every request and, if PROFILE_SAMPLE_RATE > 0, profiles a sample of them."""
+    from flask import g, request
+
+    sample_rate = float(app.config.get('PROFILE_SAMPLE_RATE') or 0)
+    profiler = RequestProfiler(sample_rate, app.config['PROFILE_DIR']) if sample_rate > 0 else None
+
+    @app.before_request
+    def _start_request_timer():
+        g.request_started = time.perf_counter()
+        g.profiler = profiler.start() if profiler else None
+
+    @app.after_request
+    def _record_request(response):
+        started = g.pop('request_started', None)
+        if started is not None:
+            metrics.observe(
+                'guesthouse_http_request_duration_seconds', time.perf_counter() - started,
+                endpoint=request.endpoint or 'unmatched', method=request.method, status=response.status_code
+            )
+        return response
+
+    @app.teardown_request
+    def _stop_profiler(exc):
+        # Runs even when the handler raised, so the profiler slot is always released
+        active_profile = g.pop('profiler', None)
+        if active_profile is not None:
+            profiler.stop(active_profile, request.endpoint)
@@ -0,0 +1,171 @@
+import base64
+import csv
+import hashlib
+import hmac
+import os
+import secrets
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from .storage import InterProcessLock, file_stamp
+
+# Stored format: pbkdf2_sha256$<iterations>$<salt>$<hash>  (salt and hash are base64)
+# Anything else in the password column is treated as a legacy plaintext password.
+HASH_ALGORITHM = 'pbkdf2_sha256'
+PASSWORD_HASH_ITERATIONS = int(os.getenv('PASSWORD_HASH_ITERATIONS', '600000'))
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv('PASSWORD_HASH_MAX_PENDING', str(PASSWORD_HASH_WORKERS * 8)))
+PASSWORD_HASH_WAIT_SECONDS = float(os.getenv('PASSWORD_HASH_WAIT_SECONDS', '10'))
+
+
+class PasswordVerifierBusy(Exception):
+    """Raised when the verification pool is saturated (e.g. during a login storm)."""
+
+
+class PasswordCheckTimeout(PasswordVerifierBusy):
+    """Raised when a queued check did not finish within the wait limit."""
+
+
+def _b64(raw):
+    return base64.b64encode(raw).decode('ascii').rstrip('=')
+
+
+def _unb64(text):
+    return base64.b64decode(text + '=' * (-len(text) % 4))
+
+
+# Checked instead when the username is unknown, so a login for a missing user
+# costs the same PBKDF2 work as one for an existing user. It matches no password.
+DUMMY_PASSWORD_HASH = f"{HASH_ALGORITHM}${PASSWORD_HASH_ITERATIONS}${_b64(bytes(16))}${_b64(bytes(32))}"
+
+
+def is_password_hash(stored):
+    return isinstance(stored, str) and stored.startswith(HASH_ALGORITHM + '$')
+
+
+def hash_password(password, iterations=None):
+    iterations = iterations or PASSWORD_HASH_ITERATIONS
+    salt = secrets.token_bytes(16)
+    digest = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, iterations)
+    return f"{HASH_ALGORITHM}${iterations}${_b64(salt)}${_b64(digest)}"
+
+
+def verify_password(password, stored):
+    """Returns (is_valid, needs_rehash). Plaintext legacy passwords always need a rehash."""
+    if password is None or stored is None:
+        return False, False
+    if not is_password_hash(stored):
+        return hmac.compare_digest(str(password).encode('utf-8'), str(stored).encode('utf-8')), True
+    try:
+        _, iterations, salt, expected = stored.split('$')
+        iterations = int(iterations)
+        digest = hashlib.pbkdf2_hmac('sha256', str(password).encode('utf-8'), _unb64(salt), iterations)
+    except (ValueError, TypeError):
+        return False, False
+    return hmac.compare_digest(digest, _unb64(expected)), iterations != PASSWORD_HASH_ITERATIONS
+
+
+class PasswordVerifier:
+    """Runs password checks on a small bounded thread pool.
+
+    pbkdf2_hmac releases the GIL, so checks use real cores without tying up
+    more request threads than the pool size. When more than `max_pending`
+    checks are queued or running, further logins fail fast with
+    PasswordVerifierBusy instead of piling up behind the storm. A slot is
+    freed when its check finishes, not when the caller stops waiting, so
+    callers that time out cannot push the pool past the bound.
+    """
+
+    def __init__(self, workers=PASSWORD_HASH_WORKERS, max_pending=PASSWORD_HASH_MAX_PENDING,
+                 timeout=PASSWORD_HASH_WAIT_SECONDS):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self.timeout = timeout
+
+    def _check(self, password, stored):
+        valid, needs_rehash = verify_password(password, stored)
+        # Upgrade plaintext or outdated hashes while we are already on the pool
+        return valid, hash_password(password) if valid and needs_rehash else None
+
+    def verify(self, password, stored, timeout=None):
+        """Returns (is_valid, upgraded_hash_or_None).
+
+        Raises PasswordVerifierBusy when the pool is full, or PasswordCheckTimeout
+        (a PasswordVerifierBusy) when the check takes longer than `timeout`.
+        """
+        if not self._slots.acquire(blocking=False):
+            raise PasswordVerifierBusy()
+        try:
+            future = self._executor.submit(self._check, password, stored)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout if timeout is None else timeout)
+        except FutureTimeoutError:
+            future.cancel() # Frees the slot now if the check has not started yet
+            raise PasswordCheckTimeout()
+
+
+password_verifier = PasswordVerifier()
+
+
+def _rewrite_users_file(path, update):
+    """Atomically rewrites a users CSV, calling update(rows) under the file's lock.
+
+    Returns (update's result, stamp before, stamp after); the file is left
+    untouched when update returns a falsy result.
+    """
+    with InterProcessLock(f"{path}.lock").hold():
+        before = file_stamp(path)
+        with open(path, newline='') as f:
+            reader = csv.DictReader(f)
+            fieldnames = reader.fieldnames
+            rows = list(reader)
+        result = update(rows)
+        if not result:
+            return result, before, before
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames, lineterminator='\n')
+            writer.writeheader()
+            writer.writerows(rows)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        return result, before, file_stamp(path)
+
+
+def hash_users_file(path):
+    """Replaces plaintext passwords in a users CSV with PBKDF2 hashes (atomic rewrite)."""
+    def hash_plaintext(rows):
+        hashed = 0
+        for row in rows:
+            if row.get('password') and not is_password_hash(row['password']):
+                row['password'] = hash_password(row['password'])
+                hashed += 1
+        return hashed
+    return _rewrite_users_file(path, hash_plaintext)[0]
+
+
+def store_password_hash(path, username, password_hash):
+    """Writes an upgraded hash for `username` into a users CSV.
+
+    Returns (stamp before, stamp after) the rewrite, both None-safe file stamps;
+    they are equal when the user was not found.
+    """
+    def replace(rows):
+        for row in rows:
+            if row.get('username') == username: # First row wins, as in UserService
+                row['password'] = password_hash
+                return True
+        return False
+    _, before, after = _rewrite_users_file(path, replace)
+    return before, after
+
+
+if __name__ == '__main__':
+    # Usage (from backend/): python -m app.passwords data/users.csv
+    users_path = sys.argv[1] if len(sys.argv) > 1 else 'data/users.csv'
+    print(f"Hashed {hash_users_file(users_path)} plaintext passwords in {users_path}.")
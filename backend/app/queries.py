@@ -0,0 +1,89 @@
+import base64
+import json
+from .utils import date_string_to_ordinal
+
+# Query options shared by the booking list endpoints (/api/admin/bookings/all, /api/bookings/my):
+#   limit=<n>              page size (keyset pagination, next page cursor in X-Next-Cursor)
+#   after=<cursor>         continue after the last row of the previous page
+#   guesthouse_id=<id>     only this guesthouse
+#   status=<s>[,<s>...]    only these statuses
+#   from=DD-MM-YYYY        only bookings ending on or after this date
+#   to=DD-MM-YYYY          only bookings starting on or before this date
+#   sort=[-]<field>        created (default), start_date, end_date or booked_at; '-' for descending
+#                          (created orders by booking date; ties are broken by booking_id on every field)
+#   format=ndjson          stream one JSON object per line instead of a JSON array
+
+SORT_FIELDS = ('created', 'start_date', 'end_date', 'booked_at')
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(sort_day, booking_id):
+    """Cursor for the row after (sort day ordinal, booking_id): both stable across compaction and archival."""
+    raw = json.dumps([sort_day, booking_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor; raises ValueError for anything it could not have produced."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        value = json.loads(raw)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid 'after' cursor.")
+    # Every sort field is a day ordinal (int); bool is an int subclass but never a day
+    if not (isinstance(value, list) and len(value) == 2 and type(value[0]) is int and isinstance(value[1], str)):
+        raise ValueError("Invalid 'after' cursor.")
+    return value[0], value[1]
+
+
+class BookingQuery:
+    def __init__(self, limit=None, after=None, guesthouse_id=None, statuses=None,
+                 date_from=None, date_to=None, sort='created', descending=False, stream=False):
+        self.limit = limit
+        self.after = after # (sort day ordinal, booking_id) or None
+        self.guesthouse_id = guesthouse_id
+        self.statuses = statuses
+        self.date_from = date_from # Day ordinal or None
+        self.date_to = date_to     # Day ordinal or None
+        self.sort = sort
+        self.descending = descending
+        self.stream = stream
+
+    @classmethod
+    def from_args(cls, args):
+        """Builds a query from request.args. Raises ValueError with a client-facing message."""
+        query = cls()
+        if args.get('limit'):
+            try:
+                query.limit = int(args['limit'])
+            except ValueError:
+                raise ValueError("'limit' must be an integer.")
+            if not 1 <= query.limit <= MAX_PAGE_SIZE:
+                raise ValueError(f"'limit' must be between 1 and {MAX_PAGE_SIZE}.")
+        if args.get('after'):
+            query.after = decode_cursor(args['after'])
+        query.guesthouse_id = args.get('guesthouse_id') or None
+        if args.get('status'):
+            query.statuses = [s.strip() for s in args['status'].split(',') if s.strip()]
+        for arg, attr in (('from', 'date_from'), ('to', 'date_to')):
+            if args.get(arg):
+                ordinal = date_string_to_ordinal(args[arg])
+                if ordinal is None:
+                    raise ValueError(f"Invalid '{arg}' date. Use DD-MM-YYYY")
+                setattr(query, attr, ordinal)
+        sort = args.get('sort', 'created')
+        query.descending = sort.startswith('-')
+        query.sort = sort.lstrip('-')
+        if query.sort not in SORT_FIELDS:
+            raise ValueError(f"'sort' must be one of: {', '.join(SORT_FIELDS)}.")
+        fmt = args.get('format', 'json')
+        if fmt not in ('json', 'ndjson'):
+            raise ValueError("'format' must be json or ndjson.")
+        query.stream = fmt == 'ndjson'
+        return query
+
+    def is_default(self):
+        """True when the query asks for the whole list in creation order (the legacy response)."""
+        return (self.limit is None and self.after is None and self.guesthouse_id is None
+                and not self.statuses and self.date_from is None and self.date_to is None
+                and self.sort == 'created' and not self.descending)
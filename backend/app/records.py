@@ -0,0 +1,89 @@
+import sys
+from .utils import BOOKING_COLUMNS, date_string_to_ordinal
+
+# Compact in-memory records used by the CSV-backed services instead of pandas
+# DataFrames. Guesthouse ids, usernames, statuses and dates repeat across
+# thousands of bookings, so they are interned and every record shares one copy
+# of each. Dates are normalized once, when the record is built: the day ordinal
+# (date.toordinal(), -1 if invalid) is what comparisons use, and the DD-MM-YYYY
+# string is kept only for the API and the CSV.
+
+MISSING_DAY = -1
+
+
+def _text(value):
+    # NaN (float) and None are both treated as empty strings, like the CSV writer does
+    return '' if value is None or value != value else str(value)
+
+
+def _day(date_str):
+    ordinal = date_string_to_ordinal(date_str)
+    return MISSING_DAY if ordinal is None else ordinal
+
+
+class Booking:
+    """One booking's current state. Treated as immutable: status changes build a new record."""
+
+    __slots__ = ('booking_id', 'guesthouse_id', 'username', 'start_date', 'end_date', 'status', 'booked_at',
+                 'start_day', 'end_day', 'booked_day')
+
+    # Sort field (see queries.SORT_FIELDS) -> slot holding its day ordinal
+    DAY_SLOTS = {'start_date': 'start_day', 'end_date': 'end_day', 'booked_at': 'booked_day'}
+
+    def __init__(self, booking_id, guesthouse_id, username, start_date, end_date, status, booked_at):
+        self.booking_id = booking_id
+        self.guesthouse_id = sys.intern(guesthouse_id)
+        self.username = sys.intern(username)
+        self.start_date = sys.intern(start_date)
+        self.end_date = sys.intern(end_date)
+        self.status = sys.intern(status)
+        self.booked_at = sys.intern(booked_at)
+        self.start_day = _day(start_date)
+        self.end_day = _day(end_date)
+        self.booked_day = _day(booked_at)
+
+    @classmethod
+    def from_dict(cls, record):
+        """Builds a booking from a CSV row or API dict; missing columns become ''."""
+        return cls(*(_text(record.get(col)) for col in BOOKING_COLUMNS))
+
+    def with_status(self, status):
+        return Booking(self.booking_id, self.guesthouse_id, self.username,
+                       self.start_date, self.end_date, status, self.booked_at)
+
+    def day(self, field):
+        """Day ordinal of a date field ('start_date', 'end_date' or 'booked_at')."""
+        return getattr(self, self.DAY_SLOTS[field])
+
+    def to_dict(self):
+        return {
+            'booking_id': self.booking_id,
+            'guesthouse_id': self.guesthouse_id,
+            'username': self.username,
+            'start_date': self.start_date,
+            'end_date': self.end_date,
+            'status': self.status,
+            'booked_at': self.booked_at,
+        }
+
+
+class Guesthouse:
+    __slots__ = ('id', 'location', 'name', 'capacity')
+
+    def __init__(self, id, location, name, capacity):
+        self.id = sys.intern(id)
+        self.location = location
+        self.name = name
+        self.capacity = capacity
+
+    @classmethod
+    def from_dict(cls, record):
+        """Builds a guesthouse from a guesthouses.csv row; an unparseable capacity counts as 0."""
+        try:
+            capacity = int(float(record.get('capacity') or 0))
+        except ValueError:
+            capacity = 0
+        return cls(_text(record.get('id')), _text(record.get('location')), _text(record.get('name')), capacity)
+
+    def to_dict(self):
+        return {'id': self.id, 'location': self.location, 'name': self.name, 'capacity': self.capacity}
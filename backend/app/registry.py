@@ -0,0 +1,80 @@
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Service construction is deferred until a request needs it, so importing the
+# app (CSV loads, the initial SQLite sync) costs nothing up front.
+
+
+class ServiceRegistry:
+    """Builds the user, guesthouse and booking services on first use.
+
+    create_app() only records the storage backend; each service (and its CSV
+    load / DB sync) is constructed the first time a request needs it.
+    STORAGE_BACKEND=csv (default) keeps the CSV files as the source of truth
+    with SQLite as an export; STORAGE_BACKEND=sqlite reads and writes the
+    SQLite DB directly.
+    """
+
+    def __init__(self):
+        self.backend = None
+        self._services = {}
+        self._lock = threading.RLock()
+
+    def configure(self, backend):
+        with self._lock:
+            self.backend = (backend or 'csv').lower()
+
+    def _build(self, name):
+        backend = self.backend or os.getenv('STORAGE_BACKEND', 'csv').lower()
+        logger.debug("Building %s service (%s backend).", name, backend)
+        if backend == 'sqlite':
+            from .sqlite_services import SqliteUserService, SqliteGuesthouseService, SqliteBookingService
+            return {'users': SqliteUserService, 'guesthouses': SqliteGuesthouseService,
+                    'bookings': SqliteBookingService}[name]()
+        from .services import UserService, GuesthouseService, BookingService
+        if name == 'users':
+            return UserService()
+        if name == 'guesthouses':
+            return GuesthouseService()
+        return BookingService(self.guesthouses, self.users) # This will now also call _sync_db_on_init
+
+    def _get(self, name):
+        service = self._services.get(name)
+        if service is None:
+            with self._lock:
+                service = self._services.get(name)
+                if service is None:
+                    service = self._build(name)
+                    self._services[name] = service
+        return service
+
+    @property
+    def users(self):
+        return self._get('users')
+
+    @property
+    def guesthouses(self):
+        return self._get('guesthouses')
+
+    @property
+    def bookings(self):
+        return self._get('bookings')
+
+    def get_if_built(self, name):
+        """The named service if it has been built already, else None (never triggers a build)."""
+        return self._services.get(name)
+
+    def warm_up(self):
+        """Builds every service now instead of on the first request."""
+        return self.users, self.guesthouses, self.bookings
+
+    def reset(self):
+        """Drops the built services so the next access reloads them."""
+        with self._lock:
+            self._services = {}
+
+
+registry = ServiceRegistry()
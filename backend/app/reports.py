@@ -0,0 +1,400 @@
+import sqlite3
+from datetime import date, datetime
+import numpy as np
+from .utils import BOOKING_COLUMNS, date_string_to_ordinal
+from .availability import WindowCache
+from .metrics import record_cache_lookup, timed
+
+# Aggregate reports (occupancy, lead time, approval turnaround) served from
+# summary tables kept next to the bookings table of the reporting DB (the
+# SQLite export in csv mode, the primary store in sqlite mode). The summaries
+# are maintained incrementally: each sync that upserts booking rows (csv mode),
+# or each booking transaction (sqlite mode), subtracts the old version of every
+# changed row and adds the new one, in the same transaction, so a report only
+# ever reads a few hundred aggregated rows. Full rebuilds are only for exports,
+# imports and summaries from an older version.
+#
+# bookings.csv has no decision timestamp, so turnaround is measured from the
+# pending -> confirmed/rejected transitions the reporting DB sees: in csv mode
+# that is when the sync picks the change up (the write-behind delay after it
+# happened). Decisions made before this table existed are not in the report.
+
+REPORT_SCHEMA_VERSION = '2' # Bump when the summaries change meaning or upkeep; older DBs are then rebuilt
+DECISION_STATUSES = ('confirmed', 'rejected')
+MAX_REPORT_MONTHS = 120
+DEFAULT_REPORT_MONTHS = 12
+LEAD_TIME_BUCKETS = (0, 1, 7, 14, 30, 60, 90) # Lower bounds in days; negative lead times get their own bucket
+TURNAROUND_BUCKETS = (0, 1, 2, 3, 7, 14)
+
+REPORT_TABLES_SQL = """
+CREATE TABLE IF NOT EXISTS report_occupancy (
+    month INTEGER NOT NULL,
+    guesthouse_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    days INTEGER NOT NULL,
+    bookings INTEGER NOT NULL,
+    PRIMARY KEY (month, guesthouse_id, status)
+);
+CREATE TABLE IF NOT EXISTS report_lead_days (
+    guesthouse_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    lead_days INTEGER NOT NULL,
+    bookings INTEGER NOT NULL,
+    PRIMARY KEY (status, guesthouse_id, lead_days)
+);
+CREATE TABLE IF NOT EXISTS booking_decisions (
+    booking_id TEXT PRIMARY KEY,
+    guesthouse_id TEXT,
+    status TEXT NOT NULL,
+    booked_day INTEGER,
+    decided_day INTEGER NOT NULL,
+    decided_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_booking_decisions_day ON booking_decisions (decided_day);
+CREATE TABLE IF NOT EXISTS report_state (
+    name TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+UPSERT_OCCUPANCY_SQL = """
+INSERT INTO report_occupancy (month, guesthouse_id, status, days, bookings) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT(month, guesthouse_id, status) DO UPDATE SET
+    days = days + excluded.days, bookings = bookings + excluded.bookings
+"""
+
+UPSERT_LEAD_DAYS_SQL = """
+INSERT INTO report_lead_days (status, guesthouse_id, lead_days, bookings) VALUES (?, ?, ?, ?)
+ON CONFLICT(status, guesthouse_id, lead_days) DO UPDATE SET bookings = bookings + excluded.bookings
+"""
+
+
+def month_index(day):
+    """Months since year 0 for a day ordinal, so consecutive months are consecutive integers."""
+    d = date.fromordinal(day)
+    return d.year * 12 + d.month - 1
+
+
+def month_first_day(index):
+    return date(index // 12, index % 12 + 1, 1).toordinal()
+
+
+def month_label(index):
+    return f'{index % 12 + 1:02d}-{index // 12:04d}'
+
+
+def _text(record, col):
+    value = record.get(col)
+    return '' if value is None or value != value else str(value)
+
+
+def booking_facts(record):
+    """What one booking (dict, DD-MM-YYYY dates) contributes to the summaries.
+
+    Returns ({(month, guesthouse_id, status): days}, (status, guesthouse_id, lead_days) or None).
+    Stays are inclusive of both dates, as in the availability checks.
+    """
+    guesthouse_id, status = _text(record, 'guesthouse_id'), _text(record, 'status')
+    start = date_string_to_ordinal(_text(record, 'start_date'))
+    end = date_string_to_ordinal(_text(record, 'end_date'))
+    booked = date_string_to_ordinal(_text(record, 'booked_at'))
+    days = {}
+    if start is not None and end is not None and start <= end:
+        month, day = month_index(start), start
+        while day <= end:
+            last = min(end, month_first_day(month + 1) - 1)
+            days[(month, guesthouse_id, status)] = last - day + 1
+            day, month = last + 1, month + 1
+    lead = (status, guesthouse_id, start - booked) if start is not None and booked is not None else None
+    return days, lead
+
+
+class SummaryDelta:
+    """Signed changes to the summary tables, accumulated in memory and written in one batch."""
+
+    def __init__(self):
+        self.occupancy = {} # (month, guesthouse_id, status) -> [days, bookings]
+        self.lead_days = {} # (status, guesthouse_id, lead_days) -> bookings
+        self.decisions = [] # Bookings that just went from pending to confirmed/rejected
+
+    def add(self, record, sign=1):
+        days_by_month, lead = booking_facts(record)
+        for key, days in days_by_month.items():
+            entry = self.occupancy.setdefault(key, [0, 0])
+            entry[0] += sign * days
+            entry[1] += sign
+        if lead is not None:
+            self.lead_days[lead] = self.lead_days.get(lead, 0) + sign
+
+    def replace(self, previous, record):
+        """Swaps one booking's old version (None for a new booking) for its new one."""
+        if previous is not None:
+            self.add(previous, -1)
+            if _is_decision(previous, record):
+                self.decisions.append(record)
+        self.add(record)
+
+    def apply(self, conn):
+        occupancy = [(*key, days, bookings) for key, (days, bookings) in self.occupancy.items() if days or bookings]
+        lead_days = [(*key, bookings) for key, bookings in self.lead_days.items() if bookings]
+        conn.executemany(UPSERT_OCCUPANCY_SQL, occupancy)
+        conn.executemany(UPSERT_LEAD_DAYS_SQL, lead_days)
+        # Drop the rows a change emptied, so the tables only hold live aggregates
+        conn.executemany(
+            "DELETE FROM report_occupancy WHERE month = ? AND guesthouse_id = ? AND status = ? AND bookings <= 0",
+            (row[:3] for row in occupancy)
+        )
+        conn.executemany(
+            "DELETE FROM report_lead_days WHERE status = ? AND guesthouse_id = ? AND lead_days = ? AND bookings <= 0",
+            (row[:3] for row in lead_days)
+        )
+        record_decisions(conn, self.decisions)
+
+
+def record_decisions(conn, records, decided_at=None):
+    """Records bookings (with their new status) that were just approved or rejected; the first decision is kept."""
+    decided_at = decided_at or datetime.now()
+    conn.executemany(
+        "INSERT OR IGNORE INTO booking_decisions "
+        "(booking_id, guesthouse_id, status, booked_day, decided_day, decided_at) VALUES (?, ?, ?, ?, ?, ?)",
+        [
+            (_text(record, 'booking_id'), _text(record, 'guesthouse_id'), _text(record, 'status'),
+             date_string_to_ordinal(_text(record, 'booked_at')), decided_at.date().toordinal(),
+             decided_at.isoformat(timespec='seconds'))
+            for record in records
+        ]
+    )
+
+
+def _is_decision(previous, record):
+    return _text(previous, 'status') == 'pending' and _text(record, 'status') in DECISION_STATUSES
+
+
+@timed('report_update')
+def update_report_tables(conn, records):
+    """Applies booking rows about to be upserted to the summaries.
+
+    Call inside the upsert's transaction, before the rows are written: the
+    current version of each booking is read from the bookings table and
+    replaced by the new one. Rows for the same booking are applied in order.
+    """
+    records = list(records)
+    ids = list({_text(record, 'booking_id') for record in records})
+    current = {}
+    for i in range(0, len(ids), 500): # Stay under SQLite's bound-parameter limit
+        chunk = ids[i:i + 500]
+        rows = conn.execute(
+            f"SELECT {', '.join(BOOKING_COLUMNS)} FROM bookings WHERE booking_id IN ({', '.join('?' for _ in chunk)})", chunk
+        )
+        for row in rows:
+            current[row[0]] = dict(zip(BOOKING_COLUMNS, row))
+
+    delta = SummaryDelta()
+    for record in records:
+        booking_id = _text(record, 'booking_id')
+        delta.replace(current.get(booking_id), record)
+        current[booking_id] = record
+    delta.apply(conn)
+
+
+def pending_booking_ids(conn):
+    """Ids of bookings the reporting DB currently has as pending (empty before the first export)."""
+    try:
+        return {row[0] for row in conn.execute("SELECT booking_id FROM bookings WHERE status = 'pending'")}
+    except sqlite3.OperationalError:
+        return set()
+
+
+@timed('report_rebuild')
+def rebuild_report_tables(conn, records, pending_ids=()):
+    """Recomputes the summaries from every booking (full exports, imports), inside the caller's transaction.
+
+    Bookings in `pending_ids` (pending as of the previous export) that are now
+    confirmed or rejected are recorded as decided now.
+    """
+    conn.execute("DELETE FROM report_occupancy")
+    conn.execute("DELETE FROM report_lead_days")
+    delta = SummaryDelta()
+    for record in records:
+        delta.add(record)
+        if _text(record, 'booking_id') in pending_ids and _text(record, 'status') in DECISION_STATUSES:
+            delta.decisions.append(record)
+    delta.apply(conn)
+    conn.execute("INSERT OR REPLACE INTO report_state (name, value) VALUES ('schema', ?)", (REPORT_SCHEMA_VERSION,))
+
+
+def report_state(conn, name):
+    try:
+        row = conn.execute("SELECT value FROM report_state WHERE name = ?", (name,)).fetchone()
+    except sqlite3.OperationalError: # DB written by a version without the summaries
+        return None
+    return row[0] if row else None
+
+
+def report_tables_current(conn):
+    return report_state(conn, 'schema') == REPORT_SCHEMA_VERSION
+
+
+# --- Reports ---
+
+report_cache = WindowCache()
+
+
+def _distribution(values, counts, buckets):
+    """Summary statistics and bucket counts of an integer distribution given as (value, count) pairs."""
+    values = np.asarray(values, dtype=np.int64)
+    counts = np.asarray(counts, dtype=np.int64)
+    total = int(counts.sum())
+    labels = [f'{low}' if high - low == 1 else f'{low}-{high - 1}' for low, high in zip(buckets, buckets[1:])]
+    labels.append(f'{buckets[-1]}+')
+    result = {'bookings': total, 'mean_days': None, 'p50_days': None, 'p90_days': None}
+    bucket_counts = np.zeros(len(buckets) + 1, dtype=np.int64)
+    if total:
+        cumulative = np.cumsum(counts)
+        result['mean_days'] = round(float((values * counts).sum()) / total, 2)
+        for name, q in (('p50_days', 0.5), ('p90_days', 0.9)):
+            # Nearest rank: the smallest value with at least q of the bookings at or below it
+            result[name] = int(values[np.searchsorted(cumulative, q * total)])
+        # Slot 0 holds values below the first bound (e.g. bookings made after the stay started)
+        np.add.at(bucket_counts, np.searchsorted(np.asarray(buckets), values, side='right'), counts)
+    result['buckets'] = [{'days': label, 'bookings': int(count)} for label, count in zip(labels, bucket_counts[1:])]
+    if bucket_counts[0]:
+        result['buckets'].insert(0, {'days': f'<{buckets[0]}', 'bookings': int(bucket_counts[0])})
+    return result
+
+
+def _guesthouses(guesthouse_service, location=None):
+    guesthouses = guesthouse_service.get_all_guesthouses()
+    if location:
+        guesthouses = [g for g in guesthouses if str(g.get('location', '')).lower() == location.lower()]
+    return guesthouses
+
+
+def _cached(key, version, build):
+    if version is None: # Summaries not built yet, nothing identifies this state
+        return build()
+    cached = report_cache.get(key)
+    record_cache_lookup('report', cached is not None)
+    if cached is None:
+        cached = build()
+        report_cache.put(key, cached)
+    return cached
+
+
+def occupancy_report(booking_service, guesthouse_service, first_month, last_month, by='guesthouse', location=None):
+    """Share of days each guesthouse (or location) was booked, per month, from confirmed bookings.
+
+    Pending bookings are reported alongside as `pending_days` (requested but
+    not yet approved, possibly overlapping each other).
+    """
+    guesthouses = _guesthouses(guesthouse_service, location)
+    with booking_service.report_db() as (conn, version):
+        key = ('occupancy', first_month, last_month, by, (location or '').lower(), version, guesthouse_service.current_version())
+
+        def build():
+            rows = conn.execute(
+                "SELECT month, guesthouse_id, status, SUM(days) FROM report_occupancy "
+                "WHERE month BETWEEN ? AND ? AND status IN ('confirmed', 'pending') GROUP BY month, guesthouse_id, status",
+                (first_month, last_month)
+            ).fetchall()
+            return _occupancy_result(guesthouses, rows, first_month, last_month, by)
+        return _cached(key, version, build)
+
+
+def _occupancy_result(guesthouses, rows, first_month, last_month, by):
+    months = range(first_month, last_month + 1)
+    month_days = np.array([month_first_day(month + 1) - month_first_day(month) for month in months], dtype=np.int64)
+    positions = {str(g['id']): i for i, g in enumerate(guesthouses)}
+    confirmed = np.zeros((len(guesthouses), len(months)), dtype=np.int64)
+    pending = np.zeros_like(confirmed)
+    for month, guesthouse_id, status, days in rows:
+        i = positions.get(guesthouse_id)
+        if i is not None: # Bookings of guesthouses no longer listed are left out
+            (confirmed if status == 'confirmed' else pending)[i, month - first_month] += days
+
+    if by == 'location':
+        groups = sorted({str(g.get('location') or '') for g in guesthouses}, key=str.lower)
+        group_of = np.array([groups.index(str(g.get('location') or '')) for g in guesthouses], dtype=np.int64)
+        members = np.bincount(group_of, minlength=len(groups)) if len(guesthouses) else np.zeros(len(groups), dtype=np.int64)
+        grouped_confirmed = np.zeros((len(groups), len(months)), dtype=np.int64)
+        grouped_pending = np.zeros_like(grouped_confirmed)
+        np.add.at(grouped_confirmed, group_of, confirmed)
+        np.add.at(grouped_pending, group_of, pending)
+        labels = [{'location': group, 'guesthouses': int(count)} for group, count in zip(groups, members)]
+        confirmed, pending, units = grouped_confirmed, grouped_pending, members
+    else:
+        labels = [{'guesthouse_id': str(g['id']), 'name': g.get('name'), 'location': g.get('location')} for g in guesthouses]
+        units = np.ones(len(guesthouses), dtype=np.int64)
+
+    capacity = units[:, None] * month_days[None, :] # Guesthouse-days available per row and month
+    rates = np.divide(confirmed, capacity, out=np.zeros(confirmed.shape), where=capacity > 0)
+    total_capacity = capacity.sum(axis=1)
+    total_rates = np.divide(confirmed.sum(axis=1), total_capacity, out=np.zeros(len(labels)), where=total_capacity > 0)
+    return {
+        'from': month_label(first_month),
+        'to': month_label(last_month),
+        'by': by,
+        'months': [month_label(month) for month in months],
+        'rows': [
+            {
+                **label,
+                'booked_days': confirmed_row.tolist(),
+                'pending_days': pending_row.tolist(),
+                'occupancy': np.round(rate_row, 4).tolist(),
+                'occupancy_rate': round(float(total_rate), 4), # Over the whole period
+            }
+            for label, confirmed_row, pending_row, rate_row, total_rate in zip(labels, confirmed, pending, rates, total_rates)
+        ],
+    }
+
+
+def lead_time_report(booking_service, guesthouse_service, statuses=None, location=None):
+    """Distribution of days between booking (booked_at) and arrival (start_date)."""
+    guesthouse_ids = [str(g['id']) for g in _guesthouses(guesthouse_service, location)] if location else None
+    with booking_service.report_db() as (conn, version):
+        key = ('lead_time', tuple(statuses or ()), (location or '').lower(), version, guesthouse_service.current_version())
+
+        def build():
+            query, params = "SELECT lead_days, SUM(bookings) FROM report_lead_days WHERE 1 = 1", []
+            if statuses:
+                query += f" AND status IN ({', '.join('?' for _ in statuses)})"
+                params += list(statuses)
+            if guesthouse_ids is not None:
+                query += f" AND guesthouse_id IN ({', '.join('?' for _ in guesthouse_ids)})"
+                params += guesthouse_ids
+            rows = conn.execute(query + " GROUP BY lead_days ORDER BY lead_days", params).fetchall()
+            values, counts = zip(*rows) if rows else ((), ())
+            return {
+                'statuses': list(statuses) if statuses else 'all',
+                'location': location,
+                **_distribution(values, counts, LEAD_TIME_BUCKETS),
+            }
+        return _cached(key, version, build)
+
+
+def turnaround_report(booking_service, decided_from=None, decided_to=None):
+    """Days from booking to approval/rejection, overall and per decision, for decisions in the window."""
+    with booking_service.report_db() as (conn, version):
+        key = ('turnaround', decided_from, decided_to, version)
+
+        def build():
+            query, params = (
+                "SELECT status, decided_day - booked_day, COUNT(*) FROM booking_decisions WHERE booked_day IS NOT NULL", []
+            )
+            if decided_from is not None:
+                query += " AND decided_day >= ?"
+                params.append(decided_from)
+            if decided_to is not None:
+                query += " AND decided_day <= ?"
+                params.append(decided_to)
+            rows = conn.execute(query + " GROUP BY status, 2 ORDER BY 2", params).fetchall()
+            since = conn.execute("SELECT MIN(decided_at) FROM booking_decisions").fetchone()[0]
+            result = {'tracked_since': since}
+            for name, wanted in (('all', DECISION_STATUSES), ('confirmed', ('confirmed',)), ('rejected', ('rejected',))):
+                matching = [(days, count) for status, days, count in rows if status in wanted]
+                totals = {}
+                for days, count in matching: # 'all' merges the per-status rows for the same day count
+                    totals[days] = totals.get(days, 0) + count
+                result[name] = _distribution(sorted(totals), [totals[days] for days in sorted(totals)], TURNAROUND_BUCKETS)
+            return result
+        return _cached(key, version, build)
@@ -1,44 +1,102 @@
-from flask import Blueprint, jsonify, request
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from .services import guesthouse_service, booking_service, export_bookings_to_sqlite
-from .auth import login as auth_login, admin_required, user_required
-from .utils import parse_date_string, format_date_obj # For date validation if needed
+import hmac
+from datetime import date
+from flask import Blueprint, jsonify, request, Response, stream_with_context, current_app
+from .registry import registry as services
+from .availability import get_availability, MAX_WINDOW_DAYS
+from .auth import login as auth_login, logout as auth_logout, revoke_user_tokens, admin_required, user_required, jwt_required, current_identity
+from .metrics import metrics
+from .write_behind import write_behind
+from .http_cache import conditional_json, make_etag
+from .utils import date_string_to_ordinal, validate_date_range, ALLOCATION_POLICIES, MAX_BULK_ITEMS
+from .queries import BookingQuery
+from .reports import (
+    occupancy_report, lead_time_report, turnaround_report, month_index, MAX_REPORT_MONTHS, DEFAULT_REPORT_MONTHS
+)
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
+def _ndjson_lines(records):
+    dumps = current_app.json.dumps
+    for record in records:
+        yield dumps(record) + '\n'
+
+def _booking_list_response(query, username=None, with_names=False):
+    """Runs a BookingQuery and returns a JSON page (cursor in X-Next-Cursor) or an NDJSON stream."""
+    records, next_cursor = services.bookings.query_bookings(query, username=username, with_names=with_names)
+    if query.stream:
+        return Response(stream_with_context(_ndjson_lines(records)), mimetype='application/x-ndjson')
+    response = jsonify(list(records))
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response, 200
+
 @api_bp.route('/login', methods=['POST'])
 def login_route():
     return auth_login()
 
+@api_bp.route('/logout', methods=['POST'])
+@jwt_required()
+def logout_route():
+    return auth_logout()
+
 @api_bp.route('/guesthouses', methods=['GET'])
 @jwt_required() # All logged-in users can see guesthouses
 def get_guesthouses():
-    guesthouses = guesthouse_service.get_all_guesthouses()
-    return jsonify(guesthouses), 200
+    guesthouse_service = services.guesthouses
+    etag = make_etag('g', guesthouse_service.etag_prefix, guesthouse_service.current_version())
+    return conditional_json(('guesthouses',), etag, guesthouse_service.get_all_guesthouses)
+
+@api_bp.route('/availability', methods=['GET'])
+@jwt_required()
+def get_availability_route():
+    """Per-day occupancy of every guesthouse (optionally one location) between `from` and `to`."""
+    start_day = date_string_to_ordinal(request.args.get('from'))
+    end_day = date_string_to_ordinal(request.args.get('to'))
+    if start_day is None or end_day is None:
+        return jsonify({"msg": "Query parameters 'from' and 'to' are required. Use DD-MM-YYYY"}), 400
+    if start_day > end_day:
+        return jsonify({"msg": "Start date cannot be after end date."}), 400
+    if end_day - start_day + 1 > MAX_WINDOW_DAYS:
+        return jsonify({"msg": f"Date window cannot exceed {MAX_WINDOW_DAYS} days."}), 400
+
+    availability = get_availability(
+        services.bookings, services.guesthouses, start_day, end_day,
+        location=request.args.get('location')
+    )
+    return jsonify(availability), 200
 
 @api_bp.route('/bookings/request', methods=['POST'])
 @user_required # Any logged in user can request
 def request_booking():
+    """Body: {guesthouse_id (or location), start_date, end_date, waitlist?: true to queue if the dates are taken}"""
     data = request.get_json()
-    current_user = get_jwt_identity()
+    current_user = current_identity()
     
     guesthouse_id = data.get('guesthouse_id')
+    location = data.get('location') # Alternative to guesthouse_id: book any free guesthouse here
     start_date_str = data.get('start_date') # Expecting "DD-MM-YYYY"
     end_date_str = data.get('end_date')     # Expecting "DD-MM-YYYY"
 
-    if not all([guesthouse_id, start_date_str, end_date_str]):
-        return jsonify({"msg": "Missing required fields: guesthouse_id, start_date, end_date"}), 400
+    if not all([guesthouse_id or location, start_date_str, end_date_str]):
+        return jsonify({"msg": "Missing required fields: guesthouse_id (or location), start_date, end_date"}), 400
 
-    # Basic date validation
-    start_dt = parse_date_string(start_date_str)
-    end_dt = parse_date_string(end_date_str)
+    # Basic date validation (parses are memoized, so the service's own parse is a cache hit)
+    date_error = validate_date_range(start_date_str, end_date_str)
+    if date_error:
+        return jsonify({"msg": date_error}), 400
 
-    if not start_dt or not end_dt:
-        return jsonify({"msg": "Invalid date format. Use DD-MM-YYYY"}), 400
-    if start_dt > end_dt:
-        return jsonify({"msg": "Start date cannot be after end date."}), 400
+    if not guesthouse_id:
+        return _request_booking_in_location(data, location, current_user, start_date_str, end_date_str)
 
-    booking_id, message = booking_service.create_booking_request(
+    if data.get('waitlist'): # Queue instead of a 409; promoted to pending when the dates free up
+        booking_id, status, message = services.bookings.join_waitlist(
+            guesthouse_id, current_user, start_date_str, end_date_str
+        )
+        if booking_id is None:
+            return jsonify({"msg": message}), 409
+        return jsonify({"msg": message, "booking_id": booking_id, "status": status}), 201 if status == 'pending' else 202
+
+    booking_id, message = services.bookings.create_booking_request(
         guesthouse_id, current_user, start_date_str, end_date_str
     )
     if booking_id:
@@ -46,18 +104,47 @@ def request_booking():
     else:
         return jsonify({"msg": message}), 409 # 409 Conflict if not available
 
+def _request_booking_in_location(data, location, current_user, start_date_str, end_date_str):
+    """Allocates any guesthouse in `location` that fits `guests` and is free for the dates."""
+    guests = data.get('guests', 1)
+    if isinstance(guests, bool) or not isinstance(guests, int): # int() would take 2.7, "2" or true
+        return jsonify({"msg": "guests must be a whole number."}), 400
+    if guests < 1:
+        return jsonify({"msg": "guests must be at least 1."}), 400
+    policy = data.get('policy') or current_app.config['ALLOCATION_POLICY']
+    if policy not in ALLOCATION_POLICIES:
+        return jsonify({"msg": f"policy must be one of: {', '.join(ALLOCATION_POLICIES)}"}), 400
+
+    candidates = services.guesthouses.find_candidate_guesthouses(location, guests, policy)
+    if not candidates:
+        return jsonify({"msg": f"No guesthouse in {location} can host {guests} guests."}), 409
+
+    booking_id, guesthouse_id, message = services.bookings.create_booking_in_any(
+        candidates, current_user, start_date_str, end_date_str
+    )
+    if booking_id:
+        return jsonify({"msg": message, "booking_id": booking_id, "guesthouse_id": guesthouse_id}), 201
+    return jsonify({"msg": message}), 409
+
 @api_bp.route('/bookings/my', methods=['GET'])
 @user_required
 def get_my_bookings():
-    current_user = get_jwt_identity()
-    bookings = booking_service.get_user_bookings(current_user)
-    return jsonify(bookings), 200
+    current_user = current_identity()
+    try:
+        query = BookingQuery.from_args(request.args)
+    except ValueError as e:
+        return jsonify({"msg": str(e)}), 400
+    if query.is_default() and not query.stream: # The frontend polls this form; answer with 304 when unchanged
+        booking_service = services.bookings
+        etag = make_etag('u', booking_service.etag_prefix, booking_service.user_version(current_user))
+        return conditional_json(('bookings/my', current_user), etag, lambda: booking_service.get_user_bookings(current_user))
+    return _booking_list_response(query, username=current_user)
 
 @api_bp.route('/bookings/cancel/<booking_id>', methods=['POST']) # POST or PUT/PATCH
 @user_required
 def cancel_my_booking(booking_id):
-    current_user = get_jwt_identity()
-    success, message = booking_service.cancel_booking(booking_id, current_user)
+    current_user = current_identity()
+    success, message = services.bookings.cancel_booking(booking_id, current_user)
     if success:
         return jsonify({"msg": message}), 200
     else:
@@ -67,20 +154,32 @@ def cancel_my_booking(booking_id):
 @api_bp.route('/admin/bookings/all', methods=['GET'])
 @admin_required
 def get_all_bookings_admin():
-    bookings = booking_service.get_all_bookings()
-    return jsonify(bookings), 200
+    try:
+        query = BookingQuery.from_args(request.args)
+    except ValueError as e:
+        return jsonify({"msg": str(e)}), 400
+    if query.is_default() and not query.stream:
+        return conditional_json(('bookings/all',), _all_bookings_etag('a'), services.bookings.get_all_bookings)
+    return _booking_list_response(query, with_names=True)
 
 @api_bp.route('/admin/bookings/pending', methods=['GET'])
 @admin_required
 def get_pending_bookings_admin():
-    bookings = booking_service.get_pending_bookings()
-    return jsonify(bookings), 200
+    return conditional_json(('bookings/pending',), _all_bookings_etag('p'), services.bookings.get_pending_bookings)
+
+def _all_bookings_etag(kind):
+    # Admin listings include guesthouse names, so they depend on both collections
+    booking_service, guesthouse_service = services.bookings, services.guesthouses
+    return make_etag(
+        kind, booking_service.etag_prefix, booking_service.current_version(),
+        guesthouse_service.etag_prefix, guesthouse_service.current_version()
+    )
 
 @api_bp.route('/admin/bookings/approve/<booking_id>', methods=['POST'])
 @admin_required
 def approve_booking_admin(booking_id):
-    current_admin = get_jwt_identity() # For logging if needed
-    success, message = booking_service.update_booking_status(booking_id, 'confirmed', current_admin)
+    current_admin = current_identity() # For logging if needed
+    success, message = services.bookings.update_booking_status(booking_id, 'confirmed', current_admin)
     if success:
         # After successful approval, consider re-exporting to SQLite or make it a separate action
         # export_bookings_to_sqlite()
@@ -91,25 +190,144 @@ def approve_booking_admin(booking_id):
 @api_bp.route('/admin/bookings/reject/<booking_id>', methods=['POST'])
 @admin_required
 def reject_booking_admin(booking_id):
-    current_admin = get_jwt_identity()
-    success, message = booking_service.update_booking_status(booking_id, 'rejected', current_admin) # 'rejected' or 'cancelled'
+    current_admin = current_identity()
+    success, message = services.bookings.update_booking_status(booking_id, 'rejected', current_admin) # 'rejected' or 'cancelled'
     if success:
         # export_bookings_to_sqlite()
         return jsonify({"msg": message}), 200
     else:
         return jsonify({"msg": message}), 400
 
+@api_bp.route('/admin/bookings/bulk-import', methods=['POST'])
+@admin_required
+def bulk_import_bookings_admin():
+    """Body: {"bookings": [{guesthouse_id, username, start_date, end_date, status?}, ...]}"""
+    data = request.get_json(silent=True) or {}
+    items = data.get('bookings')
+    if not isinstance(items, list) or not items:
+        return jsonify({"msg": "Body must contain a non-empty 'bookings' list."}), 400
+    if len(items) > MAX_BULK_ITEMS:
+        return jsonify({"msg": f"At most {MAX_BULK_ITEMS} bookings per request."}), 400
+
+    results = services.bookings.bulk_create_bookings(items)
+    created = sum(1 for result in results if result['ok'])
+    return jsonify({"msg": f"{created} of {len(items)} bookings created.", "results": results}), 200
+
+@api_bp.route('/admin/bookings/bulk-status', methods=['POST'])
+@admin_required
+def bulk_status_admin():
+    """Body: {"approve": [booking_id, ...], "reject": [booking_id, ...]}"""
+    data = request.get_json(silent=True) or {}
+    approve = data.get('approve') or []
+    reject = data.get('reject') or []
+    if not isinstance(approve, list) or not isinstance(reject, list) or not (approve or reject):
+        return jsonify({"msg": "Body must contain 'approve' and/or 'reject' lists of booking ids."}), 400
+    if len(approve) + len(reject) > MAX_BULK_ITEMS:
+        return jsonify({"msg": f"At most {MAX_BULK_ITEMS} bookings per request."}), 400
+
+    changes = [(str(booking_id), 'confirmed') for booking_id in approve] + [(str(booking_id), 'rejected') for booking_id in reject]
+    results = services.bookings.bulk_update_status(changes)
+    updated = sum(1 for result in results if result['ok'])
+    return jsonify({"msg": f"{updated} of {len(changes)} bookings updated.", "results": results}), 200
+
+@api_bp.route('/admin/users/<username>/revoke-tokens', methods=['POST'])
+@admin_required
+def revoke_user_tokens_admin(username):
+    """Signs a user out everywhere (e.g. after a role change or a leaked token)."""
+    if services.users.get_user(username) is None:
+        return jsonify({"msg": "User not found."}), 404
+    return revoke_user_tokens(username)
+
 @api_bp.route('/admin/export-db', methods=['POST']) # Could be GET if no body needed
 @admin_required
 def export_db_route():
-    booking_service._load_bookings() # Ensure latest bookings are loaded from CSV before export
-    success, message = export_bookings_to_sqlite()
+    """Queues a full export in the background; ?wait=1 runs it in the request as before."""
+    booking_service = services.bookings
+    if request.args.get('wait', '').lower() not in ('1', 'true', 'yes'):
+        write_behind.submit('export_db', booking_service.export_db)
+        return jsonify({"msg": "Export queued.", "write_behind": write_behind.status()}), 202
+    success, message = booking_service.export_db()
     if success:
         return jsonify({"msg": message}), 200
     else:
         return jsonify({"msg": message}), 500
 
+def _optional_day(name):
+    """Day ordinal of an optional DD-MM-YYYY query parameter; raises ValueError if it is malformed."""
+    value = request.args.get(name)
+    if not value:
+        return None
+    day = date_string_to_ordinal(value)
+    if day is None:
+        raise ValueError(f"Query parameter '{name}' must be a date in DD-MM-YYYY format.")
+    return day
+
+@api_bp.route('/admin/reports/occupancy', methods=['GET'])
+@admin_required
+def occupancy_report_admin():
+    """Monthly occupancy of each guesthouse (?by=location: each location) for the months `from`..`to` touch."""
+    try:
+        start_day, end_day = _optional_day('from'), _optional_day('to')
+    except ValueError as e:
+        return jsonify({"msg": str(e)}), 400
+    last_month = month_index(end_day if end_day is not None else date.today().toordinal())
+    first_month = month_index(start_day) if start_day is not None else last_month - DEFAULT_REPORT_MONTHS + 1
+    if first_month > last_month:
+        return jsonify({"msg": "Start date cannot be after end date."}), 400
+    if last_month - first_month + 1 > MAX_REPORT_MONTHS:
+        return jsonify({"msg": f"Report period cannot exceed {MAX_REPORT_MONTHS} months."}), 400
+    by = request.args.get('by', 'guesthouse')
+    if by not in ('guesthouse', 'location'):
+        return jsonify({"msg": "Parameter 'by' must be 'guesthouse' or 'location'."}), 400
+
+    report = occupancy_report(
+        services.bookings, services.guesthouses, first_month, last_month, by=by, location=request.args.get('location')
+    )
+    return jsonify(report), 200
+
+@api_bp.route('/admin/reports/lead-time', methods=['GET'])
+@admin_required
+def lead_time_report_admin():
+    """Days from booking to arrival; ?status=confirmed,pending and ?location= narrow it down."""
+    statuses = tuple(sorted({status.strip() for status in request.args.get('status', '').split(',') if status.strip()}))
+    report = lead_time_report(services.bookings, services.guesthouses, statuses, location=request.args.get('location'))
+    return jsonify(report), 200
+
+@api_bp.route('/admin/reports/turnaround', methods=['GET'])
+@admin_required
+def turnaround_report_admin():
+    """Days from booking to approval or rejection, for decisions made between `from` and `to`."""
+    try:
+        decided_from, decided_to = _optional_day('from'), _optional_day('to')
+    except ValueError as e:
+        return jsonify({"msg": str(e)}), 400
+    return jsonify(turnaround_report(services.bookings, decided_from, decided_to)), 200
+
 # Health check endpoint
 @api_bp.route('/health', methods=['GET'])
 def health_check():
-    return jsonify({"status": "healthy"}), 200
\ No newline at end of file
+    # A failing background sync does not stop the API serving, so this stays 200
+    background = write_behind.status()
+    status = "degraded" if background['last_error'] else "healthy"
+    return jsonify({"status": status, "write_behind": background}), 200
+
+# Prometheus scrape endpoint (this worker process only)
+def _render_metrics():
+    gauges = {}
+    booking_service = services.get_if_built('bookings') # Scraping never triggers the initial load
+    if booking_service is not None:
+        gauges['guesthouse_bookings'] = [
+            ({'status': status}, count) for status, count in sorted(booking_service.status_counts().items())
+        ]
+    gauges['guesthouse_write_behind_pending'] = [({}, write_behind.pending())]
+    return Response(metrics.render(gauges), mimetype='text/plain; version=0.0.4')
+
+_render_metrics_for_admin = admin_required(_render_metrics)
+
+@api_bp.route('/metrics', methods=['GET'])
+def metrics_route():
+    """Prometheus metrics, for a scraper sending METRICS_TOKEN as its bearer token, or for admins."""
+    token = current_app.config['METRICS_TOKEN']
+    if token and hmac.compare_digest(request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode()):
+        return _render_metrics()
+    return _render_metrics_for_admin()
@@ -1,188 +1,573 @@
-import pandas as pd
+import bisect
+import heapq
+import itertools
+import logging
+import time
 import uuid
-from datetime import datetime
+from collections import Counter
+from contextlib import contextmanager
+from datetime import date, datetime
+from functools import wraps
 import os
-import sqlite3
 from .utils import (
-    USERS_FILE, GUESTHOUSES_FILE, BOOKINGS_FILE, DATABASE_FILE,
-    parse_date_string, format_date_obj, check_date_overlap, DATE_FORMAT
+    USERS_FILE, GUESTHOUSES_FILE, BOOKINGS_FILE, DATABASE_FILE, DATE_FORMAT,
+    date_string_to_ordinal, ACTIVE_BOOKING_STATUSES, WAITLIST_STATUS,
+    validate_bulk_booking_item
 )
+from .interval_index import IntervalIndex
+from .queries import encode_cursor
+from .records import Booking, Guesthouse, MISSING_DAY
+from .metrics import span, timed, record_cache_lookup
+from .storage import (
+    append_booking_rows, compact_bookings_csv, replace_bookings_table, upsert_bookings, connect_db,
+    InterProcessLock, BOOKINGS_LOCK_FILE, file_stamp, read_booking_rows_from,
+    read_sync_state, record_sync_state, stamp_to_text, parse_stamp_text, read_csv_records
+)
+from .write_behind import write_behind
+from .passwords import store_password_hash
+from .archive import booking_archive
+from .reports import report_tables_current
+
+logger = logging.getLogger(__name__)
 
 # Ensure data directory and files exist
 os.makedirs(os.path.dirname(USERS_FILE), exist_ok=True)
 
-def init_bookings_csv():
-    if not os.path.exists(BOOKINGS_FILE):
-        df = pd.DataFrame(columns=['booking_id', 'guesthouse_id', 'username', 'start_date', 'end_date', 'status', 'booked_at'])
-        df.to_csv(BOOKINGS_FILE, index=False)
-        print(f"DEBUG: {BOOKINGS_FILE} created.")
-    else:
-        try:
-            df = pd.read_csv(BOOKINGS_FILE)
-            required_cols = ['booking_id', 'guesthouse_id', 'username', 'start_date', 'end_date', 'status', 'booked_at']
-            if not all(col in df.columns for col in required_cols):
-                print(f"DEBUG: Warning - {BOOKINGS_FILE} has missing columns. Re-initializing with headers.")
-                df_empty = pd.DataFrame(columns=required_cols)
-                df_empty.to_csv(BOOKINGS_FILE, index=False)
-        except pd.errors.EmptyDataError:
-            print(f"DEBUG: Warning - {BOOKINGS_FILE} is empty. Initializing with headers.")
-            df_empty = pd.DataFrame(columns=['booking_id', 'guesthouse_id', 'username', 'start_date', 'end_date', 'status', 'booked_at'])
-            df_empty.to_csv(BOOKINGS_FILE, index=False)
-
-
-init_bookings_csv() # Initialize bookings.csv on module load
-
-def export_bookings_to_sqlite():
-    """Exports the current bookings.csv to an SQLite database."""
+SYNC_ATTEMPTS = 5 # Snapshots retried when another process syncs the DB in between
+
+def _export_records():
+    """Every booking's current row for a full export; call with the bookings lock held."""
+    rows = read_csv_records(BOOKINGS_FILE)
+    if not rows:
+        logger.debug("%s is empty, creating empty table in DB.", BOOKINGS_FILE)
+    # Archived bookings first; bookings.csv is an append-only log, the last row for each booking is current
+    latest = {booking.booking_id: booking.to_dict() for booking in booking_archive.iter_bookings()}
+    for row in rows:
+        if row.get('booking_id'):
+            latest[row['booking_id']] = row
+    return list(latest.values())
+
+@timed('sqlite_sync')
+def sync_bookings_to_sqlite(lock, full=False):
+    """Brings the SQLite table up to date with bookings.csv; run by the write-behind worker.
+
+    The DB's sync_state records the CSV stamp it last caught up to. If the log
+    only grew since then, just the appended rows are upserted; if it was
+    replaced (compaction, repair), or `full` is set, the table is rebuilt.
+    Only the stamp and the rows are read under `lock` (shared); the DB is
+    written after releasing it, and only if no other process synced it
+    meanwhile (otherwise the snapshot is taken again).
+    """
+    for _ in range(SYNC_ATTEMPTS):
+        with lock.hold(shared=True):
+            stamp = file_stamp(BOOKINGS_FILE)
+            if stamp is None:
+                return
+            state = read_sync_state()
+            synced = parse_stamp_text(state[0]) if state else None
+            if synced == stamp and not full:
+                return
+            appended = None
+            if not full and synced and synced[0] == stamp[0] and synced[1] < stamp[1]:
+                appended = [row for row in read_booking_rows_from(synced[1]) if row.get('booking_id')]
+            else:
+                records = _export_records()
+
+        if appended is not None:
+            try:
+                if upsert_bookings(appended, stamp=stamp, expected_state=state):
+                    return
+                continue
+            except Exception as e:
+                logger.error("SQLite upsert failed, falling back to full export: %s", e)
+                full = True
+                continue
+        if replace_bookings_table(records, stamp=stamp, expected_state=state):
+            return
+    raise RuntimeError(f"{DATABASE_FILE} kept changing during the sync") # Leaves the task queued for a retry
+
+@timed('sqlite_export')
+def export_bookings_to_sqlite(lock):
+    """Exports the current bookings.csv (and the archive) to an SQLite database."""
     if not os.path.exists(BOOKINGS_FILE):
-        print(f"DEBUG export_bookings_to_sqlite: {BOOKINGS_FILE} not found, skipping export.")
+        logger.debug("%s not found, skipping export.", BOOKINGS_FILE)
         return False, f"{BOOKINGS_FILE} not found."
-
-    try:
-        # Ensure we read the latest from disk
-        df = pd.read_csv(BOOKINGS_FILE)
-        if df.empty and os.path.getsize(BOOKINGS_FILE) > 0 :
-            print(f"WARNING export_bookings_to_sqlite: {BOOKINGS_FILE} was read as empty by pandas but has size. This might indicate a malformed CSV. Proceeding with empty DataFrame for DB.")
-            # For safety, treat as empty if pandas can't parse structured data despite file size
-            df = pd.DataFrame(columns=['booking_id', 'guesthouse_id', 'username', 'start_date', 'end_date', 'status', 'booked_at'])
-        elif df.empty:
-            print(f"DEBUG export_bookings_to_sqlite: {BOOKINGS_FILE} is empty, creating empty table in DB.")
-            # No return here, we want to create an empty table if CSV is empty.
-    except pd.errors.EmptyDataError:
-        print(f"DEBUG export_bookings_to_sqlite: {BOOKINGS_FILE} is empty (EmptyDataError), creating empty table in DB.")
-        df = pd.DataFrame(columns=['booking_id', 'guesthouse_id', 'username', 'start_date', 'end_date', 'status', 'booked_at'])
-    except Exception as e:
-        print(f"ERROR export_bookings_to_sqlite: Failed to read {BOOKINGS_FILE}: {str(e)}. Skipping export.")
-        return False, f"Failed to read {BOOKINGS_FILE}: {str(e)}"
-
-
-    os.makedirs(os.path.dirname(DATABASE_FILE), exist_ok=True)
-    conn = sqlite3.connect(DATABASE_FILE)
     try:
-        # Replace the entire table each time.
-        df.to_sql('bookings', conn, if_exists='replace', index=False)
-        conn.close()
+        # Full export rebuilds the table; day-to-day mutations are upserted row by row.
+        sync_bookings_to_sqlite(lock, full=True)
         return True, f"Bookings exported to {DATABASE_FILE} successfully."
     except Exception as e:
-        conn.close()
-        print(f"ERROR export_bookings_to_sqlite: Error writing to SQLite: {str(e)}")
+        logger.error("Error writing to SQLite: %s", e)
         return False, f"Error exporting to SQLite: {str(e)}"
 
 class UserService:
     def __init__(self):
-        try:
-            self.users_df = pd.read_csv(USERS_FILE)
-        except FileNotFoundError:
-            print(f"ERROR: {USERS_FILE} not found. Please create it with columns: username, password, role")
-            self.users_df = pd.DataFrame(columns=['username', 'password', 'role'])
-        except pd.errors.EmptyDataError:
-             print(f"WARNING: {USERS_FILE} is empty. Please populate it.")
-             self.users_df = pd.DataFrame(columns=['username', 'password', 'role'])
-
+        self.users = {} # username -> {'username', 'password', 'role'}
+        self._users_stamp = None
+        self._load_users()
+
+    def _load_users(self):
+        """Builds the username -> user dict index from users.csv."""
+        self._users_stamp = file_stamp(USERS_FILE)
+        if not os.path.exists(USERS_FILE):
+            logger.error("%s not found. Please create it with columns: username, password, role", USERS_FILE)
+        rows = read_csv_records(USERS_FILE)
+        if not rows and os.path.exists(USERS_FILE):
+            logger.warning("%s is empty. Please populate it.", USERS_FILE)
+        # First row wins for duplicate usernames
+        users = {}
+        for row in rows:
+            user = {col: row.get(col) or '' for col in ('username', 'password', 'role')}
+            users.setdefault(user['username'], user)
+        self.users = users
+        logger.debug("Loaded %s users from %s.", len(users), USERS_FILE)
 
     def get_user(self, username):
-        user = self.users_df[self.users_df['username'] == username]
-        if not user.empty:
-            return user.iloc[0].to_dict()
-        return None
+        if file_stamp(USERS_FILE) != self._users_stamp: # Hot reload when users.csv changes
+            self._load_users()
+        user = self.users.get(username)
+        return dict(user) if user else None
+
+    def get_usernames(self):
+        """Every known username (a live view, reloaded when users.csv changes)."""
+        if file_stamp(USERS_FILE) != self._users_stamp:
+            self._load_users()
+        return self.users.keys()
+
+    def set_password_hash(self, username, password_hash):
+        """Upgrades a user's stored password, in memory and in users.csv (so other workers pick it up)."""
+        user = self.users.get(username)
+        if not user:
+            return
+        user['password'] = password_hash
+        before, after = store_password_hash(USERS_FILE, username, password_hash)
+        if before == self._users_stamp:
+            self._users_stamp = after # Nothing else changed in the file, no reload needed
 
 class GuesthouseService:
     def __init__(self):
-        try:
-            self.guesthouses_df = pd.read_csv(GUESTHOUSES_FILE)
-            if 'id' in self.guesthouses_df.columns:
-                 self.guesthouses_df['id'] = self.guesthouses_df['id'].astype(str)
-        except FileNotFoundError:
-            print(f"ERROR: {GUESTHOUSES_FILE} not found. Please create it with columns: id, location, name, capacity")
-            self.guesthouses_df = pd.DataFrame(columns=['id', 'location', 'name', 'capacity'])
-        except pd.errors.EmptyDataError:
-            print(f"WARNING: {GUESTHOUSES_FILE} is empty. Please populate it.")
-            self.guesthouses_df = pd.DataFrame(columns=['id', 'location', 'name', 'capacity'])
-
+        self.version = 0 # Bumped whenever guesthouses.csv is (re)loaded
+        self.etag_prefix = uuid.uuid4().hex[:8] # Versions restart per instance, so ETags carry an instance id
+        self._guesthouses_stamp = None
+        self._load_guesthouses()
+
+    def _load_guesthouses(self):
+        self._guesthouses_stamp = file_stamp(GUESTHOUSES_FILE)
+        if not os.path.exists(GUESTHOUSES_FILE):
+            logger.error("%s not found. Please create it with columns: id, location, name, capacity", GUESTHOUSES_FILE)
+        rows = read_csv_records(GUESTHOUSES_FILE)
+        if not rows and os.path.exists(GUESTHOUSES_FILE):
+            logger.warning("%s is empty. Please populate it.", GUESTHOUSES_FILE)
+        self.guesthouses = [Guesthouse.from_dict(row) for row in rows]
+        self._guesthouse_dicts = [guesthouse.to_dict() for guesthouse in self.guesthouses]
+        self.guesthouses_by_id = {}
+        for guesthouse in self.guesthouses:
+            self.guesthouses_by_id.setdefault(guesthouse.id, guesthouse) # First row wins for duplicate ids
+        self.guesthouse_names = {guesthouse.id: guesthouse.name for guesthouse in self.guesthouses}
+        self._build_capacity_index()
+        self.version += 1
+
+    def _build_capacity_index(self):
+        """location (lowercase) -> [(capacity, file position, id)] sorted by capacity."""
+        index = {}
+        for position, guesthouse in enumerate(self.guesthouses):
+            index.setdefault(guesthouse.location.strip().lower(), []).append((guesthouse.capacity, position, guesthouse.id))
+        for entries in index.values():
+            entries.sort()
+        self.capacity_index = index
+
+    def find_candidate_guesthouses(self, location, guests, policy='best-fit'):
+        """Ids of guesthouses in `location` with capacity >= guests, in allocation-policy order."""
+        self._reload_if_changed()
+        entries = self.capacity_index.get(str(location).strip().lower(), [])
+        eligible = entries[bisect.bisect_left(entries, (guests,)):]
+        if policy == 'worst-fit':
+            eligible = eligible[::-1]
+        elif policy == 'first-fit':
+            eligible = sorted(eligible, key=lambda entry: entry[1])
+        return [guesthouse_id for _, _, guesthouse_id in eligible]
+
+    def _reload_if_changed(self):
+        if file_stamp(GUESTHOUSES_FILE) != self._guesthouses_stamp:
+            logger.debug("%s changed on disk, reloading.", GUESTHOUSES_FILE)
+            self._load_guesthouses()
 
     def get_all_guesthouses(self):
-        return self.guesthouses_df.to_dict(orient='records')
+        self._reload_if_changed()
+        return self._guesthouse_dicts
+
+    def current_version(self):
+        self._reload_if_changed()
+        return self.version
+
+    def get_guesthouse_names(self):
+        """Cached guesthouse_id -> name lookup, refreshed when guesthouses.csv changes."""
+        self._reload_if_changed()
+        return self.guesthouse_names
 
     def get_guesthouse_by_id(self, guesthouse_id):
-        guesthouse = self.guesthouses_df[self.guesthouses_df['id'].astype(str) == str(guesthouse_id)]
-        if not guesthouse.empty:
-            return guesthouse.iloc[0].to_dict()
-        return None
+        self._reload_if_changed()
+        guesthouse = self.guesthouses_by_id.get(str(guesthouse_id))
+        return guesthouse.to_dict() if guesthouse else None
+
+def _iter_records(bookings, names=None):
+    """Yields bookings as API dicts, adding guesthouse_name when a names lookup is given."""
+    for booking in bookings:
+        record = booking.to_dict()
+        if names is not None:
+            record['guesthouse_name'] = names.get(booking.guesthouse_id, 'Unknown Guesthouse')
+        yield record
+
+def with_bookings_lock(shared=False):
+    """Runs a BookingService method under the bookings lock, after catching up
+    with any rows other worker processes appended to bookings.csv.
+
+    Shared holders read concurrently, so catching up (which changes the
+    in-memory state) happens under a short exclusive hold first, and only
+    when the file changed. A nested call relies on its caller's refresh.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(self, *args, **kwargs):
+            if self.lock.held():
+                with self.lock.hold(shared=shared): # Raises if this would upgrade a shared hold
+                    return fn(self, *args, **kwargs)
+            if shared and file_stamp(BOOKINGS_FILE) != self._log_stamp:
+                with self.lock.hold():
+                    self._refresh_from_disk()
+            with self.lock.hold(shared=shared):
+                if not shared:
+                    self._refresh_from_disk()
+                return fn(self, *args, **kwargs)
+        return wrapper
+    return decorator
 
 class BookingService:
-    def __init__(self):
-        self._load_bookings()
+    def __init__(self, guesthouse_service, user_service=None):
+        self.guesthouse_service = guesthouse_service # For guesthouse names in admin views
+        self.user_service = user_service or UserService() # For checking usernames in bulk imports
+        self.bookings = [] # Booking records, in the order bookings were first created
+        self._positions = {} # booking_id -> index into self.bookings
+        self._user_positions = {} # username -> indexes into self.bookings
+        self.interval_index = IntervalIndex()
+        self.waitlist_index = IntervalIndex() # Waitlisted requests, matched against dates freed by cancellations/rejections
+        self.pending_bookings = {} # booking_id -> Booking, maintained on every status change
+        self.version = 0 # Bumped on every change to the bookings
+        self._user_versions = {} # username -> version of that user's bookings, bumped on their changes
+        self.etag_prefix = uuid.uuid4().hex[:8] # Versions restart per instance, so ETags carry an instance id
+        self._all_bookings_cache = (None, None) # ((version, guesthouse version), records)
+        self._status_counts_cache = (None, None) # (version, {status: count})
+        # Serializes check-and-insert across threads and worker processes
+        self.lock = InterProcessLock(BOOKINGS_LOCK_FILE)
+        self._log_stamp = None # file_stamp of bookings.csv as of our last read or write
+        # Compact bookings.csv once this many superseded rows pile up (0 disables it)
+        self.compact_threshold = int(os.getenv('BOOKINGS_COMPACT_THRESHOLD', '0'))
+        self.superseded_rows = 0
+        # Finished bookings move to the columnar archive this many days after their stay (0 disables)
+        self.archive = booking_archive
+        self.archive_after_days = int(os.getenv('ARCHIVE_AFTER_DAYS', '0'))
+        self.archive_interval = float(os.getenv('ARCHIVE_INTERVAL_HOURS', '24')) * 3600
+        with self.lock.hold():
+            self._load_bookings()
         # Optionally, ensure DB is synced on startup if CSV exists and DB might be stale or missing
         self._sync_db_on_init()
+        self._maybe_archive()
 
     def _load_bookings(self):
-        try:
-            self.bookings_df = pd.read_csv(BOOKINGS_FILE)
-            if 'guesthouse_id' in self.bookings_df.columns:
-                self.bookings_df['guesthouse_id'] = self.bookings_df['guesthouse_id'].astype(str)
-            for col in ['start_date', 'end_date', 'booked_at']:
-                if col in self.bookings_df.columns:
-                    self.bookings_df[col] = self.bookings_df[col].astype(str).fillna('') # fillna for dates
-                else: # Add missing date columns if they don't exist
-                    self.bookings_df[col] = ''
-
-
-            # Ensure booking_id exists and fill NaNs
-            if 'booking_id' not in self.bookings_df.columns:
-                self.bookings_df['booking_id'] = [str(uuid.uuid4()) for _ in range(len(self.bookings_df))]
-                self._save_bookings_and_export_to_db()
-            elif self.bookings_df['booking_id'].isnull().any():
-                self.bookings_df['booking_id'] = self.bookings_df['booking_id'].apply(lambda x: x if pd.notnull(x) and x != '' else str(uuid.uuid4()))
-                self._save_bookings_and_export_to_db() # Save and export if IDs generated
-
-        except (FileNotFoundError, pd.errors.EmptyDataError):
-            print(f"DEBUG: {BOOKINGS_FILE} is empty or not found. Initializing empty bookings DataFrame.")
-            self.bookings_df = pd.DataFrame(columns=['booking_id', 'guesthouse_id', 'username', 'start_date', 'end_date', 'status', 'booked_at'])
+        self.bookings, self._positions, self._user_positions = [], {}, {}
+        rows = read_csv_records(BOOKINGS_FILE)
+        if not rows:
+            logger.debug("%s is empty or not found. Starting with no bookings.", BOOKINGS_FILE)
             # No need to save here, as init_bookings_csv handles creating an empty file.
             # We will save when a booking is made.
 
-    def _save_bookings_and_export_to_db(self):
-        """Saves the bookings DataFrame to CSV and then exports to SQLite."""
+        # Replay the append-only log: keep the latest row for each booking,
+        # in the order bookings were first created
+        missing_ids = False
+        for row in rows:
+            if not row.get('booking_id'):
+                row['booking_id'] = str(uuid.uuid4())
+                missing_ids = True
+            self._put_booking(Booking.from_dict(row))
+        self.superseded_rows = len(rows) - len(self.bookings)
+
+        self._log_stamp = file_stamp(BOOKINGS_FILE)
+        if missing_ids:
+            self._save_bookings_and_export_to_db() # Save and export if IDs generated
+        self._rebuild_interval_index()
+
+    def _put_booking(self, booking):
+        """Stores a booking's latest state. Returns False if it replaced an existing booking."""
+        position = self._positions.get(booking.booking_id)
+        if position is not None:
+            self.bookings[position] = booking
+            return False
+        self._positions[booking.booking_id] = len(self.bookings)
+        self._user_positions.setdefault(booking.username, []).append(len(self.bookings))
+        self.bookings.append(booking)
+        return True
+
+    def _refresh_from_disk(self):
+        """Picks up changes other processes made to bookings.csv since we last looked.
+
+        Appended rows are replayed incrementally; a replaced file (compaction or
+        a rewrite) triggers a full reload. Must be called with self.lock held.
+        """
+        stamp = file_stamp(BOOKINGS_FILE)
+        if stamp == self._log_stamp:
+            return
+        previous = self._log_stamp
+        if stamp and previous and stamp[0] == previous[0] and stamp[1] > previous[1]:
+            logger.debug("%s grew in another process, replaying appended rows.", BOOKINGS_FILE)
+            self._apply_appended_rows(read_booking_rows_from(previous[1]))
+            self._log_stamp = stamp
+        else:
+            logger.debug("%s was replaced in another process, reloading.", BOOKINGS_FILE)
+            self._load_bookings()
+
+    def _apply_appended_rows(self, records):
+        for record in records:
+            if not record.get('booking_id'):
+                continue
+            booking = Booking.from_dict(record)
+            if not self._put_booking(booking):
+                self.superseded_rows += 1
+            self._index_booking(booking)
+
+    def _rebuild_interval_index(self):
+        """Rebuilds the per-guesthouse interval indexes and the pending queue from the bookings."""
+        self.pending_bookings = {}
+        self.version += 1
+        active, waiting = [], []
+        for booking in self.bookings:
+            self._user_versions[booking.username] = self._user_versions.get(booking.username, 0) + 1
+            if booking.status == 'pending':
+                self.pending_bookings[booking.booking_id] = booking
+            if booking.start_day == MISSING_DAY or booking.end_day == MISSING_DAY:
+                continue # Invalid dates never block availability
+            entry = (booking.guesthouse_id, booking.booking_id, booking.start_day, booking.end_day)
+            if booking.status == WAITLIST_STATUS:
+                waiting.append(entry)
+            elif booking.status in ACTIVE_BOOKING_STATUSES:
+                active.append(entry)
+        self.interval_index.load(active)
+        self.waitlist_index.load(waiting)
+        logger.debug("Interval index built with %s active bookings.", len(self.interval_index))
+
+    def _index_booking(self, booking):
+        """Keeps the interval indexes and the pending queue in step with a booking's current status."""
+        booking_id = booking.booking_id
+        self.version += 1
+        self._user_versions[booking.username] = self._user_versions.get(booking.username, 0) + 1
+        if booking.status == 'pending':
+            self.pending_bookings[booking_id] = booking
+        else:
+            self.pending_bookings.pop(booking_id, None)
+
+        valid_dates = booking.start_day != MISSING_DAY and booking.end_day != MISSING_DAY
+        if booking.status == WAITLIST_STATUS and valid_dates:
+            self.waitlist_index.add(booking.guesthouse_id, booking_id, booking.start_day, booking.end_day)
+        else:
+            self.waitlist_index.remove(booking_id)
+
+        if booking.status not in ACTIVE_BOOKING_STATUSES:
+            self.interval_index.remove(booking_id)
+            return
+        if not valid_dates: # Invalid dates never block availability
+            self.interval_index.remove(booking_id)
+            return
+        self.interval_index.add(booking.guesthouse_id, booking_id, booking.start_day, booking.end_day)
+
+    def _persist_bookings(self, bookings):
+        """Appends changed bookings to the CSV log and queues the SQLite sync.
+
+        Cost depends only on the number of changed rows, not on the booking history.
+        """
+        records = [booking.to_dict() for booking in bookings]
         try:
-            self.bookings_df.to_csv(BOOKINGS_FILE, index=False)
-            print(f"DEBUG: Saved {BOOKINGS_FILE}")
-            success, message = export_bookings_to_sqlite()
-            if success:
-                print(f"DEBUG: SQLite DB updated successfully: {message}")
+            append_booking_rows(records)
+            self._log_stamp = file_stamp(BOOKINGS_FILE)
+        except Exception as e:
+            logger.error("Failed to append to %s: %s", BOOKINGS_FILE, e)
+            return
+        self._queue_db_sync()
+        self._maybe_compact()
+        self._maybe_archive()
+
+    def _total_count(self):
+        """Bookings in bookings.csv plus the archive, i.e. rows the SQLite export should hold."""
+        return len(self.bookings) + self.archive.count()
+
+    def _queue_db_sync(self):
+        # Bursts of mutations coalesce into one sync; bookings.csv is the outbox
+        write_behind.submit('sqlite_sync', lambda: sync_bookings_to_sqlite(self.lock))
+
+    def _set_status(self, position, new_status):
+        """Replaces the booking at `position` with a copy in `new_status` and re-indexes it."""
+        booking = self.bookings[position].with_status(new_status)
+        self.bookings[position] = booking
+        self._index_booking(booking)
+        self.superseded_rows += 1
+        return booking
+
+    def _promote_waitlisted(self, freed):
+        """Promotes waitlisted requests into dates that `freed` bookings just stopped blocking.
+
+        The waitlist index yields the requests overlapping each freed interval;
+        the best fitting one (most days inside the freed interval, then first
+        come) is promoted to pending if its whole range is now free, then the
+        next one, so a long freed stay can go to several shorter requests.
+        Returns the promoted bookings, for the caller to persist in the same
+        write as the change that freed the dates.
+        """
+        today = date.today().toordinal()
+        promoted = []
+        for booking in freed:
+            if booking.start_day == MISSING_DAY or booking.end_day == MISSING_DAY:
+                continue
+            candidates = sorted(
+                (-(min(end, booking.end_day) - max(start, booking.start_day) + 1), self._positions[waiting_id])
+                for start, end, waiting_id in self.waitlist_index.overlapping_entries(
+                    booking.guesthouse_id, booking.start_day, booking.end_day
+                )
+                if start >= today # Stays that already began can no longer be booked
+            )
+            for _, position in candidates:
+                candidate = self.bookings[position]
+                if candidate.status == WAITLIST_STATUS and self.is_guesthouse_available(
+                    candidate.guesthouse_id, candidate.start_date, candidate.end_date
+                ):
+                    promoted.append(self._set_status(position, 'pending'))
+        if promoted:
+            logger.debug("Promoted %s waitlisted requests to pending.", len(promoted))
+        return promoted
+
+    def _maybe_compact(self):
+        # The rewrite costs time proportional to the whole log, so it runs on the
+        # write-behind worker (inline only when write-behind is disabled)
+        if self.compact_threshold and self.superseded_rows >= self.compact_threshold:
+            write_behind.submit('compact', self._compact_if_needed)
+
+    @with_bookings_lock()
+    def _compact_if_needed(self):
+        # Re-checked under the lock: another process may have compacted the log meanwhile
+        if self.compact_threshold and self.superseded_rows >= self.compact_threshold:
+            self.compact()
+
+    @with_bookings_lock()
+    def compact(self):
+        """Rewrites bookings.csv with one row per booking, dropping superseded rows."""
+        try:
+            previous = self._log_stamp
+            compact_bookings_csv(booking.to_dict() for booking in self.bookings)
+            self._log_stamp = file_stamp(BOOKINGS_FILE)
+            if read_sync_state() == (stamp_to_text(previous), self._total_count()):
+                record_sync_state(self._log_stamp, self._total_count()) # Same rows, new file
             else:
-                print(f"ERROR: SQLite export failed after saving bookings: {message}")
+                self._queue_db_sync() # The DB was behind anyway; the sync rebuilds it
+            logger.debug("Compacted %s, dropped %s superseded rows.", BOOKINGS_FILE, self.superseded_rows)
+            self.superseded_rows = 0
+            return True
+        except Exception as e:
+            logger.error("Failed to compact %s: %s", BOOKINGS_FILE, e)
+            return False
+
+    def _maybe_archive(self):
+        if not self.archive_after_days:
+            return
+        archived_at = self.archive.manifest()['archived_at']
+        if archived_at is None or time.time() - archived_at >= self.archive_interval:
+            write_behind.submit('archive', self.archive_cold_bookings)
+
+    @with_bookings_lock()
+    def archive_cold_bookings(self, after_days=None):
+        """Moves finished bookings from bookings.csv (and memory) into the columnar archive.
+
+        A booking is finished once it is cancelled or rejected, or its stay ended
+        more than `after_days` (default ARCHIVE_AFTER_DAYS) days ago (waitlisted
+        requests stay until then too). Archived
+        bookings are read-only history. Returns the number of bookings moved.
+        """
+        after_days = self.archive_after_days if after_days is None else after_days
+        cutoff_day = date.today().toordinal() - after_days
+        hot, cold = [], []
+        for booking in self.bookings:
+            waiting = booking.status in ACTIVE_BOOKING_STATUSES or booking.status == WAITLIST_STATUS
+            finished = not waiting or MISSING_DAY < booking.end_day < cutoff_day
+            (cold if finished else hot).append(booking)
+        if not cold:
+            self.archive.touch()
+            return 0
+
+        db_in_sync = read_sync_state() == (stamp_to_text(self._log_stamp), self._total_count())
+        # Archive first: a crash before the CSV rewrite only leaves duplicates, and the live copy wins
+        self.archive.add(cold)
+        compact_bookings_csv(booking.to_dict() for booking in hot)
+        self._log_stamp = file_stamp(BOOKINGS_FILE)
+        self.bookings, self._positions, self._user_positions = [], {}, {}
+        for booking in hot:
+            self._put_booking(booking)
+        self.superseded_rows = 0
+        self._rebuild_interval_index()
+        if db_in_sync:
+            record_sync_state(self._log_stamp, self._total_count()) # Same bookings, just moved
+        else:
+            self._queue_db_sync()
+        logger.debug("Archived %s finished bookings, %s remain in %s.", len(cold), len(hot), BOOKINGS_FILE)
+        return len(cold)
+
+    def _archived_message(self, booking_id, username=None):
+        """Error for a booking id that is not live: archived (read-only) or unknown."""
+        booking = self.archive.find(booking_id)
+        if booking is not None and (username is None or booking.username == username):
+            return f"Booking {booking_id} is archived and can no longer be changed."
+        return None
+
+    def _save_bookings_and_export_to_db(self):
+        """Rewrites the whole bookings CSV and queues a rebuild of the SQLite table. Only used for repairs."""
+        try:
+            compact_bookings_csv(booking.to_dict() for booking in self.bookings)
+            self._log_stamp = file_stamp(BOOKINGS_FILE)
+            self.superseded_rows = 0
+            logger.debug("Saved %s", BOOKINGS_FILE)
+            self._queue_db_sync()
         except Exception as e:
-            print(f"ERROR: Failed to save bookings CSV or export to DB: {str(e)}")
+            logger.error("Failed to save bookings CSV or export to DB: %s", e)
 
 
     def _sync_db_on_init(self):
-        """Ensures DB is synced with CSV upon service initialization if CSV exists."""
+        """Ensures DB is synced with CSV upon service initialization if CSV exists.
+
+        Skipped when the DB already records this exact bookings.csv stamp and booking count.
+        Otherwise the sync runs in the background, replaying whatever a crash left unsynced.
+        """
         if os.path.exists(BOOKINGS_FILE): # Only sync if CSV exists
-            print("DEBUG: Performing initial sync of bookings.csv to SQLite DB.")
-            success, message = export_bookings_to_sqlite()
-            if success:
-                print(f"DEBUG: Initial DB sync successful: {message}")
-            else:
-                print(f"ERROR: Initial DB sync failed: {message}")
+            if read_sync_state() == (stamp_to_text(self._log_stamp), self._total_count()):
+                logger.debug("SQLite DB already matches bookings.csv, skipping initial sync.")
+                return
+            logger.debug("Queueing initial sync of bookings.csv to SQLite DB.")
+            self._queue_db_sync()
         else:
-            print(f"DEBUG: {BOOKINGS_FILE} does not exist. Skipping initial DB sync.")
-
-
-    def is_guesthouse_available(self, guesthouse_id, start_date_str, end_date_str):
-        guesthouse_id = str(guesthouse_id)
-        
-        relevant_bookings = self.bookings_df[
-            (self.bookings_df['guesthouse_id'] == guesthouse_id) &
-            (self.bookings_df['status'].isin(['confirmed', 'pending']))
-        ]
-
-        for _, booking in relevant_bookings.iterrows():
-            # Ensure booking dates are valid before checking overlap
-            if booking['start_date'] and booking['end_date']:
-                if check_date_overlap(start_date_str, end_date_str, booking['start_date'], booking['end_date']):
-                    return False
-        return True
-
+            logger.debug("%s does not exist. Skipping initial DB sync.", BOOKINGS_FILE)
+
+
+    @with_bookings_lock(shared=True)
+    def is_guesthouse_available(self, guesthouse_id, start_date_str, end_date_str, exclude_booking_id=None):
+        with span('availability_check'):
+            start = date_string_to_ordinal(start_date_str)
+            end = date_string_to_ordinal(end_date_str)
+            if start is None or end is None: # Same as check_date_overlap: invalid dates never overlap
+                return True
+            guesthouse_id = str(guesthouse_id)
+            if self.interval_index.overlaps(guesthouse_id, start, end, exclude=exclude_booking_id):
+                return False
+            # Archived stays only matter for dates in the past
+            return not any(
+                booking_id != exclude_booking_id
+                for _, _, _, booking_id in self.archive.active_entries(start, end, guesthouse_id, skip_ids=self._positions)
+            )
+
+    @with_bookings_lock()
     def create_booking_request(self, guesthouse_id, username, start_date_str, end_date_str):
         guesthouse_id = str(guesthouse_id)
         if not self.is_guesthouse_available(guesthouse_id, start_date_str, end_date_str):
@@ -193,7 +578,7 @@ class BookingService:
         # Or for more precision: datetime.now().isoformat()
         booked_at_str = datetime.now().strftime(DATE_FORMAT)
 
-        new_booking_data = {
+        new_booking = Booking.from_dict({
             'booking_id': new_booking_id,
             'guesthouse_id': guesthouse_id,
             'username': username,
@@ -201,132 +586,319 @@ class BookingService:
             'end_date': end_date_str,
             'status': 'pending',
             'booked_at': booked_at_str
-        }
-        
-        # If bookings_df is empty and has no columns (first run after init_bookings_csv made an empty file)
-        if self.bookings_df.empty and not list(self.bookings_df.columns):
-            self.bookings_df = pd.DataFrame([new_booking_data])
-        else:
-            new_booking_df_row = pd.DataFrame([new_booking_data])
-            self.bookings_df = pd.concat([self.bookings_df, new_booking_df_row], ignore_index=True)
-        
-        self._save_bookings_and_export_to_db()
+        })
+        self._put_booking(new_booking)
+        self._index_booking(new_booking)
+        self._persist_bookings([new_booking])
         return new_booking_id, "Booking request submitted successfully."
 
+    @with_bookings_lock()
+    def join_waitlist(self, guesthouse_id, username, start_date_str, end_date_str):
+        """Books the dates if they are free, otherwise queues the request on the guesthouse's waitlist.
+
+        Returns (booking_id, status, message); booking_id is None if the user
+        already waits for overlapping dates at this guesthouse.
+        """
+        guesthouse_id = str(guesthouse_id)
+        if self.is_guesthouse_available(guesthouse_id, start_date_str, end_date_str):
+            booking_id, message = self.create_booking_request(guesthouse_id, username, start_date_str, end_date_str)
+            return booking_id, 'pending', message
+        start = date_string_to_ordinal(start_date_str)
+        end = date_string_to_ordinal(end_date_str)
+        for booking_id in self.waitlist_index.overlapping(guesthouse_id, start, end):
+            if self.bookings[self._positions[booking_id]].username == username:
+                return None, WAITLIST_STATUS, "You are already on the waitlist for these dates."
+
+        booking = Booking.from_dict({
+            'booking_id': str(uuid.uuid4()),
+            'guesthouse_id': guesthouse_id,
+            'username': username,
+            'start_date': start_date_str,
+            'end_date': end_date_str,
+            'status': WAITLIST_STATUS,
+            'booked_at': datetime.now().strftime(DATE_FORMAT)
+        })
+        self._put_booking(booking)
+        self._index_booking(booking)
+        self._persist_bookings([booking])
+        return booking.booking_id, WAITLIST_STATUS, "Guesthouse not available; request added to the waitlist."
+
+    @with_bookings_lock()
+    def create_booking_in_any(self, guesthouse_ids, username, start_date_str, end_date_str):
+        """Books the first guesthouse in `guesthouse_ids` that is free for the dates.
+
+        The whole search runs under one exclusive lock, so the pick is atomic.
+        Returns (booking_id, guesthouse_id, message); booking_id is None if all are taken.
+        """
+        for guesthouse_id in guesthouse_ids:
+            if self.is_guesthouse_available(guesthouse_id, start_date_str, end_date_str):
+                booking_id, message = self.create_booking_request(guesthouse_id, username, start_date_str, end_date_str)
+                return booking_id, guesthouse_id, message
+        return None, None, "No guesthouse available in this location for the selected dates and group size."
+
+    @with_bookings_lock(shared=True)
     def get_user_bookings(self, username):
-        if self.bookings_df.empty or 'username' not in self.bookings_df.columns:
-            return []
-        user_bookings = self.bookings_df[self.bookings_df['username'] == username]
-        return user_bookings.to_dict(orient='records')
+        archived = [booking.to_dict() for booking in self.archive.iter_bookings(username=username, skip_ids=self._positions)]
+        return archived + [self.bookings[position].to_dict() for position in self._user_positions.get(username, ())]
 
+    @with_bookings_lock(shared=True)
     def get_all_bookings(self):
-        if self.bookings_df.empty:
-            return []
-            
-        gs_service_instance = GuesthouseService() # Get fresh instance if guesthouses can change
-        guesthouses_df = gs_service_instance.guesthouses_df[['id', 'name']].copy()
-        guesthouses_df.rename(columns={'id': 'guesthouse_id', 'name': 'guesthouse_name'}, inplace=True)
-        guesthouses_df['guesthouse_id'] = guesthouses_df['guesthouse_id'].astype(str)
-        
-        # Ensure self.bookings_df has guesthouse_id for merging
-        if 'guesthouse_id' not in self.bookings_df.columns:
-            print("WARNING: 'guesthouse_id' column missing in bookings. Cannot merge guesthouse names.")
-            # Add a placeholder or return raw bookings
-            temp_bookings_df = self.bookings_df.copy()
-            temp_bookings_df['guesthouse_name'] = 'N/A (Missing ID)'
-            return temp_bookings_df.to_dict(orient='records')
-
-        merged_df = pd.merge(self.bookings_df.copy(), guesthouses_df, on='guesthouse_id', how='left')
-        merged_df['guesthouse_name'].fillna('Unknown Guesthouse', inplace=True)
-        return merged_df.to_dict(orient='records')
-
-
+        """Archived history (read from the archive on each call) followed by the live bookings."""
+        names = self.guesthouse_service.get_guesthouse_names()
+        archived = list(_iter_records(self.archive.iter_bookings(skip_ids=self._positions), names))
+        if not self.bookings:
+            return archived
+
+        cache_key = (self.version, self.guesthouse_service.version)
+        hit = self._all_bookings_cache[0] == cache_key
+        record_cache_lookup('all_bookings', hit)
+        if not hit:
+            self._all_bookings_cache = (cache_key, list(_iter_records(self.bookings, names)))
+        records = self._all_bookings_cache[1]
+        return archived + records if archived else records
+
+    @with_bookings_lock(shared=True)
     def get_pending_bookings(self):
-        if self.bookings_df.empty or 'status' not in self.bookings_df.columns:
-            return []
-        pending_df = self.bookings_df[self.bookings_df['status'] == 'pending'].copy() # Use .copy()
-        
-        if pending_df.empty:
-            return []
-
-        gs_service_instance = GuesthouseService()
-        guesthouses_df = gs_service_instance.guesthouses_df[['id', 'name']].copy()
-        guesthouses_df.rename(columns={'id': 'guesthouse_id', 'name': 'guesthouse_name'}, inplace=True)
-        guesthouses_df['guesthouse_id'] = guesthouses_df['guesthouse_id'].astype(str)
-        
-        if 'guesthouse_id' not in pending_df.columns:
-            print("WARNING: 'guesthouse_id' column missing in pending bookings. Cannot merge guesthouse names.")
-            pending_df['guesthouse_name'] = 'N/A (Missing ID)'
-            return pending_df.to_dict(orient='records')
-            
-        merged_df = pd.merge(pending_df, guesthouses_df, on='guesthouse_id', how='left')
-        merged_df['guesthouse_name'].fillna('Unknown Guesthouse', inplace=True)
-        return merged_df.to_dict(orient='records')
-
+        # Served from the maintained pending queue: O(pending), no scan of the full history
+        names = self.guesthouse_service.get_guesthouse_names()
+        return list(_iter_records(self.pending_bookings.values(), names))
+
+    @with_bookings_lock(shared=True)
+    def query_bookings(self, query, username=None, with_names=False):
+        """Filtered, sorted, keyset-paginated bookings.
+
+        Returns (records iterator, next page cursor or None). The matching bookings
+        are picked under the lock; booking records are never modified in place, so
+        dicts are built lazily afterwards and a streamed export never holds the
+        whole result as a list of dicts.
+        """
+        # Keyset is (sort day, booking_id): unlike log positions it survives compaction and archival
+        day_slot = Booking.DAY_SLOTS['booked_at' if query.sort == 'created' else query.sort]
+        guesthouse_id = str(query.guesthouse_id) if query.guesthouse_id is not None else None
+        statuses = set(query.statuses) if query.statuses else None
+        after = tuple(query.after) if query.after is not None else None
+        positions = self._user_positions.get(username, ()) if username is not None else range(len(self.bookings))
+        candidates = itertools.chain(
+            self.archive.iter_bookings(query.date_from, query.date_to, username=username, skip_ids=self._positions),
+            (self.bookings[position] for position in positions)
+        )
+
+        matches = []
+        for booking in candidates:
+            if guesthouse_id is not None and booking.guesthouse_id != guesthouse_id:
+                continue
+            if statuses is not None and booking.status not in statuses:
+                continue
+            if query.date_from is not None and booking.end_day < query.date_from:
+                continue
+            if query.date_to is not None and not 0 <= booking.start_day <= query.date_to:
+                continue
+            key = (getattr(booking, day_slot), booking.booking_id)
+            if after is not None and (key >= after if query.descending else key <= after):
+                continue
+            matches.append((key, booking))
+
+        next_cursor = None
+        sort_key = lambda match: match[0]
+        if query.limit is not None and len(matches) > query.limit:
+            pick = heapq.nlargest if query.descending else heapq.nsmallest
+            matches = pick(query.limit, matches, key=sort_key)
+            next_cursor = encode_cursor(*matches[-1][0])
+        else:
+            matches.sort(key=sort_key, reverse=query.descending)
+
+        names = self.guesthouse_service.get_guesthouse_names() if with_names else None
+        return _iter_records([booking for _, booking in matches], names), next_cursor
+
+    @with_bookings_lock(shared=True)
+    def current_version(self):
+        return self.version
+
+    @with_bookings_lock(shared=True)
+    def user_version(self, username):
+        """Changes whenever one of `username`'s bookings changes (for /bookings/my ETags)."""
+        return self._user_versions.get(username, 0)
+
+    @with_bookings_lock(shared=True)
+    def status_counts(self):
+        """{status: number of bookings}, recounted only when the bookings changed."""
+        if self._status_counts_cache[0] != self.version:
+            counts = Counter(self.archive.status_counts()) # From the archive manifest, no partition is read
+            counts.update(booking.status for booking in self.bookings)
+            self._status_counts_cache = (self.version, dict(counts))
+        return self._status_counts_cache[1]
+
+    @with_bookings_lock(shared=True)
+    def active_intervals(self, window_start, window_end):
+        """(guesthouse_ids, starts, ends) of pending/confirmed bookings overlapping the window (day ordinals)."""
+        guesthouse_ids, starts, ends = [], [], []
+        for guesthouse_id in self.interval_index.guesthouse_ids():
+            for start, end, _ in self.interval_index.overlapping_entries(guesthouse_id, window_start, window_end):
+                guesthouse_ids.append(guesthouse_id)
+                starts.append(start)
+                ends.append(end)
+        for guesthouse_id, start, end, _ in self.archive.active_entries(window_start, window_end, skip_ids=self._positions):
+            guesthouse_ids.append(guesthouse_id)
+            starts.append(start)
+            ends.append(end)
+        return guesthouse_ids, starts, ends
+
+    @with_bookings_lock()
     def update_booking_status(self, booking_id, new_status, admin_username=None):
-        if self.bookings_df.empty or 'booking_id' not in self.bookings_df.columns:
+        if not self.bookings:
             return False, "No bookings found."
-        if booking_id not in self.bookings_df['booking_id'].values:
-            return False, "Booking ID not found."
-        
-        booking_to_update = self.bookings_df[self.bookings_df['booking_id'] == booking_id].iloc[0]
+        position = self._positions.get(booking_id)
+        if position is None:
+            return False, self._archived_message(booking_id) or "Booking ID not found."
+
+        booking_to_update = self.bookings[position]
 
         if new_status == 'confirmed':
-            guesthouse_id = booking_to_update['guesthouse_id']
-            start_date = booking_to_update['start_date']
-            end_date = booking_to_update['end_date']
-
-            # Temporarily exclude the current booking from availability check
-            original_bookings_df_snapshot = self.bookings_df.copy() # For restore if check fails
-            # Create a temporary df for availability check excluding the one being confirmed
-            temp_check_df = self.bookings_df[self.bookings_df['booking_id'] != booking_id]
-            
-            # Simulate is_guesthouse_available on this temp_check_df
-            available = True
-            relevant_bookings_for_check = temp_check_df[
-                (temp_check_df['guesthouse_id'] == str(guesthouse_id)) &
-                (temp_check_df['status'].isin(['confirmed', 'pending'])) # Check against other pending too
-            ]
-            for _, BKG in relevant_bookings_for_check.iterrows():
-                 if BKG['start_date'] and BKG['end_date']:
-                    if check_date_overlap(start_date, end_date, BKG['start_date'], BKG['end_date']):
-                        available = False
-                        break
-            
-            if not available:
+            # Check against other confirmed and pending bookings, excluding the one being confirmed
+            if not self.is_guesthouse_available(
+                booking_to_update.guesthouse_id, booking_to_update.start_date, booking_to_update.end_date,
+                exclude_booking_id=booking_id
+            ):
                 return False, "Cannot confirm: Guesthouse became unavailable due to another overlapping booking."
-            # No need to restore self.bookings_df here as we only used a copy for check
-
-        self.bookings_df.loc[self.bookings_df['booking_id'] == booking_id, 'status'] = new_status
-        self._save_bookings_and_export_to_db()
-        return True, f"Booking {booking_id} status updated to {new_status}."
 
+        updated_booking = self._set_status(position, new_status)
+        promoted = []
+        if booking_to_update.status in ACTIVE_BOOKING_STATUSES and new_status not in ACTIVE_BOOKING_STATUSES:
+            promoted = self._promote_waitlisted([booking_to_update])
+        self._persist_bookings([updated_booking, *promoted])
+        message = f"Booking {booking_id} status updated to {new_status}."
+        if promoted:
+            message += f" {len(promoted)} waitlisted request(s) promoted to pending."
+        return True, message
+
+    @with_bookings_lock()
+    def bulk_create_bookings(self, items):
+        """Validates and creates many bookings with a single CSV append and SQLite upsert.
+
+        Each item is a dict with guesthouse_id, username, start_date, end_date and an
+        optional status ('pending' by default, or 'confirmed'). Items are checked against
+        existing bookings and against earlier items of the same batch. Returns one
+        result dict per item, in input order.
+        """
+        names = self.guesthouse_service.get_guesthouse_names()
+        usernames = self.user_service.get_usernames()
+        booked_at_str = datetime.now().strftime(DATE_FORMAT)
+        results, accepted = [], []
+        for i, item in enumerate(items):
+            error = validate_bulk_booking_item(item, names, usernames)
+            if error is None and not self.is_guesthouse_available(item['guesthouse_id'], item['start_date'], item['end_date']):
+                error = "Guesthouse not available for selected dates."
+            if error:
+                results.append({'index': i, 'ok': False, 'msg': error})
+                continue
+            booking = Booking.from_dict({
+                'booking_id': str(uuid.uuid4()),
+                'guesthouse_id': str(item['guesthouse_id']),
+                'username': item['username'],
+                'start_date': item['start_date'],
+                'end_date': item['end_date'],
+                'status': item.get('status') or 'pending',
+                'booked_at': booked_at_str
+            })
+            self._put_booking(booking)
+            self._index_booking(booking) # Later items in the batch see this booking
+            accepted.append(booking)
+            results.append({'index': i, 'ok': True, 'booking_id': booking.booking_id, 'msg': "Booking created."})
+
+        if accepted:
+            self._persist_bookings(accepted)
+        return results
+
+    @with_bookings_lock()
+    def bulk_update_status(self, changes):
+        """Applies many (booking_id, new_status) changes with a single persistence flush.
+
+        Rejections are applied before confirmations, so freeing and claiming the same
+        dates in one batch works. Returns one result dict per change, in input order.
+        """
+        order = sorted(range(len(changes)), key=lambda i: changes[i][1] == 'confirmed')
+        results = [None] * len(changes)
+        updated, freed = {}, []
+        for i in order:
+            booking_id, new_status = changes[i]
+            position = self._positions.get(booking_id)
+            if position is None:
+                results[i] = {'booking_id': booking_id, 'ok': False,
+                              'msg': self._archived_message(booking_id) or "Booking ID not found."}
+                continue
+            booking = self.bookings[position]
+            if new_status == 'confirmed' and not self.is_guesthouse_available(
+                booking.guesthouse_id, booking.start_date, booking.end_date, exclude_booking_id=booking_id
+            ):
+                results[i] = {'booking_id': booking_id, 'ok': False,
+                              'msg': "Cannot confirm: Guesthouse became unavailable due to another overlapping booking."}
+                continue
+            if booking.status in ACTIVE_BOOKING_STATUSES and new_status not in ACTIVE_BOOKING_STATUSES:
+                freed.append(booking)
+            updated[booking_id] = self._set_status(position, new_status)
+            results[i] = {'booking_id': booking_id, 'ok': True, 'msg': f"Status updated to {new_status}."}
+
+        # After the whole batch, so its own confirmations are not beaten to the freed dates
+        for promoted in self._promote_waitlisted(freed):
+            updated[promoted.booking_id] = promoted
+        if updated:
+            self._persist_bookings(list(updated.values()))
+        return results
+
+    @with_bookings_lock()
     def cancel_booking(self, booking_id, username):
-        if self.bookings_df.empty or 'booking_id' not in self.bookings_df.columns:
+        if not self.bookings:
             return False, "No bookings found to cancel."
 
-        booking_matches = self.bookings_df[
-            (self.bookings_df['booking_id'] == booking_id) &
-            (self.bookings_df['username'] == username)
-        ]
-
-        if booking_matches.empty:
+        position = self._positions.get(booking_id)
+        if position is None:
+            return False, self._archived_message(booking_id, username) or "Booking not found or you don't have permission to cancel."
+        if self.bookings[position].username != username:
             return False, "Booking not found or you don't have permission to cancel."
 
-        booking_idx = booking_matches.index[0] # Get the index of the first match
-        current_status = self.bookings_df.loc[booking_idx, 'status']
+        current_status = self.bookings[position].status
 
         if current_status == 'cancelled':
              return False, "Booking already cancelled."
-        
-        if current_status in ['pending', 'confirmed']:
-            self.bookings_df.loc[booking_idx, 'status'] = 'cancelled'
-            self._save_bookings_and_export_to_db()
+
+        if current_status in ['pending', 'confirmed', WAITLIST_STATUS]:
+            booking = self.bookings[position]
+            cancelled_booking = self._set_status(position, 'cancelled')
+            # The freed dates go to the waitlist in the same append
+            promoted = self._promote_waitlisted([booking]) if current_status in ACTIVE_BOOKING_STATUSES else []
+            self._persist_bookings([cancelled_booking, *promoted])
             return True, "Booking cancelled successfully."
         else:
             return False, f"Cannot cancel booking with status: {current_status}."
 
-# Instantiate services (Global instances)
-user_service = UserService()
-guesthouse_service = GuesthouseService()
-booking_service = BookingService() # This will now also call _sync_db_on_init
\ No newline at end of file
+    def export_db(self):
+        """Reloads bookings.csv and exports the current bookings to the SQLite DB."""
+        self._reload() # Ensure latest bookings are loaded from CSV before export
+        return export_bookings_to_sqlite(self.lock) # Writes the DB outside the lock
+
+    @with_bookings_lock()
+    def _reload(self):
+        self._load_bookings()
+
+    @contextmanager
+    def report_db(self):
+        """(connection, version) of the SQLite export the reports read.
+
+        The export trails bookings.csv by the write-behind delay; the version
+        is the CSV stamp it caught up to (None until the summaries are built).
+        """
+        conn = connect_db()
+        try:
+            row = conn.execute("SELECT stamp FROM sync_state WHERE source = 'bookings.csv'").fetchone()
+            yield conn, row[0] if row and report_tables_current(conn) else None
+        finally:
+            conn.close()
+
+_LEGACY_SERVICE_NAMES = {'user_service': 'users', 'guesthouse_service': 'guesthouses', 'booking_service': 'bookings'}
+
+def __getattr__(name):
+    # Keeps `from app.services import booking_service` working; builds the service on access
+    if name in _LEGACY_SERVICE_NAMES:
+        from .registry import registry
+        return getattr(registry, _LEGACY_SERVICE_NAMES[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
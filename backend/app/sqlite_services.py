@@ -0,0 +1,494 @@
+import logging
+import uuid
+from contextlib import contextmanager
+from datetime import date, datetime
+import numpy as np
+from .utils import (
+    PRIMARY_DATABASE_FILE, BOOKINGS_FILE, BOOKING_COLUMNS, ACTIVE_BOOKING_STATUSES, WAITLIST_STATUS,
+    DATE_FORMAT, to_iso_date, validate_bulk_booking_item
+)
+from .queries import encode_cursor
+from .records import MISSING_DAY
+from .metrics import span
+from .reports import SummaryDelta, rebuild_report_tables, report_tables_current
+from .storage import (
+    get_primary_connection, get_data_version, booking_to_db_row, booking_from_db_row,
+    import_csvs_to_primary, export_primary_bookings_to_csv
+)
+
+logger = logging.getLogger(__name__)
+
+# Services backed directly by the SQLite primary store (STORAGE_BACKEND=sqlite).
+# They expose the same methods as the CSV-backed services in services.py, and
+# every query is answered from an index instead of an in-memory DataFrame.
+
+BOOKING_SELECT = f"SELECT {', '.join('b.' + col for col in BOOKING_COLUMNS)} FROM bookings b"
+BOOKING_WITH_NAME_SELECT = (
+    f"SELECT {', '.join('b.' + col for col in BOOKING_COLUMNS)}, "
+    "COALESCE(g.name, 'Unknown Guesthouse') AS guesthouse_name "
+    "FROM bookings b LEFT JOIN guesthouses g ON g.id = b.guesthouse_id"
+)
+BOOKING_SELECT_BY_ID = f"SELECT {', '.join(BOOKING_COLUMNS)} FROM bookings WHERE booking_id = ?"
+ACTIVE_STATUS_PLACEHOLDERS = ', '.join('?' for _ in ACTIVE_BOOKING_STATUSES)
+
+
+def _strip_keyset(row):
+    record = booking_from_db_row(row)
+    del record['_sort_value']
+    return record
+
+
+def _iso_to_day(iso_str):
+    """ISO date -> day ordinal as used in cursors (MISSING_DAY if the stored value is not a date)."""
+    try:
+        return date.fromisoformat(iso_str).toordinal()
+    except (TypeError, ValueError):
+        return MISSING_DAY
+
+
+def _day_to_iso(day):
+    return date.fromordinal(day).isoformat() if day > 0 else ''
+
+
+class SqliteUserService:
+    def __init__(self):
+        import_csvs_to_primary(get_primary_connection())
+
+    def get_user(self, username):
+        row = get_primary_connection().execute(
+            "SELECT username, password, role FROM users WHERE username = ?", (username,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def set_password_hash(self, username, password_hash):
+        conn = get_primary_connection()
+        with conn:
+            conn.execute("UPDATE users SET password = ? WHERE username = ?", (password_hash, username))
+
+
+class SqliteGuesthouseService:
+    def __init__(self):
+        import_csvs_to_primary(get_primary_connection())
+        self.etag_prefix = uuid.uuid4().hex[:8] # The DB's version counters restart if the file is recreated
+
+    def current_version(self):
+        return get_data_version(get_primary_connection(), 'guesthouses')
+
+    def get_all_guesthouses(self):
+        rows = get_primary_connection().execute(
+            "SELECT id, location, name, capacity FROM guesthouses ORDER BY rowid"
+        )
+        return [dict(row) for row in rows]
+
+    def find_candidate_guesthouses(self, location, guests, policy='best-fit'):
+        """Ids of guesthouses in `location` with capacity >= guests, in allocation-policy order."""
+        order = {
+            'best-fit': "capacity ASC, rowid ASC",
+            'worst-fit': "capacity DESC, rowid DESC",
+            'first-fit': "rowid ASC",
+        }[policy]
+        # Served by idx_guesthouses_location_capacity
+        rows = get_primary_connection().execute(
+            f"SELECT id FROM guesthouses WHERE location = ? COLLATE NOCASE AND capacity >= ? ORDER BY {order}",
+            (str(location).strip(), guests)
+        )
+        return [row['id'] for row in rows]
+
+    def get_guesthouse_by_id(self, guesthouse_id):
+        row = get_primary_connection().execute(
+            "SELECT id, location, name, capacity FROM guesthouses WHERE id = ?", (str(guesthouse_id),)
+        ).fetchone()
+        return dict(row) if row else None
+
+
+class SqliteBookingService:
+    def __init__(self):
+        import_csvs_to_primary(get_primary_connection())
+        self.etag_prefix = uuid.uuid4().hex[:8] # The DB's version counters restart if the file is recreated
+
+    def _is_available(self, conn, guesthouse_id, start_iso, end_iso, exclude_booking_id=None):
+        # Served by idx_bookings_availability (guesthouse_id, status, start_date, end_date)
+        query = (
+            "SELECT 1 FROM bookings WHERE guesthouse_id = ? "
+            f"AND status IN ({ACTIVE_STATUS_PLACEHOLDERS}) AND start_date <= ? AND end_date >= ?"
+        )
+        params = [str(guesthouse_id), *ACTIVE_BOOKING_STATUSES, end_iso, start_iso]
+        if exclude_booking_id:
+            query += " AND booking_id != ?"
+            params.append(exclude_booking_id)
+        return conn.execute(query + " LIMIT 1", params).fetchone() is None
+
+    def is_guesthouse_available(self, guesthouse_id, start_date_str, end_date_str, exclude_booking_id=None):
+        with span('availability_check'):
+            return self._is_available(
+                get_primary_connection(), guesthouse_id,
+                to_iso_date(start_date_str), to_iso_date(end_date_str), exclude_booking_id
+            )
+
+    def _insert_pending_booking(self, conn, delta, guesthouse_id, username, start_date_str, end_date_str, status='pending'):
+        new_booking_data = {
+            'booking_id': str(uuid.uuid4()),
+            'guesthouse_id': str(guesthouse_id),
+            'username': username,
+            'start_date': start_date_str,
+            'end_date': end_date_str,
+            'status': status,
+            'booked_at': datetime.now().strftime(DATE_FORMAT)
+        }
+        conn.execute(
+            f"INSERT INTO bookings ({', '.join(BOOKING_COLUMNS)}) VALUES ({', '.join('?' for _ in BOOKING_COLUMNS)})",
+            booking_to_db_row(new_booking_data)
+        )
+        delta.add(new_booking_data)
+        return new_booking_data['booking_id']
+
+    def _set_status(self, conn, delta, row, new_status):
+        """Updates a booking's status (row holds its current columns) and its share of the report summaries."""
+        conn.execute("UPDATE bookings SET status = ? WHERE booking_id = ?", (new_status, row['booking_id']))
+        previous = booking_from_db_row(row)
+        delta.replace(previous, {**previous, 'status': new_status})
+
+    @staticmethod
+    def _commit(conn, delta):
+        """Applies the transaction's summary changes, then commits it."""
+        delta.apply(conn)
+        conn.commit()
+
+    def create_booking_request(self, guesthouse_id, username, start_date_str, end_date_str):
+        conn = get_primary_connection()
+        # BEGIN IMMEDIATE takes the write lock before the availability check,
+        # so the check and the insert happen atomically.
+        delta = SummaryDelta()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if not self._is_available(conn, guesthouse_id, to_iso_date(start_date_str), to_iso_date(end_date_str)):
+                conn.rollback()
+                return None, "Guesthouse not available for selected dates."
+            booking_id = self._insert_pending_booking(conn, delta, guesthouse_id, username, start_date_str, end_date_str)
+            self._commit(conn, delta)
+        except Exception:
+            conn.rollback()
+            raise
+        return booking_id, "Booking request submitted successfully."
+
+    def join_waitlist(self, guesthouse_id, username, start_date_str, end_date_str):
+        """Books the dates if they are free, otherwise queues the request; see BookingService.join_waitlist."""
+        conn = get_primary_connection()
+        start_iso, end_iso = to_iso_date(start_date_str), to_iso_date(end_date_str)
+        delta = SummaryDelta()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if self._is_available(conn, guesthouse_id, start_iso, end_iso):
+                booking_id = self._insert_pending_booking(conn, delta, guesthouse_id, username, start_date_str, end_date_str)
+                self._commit(conn, delta)
+                return booking_id, 'pending', "Booking request submitted successfully."
+            already_waiting = conn.execute(
+                "SELECT 1 FROM bookings WHERE guesthouse_id = ? AND status = ? AND start_date <= ? AND end_date >= ? "
+                "AND username = ? LIMIT 1",
+                (str(guesthouse_id), WAITLIST_STATUS, end_iso, start_iso, username)
+            ).fetchone()
+            if already_waiting:
+                conn.rollback()
+                return None, WAITLIST_STATUS, "You are already on the waitlist for these dates."
+            booking_id = self._insert_pending_booking(
+                conn, delta, guesthouse_id, username, start_date_str, end_date_str, status=WAITLIST_STATUS
+            )
+            self._commit(conn, delta)
+        except Exception:
+            conn.rollback()
+            raise
+        return booking_id, WAITLIST_STATUS, "Guesthouse not available; request added to the waitlist."
+
+    def _promote_waitlisted(self, conn, delta, freed):
+        """Promotes waitlisted requests into the freed (guesthouse_id, start_iso, end_iso) intervals, in the caller's transaction.
+
+        Same order as BookingService._promote_waitlisted: most days inside the
+        freed interval first, then first come. Returns the number promoted.
+        """
+        today = date.today().isoformat()
+        promoted = 0
+        for guesthouse_id, freed_start, freed_end in freed:
+            # Served by idx_bookings_availability (guesthouse_id, status, start_date, end_date)
+            rows = conn.execute(
+                f"SELECT rowid, {', '.join(BOOKING_COLUMNS)} FROM bookings "
+                "WHERE guesthouse_id = ? AND status = ? AND start_date <= ? AND end_date >= ? AND start_date >= ?",
+                (guesthouse_id, WAITLIST_STATUS, freed_end, freed_start, today)
+            ).fetchall()
+            first, last = _iso_to_day(freed_start), _iso_to_day(freed_end)
+            if first == MISSING_DAY or last == MISSING_DAY:
+                continue # A legacy booking without valid dates frees nothing
+            rows = [row for row in rows
+                    if _iso_to_day(row['start_date']) != MISSING_DAY and _iso_to_day(row['end_date']) != MISSING_DAY]
+            candidates = sorted(
+                rows, key=lambda row: (
+                    -(min(last, _iso_to_day(row['end_date'])) - max(first, _iso_to_day(row['start_date'])) + 1),
+                    row['rowid']
+                )
+            )
+            for row in candidates:
+                if self._is_available(conn, guesthouse_id, row['start_date'], row['end_date']):
+                    self._set_status(conn, delta, row, 'pending')
+                    promoted += 1
+        return promoted
+
+    def create_booking_in_any(self, guesthouse_ids, username, start_date_str, end_date_str):
+        """Books the first guesthouse in `guesthouse_ids` that is free for the dates, in one transaction.
+
+        Returns (booking_id, guesthouse_id, message); booking_id is None if all are taken.
+        """
+        conn = get_primary_connection()
+        start_iso, end_iso = to_iso_date(start_date_str), to_iso_date(end_date_str)
+        delta = SummaryDelta()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for guesthouse_id in guesthouse_ids:
+                if self._is_available(conn, guesthouse_id, start_iso, end_iso):
+                    booking_id = self._insert_pending_booking(conn, delta, guesthouse_id, username, start_date_str, end_date_str)
+                    self._commit(conn, delta)
+                    return booking_id, guesthouse_id, "Booking request submitted successfully."
+            conn.rollback()
+        except Exception:
+            conn.rollback()
+            raise
+        return None, None, "No guesthouse available in this location for the selected dates and group size."
+
+    def get_user_bookings(self, username):
+        rows = get_primary_connection().execute(
+            BOOKING_SELECT + " WHERE b.username = ? ORDER BY b.rowid", (username,)
+        )
+        return [booking_from_db_row(row) for row in rows]
+
+    def get_all_bookings(self):
+        rows = get_primary_connection().execute(BOOKING_WITH_NAME_SELECT + " ORDER BY b.rowid")
+        return [booking_from_db_row(row) for row in rows]
+
+    def get_pending_bookings(self):
+        rows = get_primary_connection().execute(
+            BOOKING_WITH_NAME_SELECT + " WHERE b.status = 'pending' ORDER BY b.rowid"
+        )
+        return [booking_from_db_row(row) for row in rows]
+
+    def query_bookings(self, query, username=None, with_names=False):
+        """Filtered, sorted, keyset-paginated bookings; see BookingService.query_bookings.
+
+        Rows are streamed straight from the SQLite cursor.
+        """
+        select = BOOKING_WITH_NAME_SELECT if with_names else BOOKING_SELECT
+        sort_col = 'b.booked_at' if query.sort == 'created' else f'b.{query.sort}'
+        direction = 'DESC' if query.descending else 'ASC'
+        where, params = [], []
+        if username is not None:
+            where.append("b.username = ?")
+            params.append(username)
+        if query.guesthouse_id is not None:
+            where.append("b.guesthouse_id = ?")
+            params.append(str(query.guesthouse_id))
+        if query.statuses:
+            where.append(f"b.status IN ({', '.join('?' for _ in query.statuses)})")
+            params.extend(query.statuses)
+        if query.date_from is not None:
+            where.append("b.end_date >= ?")
+            params.append(date.fromordinal(query.date_from).isoformat())
+        if query.date_to is not None:
+            where.append("b.start_date <= ?")
+            params.append(date.fromordinal(query.date_to).isoformat())
+        if query.after is not None:
+            # Same keyset as the CSV backend: (sort day, booking_id), carried in the cursor as a day ordinal
+            after_day, after_id = query.after
+            after_value = _day_to_iso(after_day)
+            op = '<' if query.descending else '>'
+            where.append(f"({sort_col} {op} ? OR ({sort_col} = ? AND b.booking_id {op} ?))")
+            params.extend([after_value, after_value, after_id])
+
+        sql = f"SELECT {sort_col} AS _sort_value, " + select[len('SELECT '):]
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY {sort_col} {direction}, b.booking_id {direction}"
+        if query.limit is not None:
+            sql += " LIMIT ?"
+            params.append(query.limit + 1)
+        cursor = get_primary_connection().execute(sql, params)
+
+        if query.limit is None:
+            return (_strip_keyset(row) for row in cursor), None
+        rows = cursor.fetchall()
+        next_cursor = None
+        if len(rows) > query.limit:
+            rows = rows[:query.limit]
+            next_cursor = encode_cursor(_iso_to_day(rows[-1]['_sort_value']), rows[-1]['booking_id'])
+        return (_strip_keyset(row) for row in rows), next_cursor
+
+    def status_counts(self):
+        rows = get_primary_connection().execute("SELECT status, COUNT(*) FROM bookings GROUP BY status")
+        return {status: count for status, count in rows}
+
+    def current_version(self):
+        return get_data_version(get_primary_connection(), 'bookings')
+
+    def user_version(self, username):
+        # There is no per-user counter in the DB; any booking change invalidates every user's listing
+        return self.current_version()
+
+    def active_intervals(self, window_start, window_end):
+        """(guesthouse_ids, starts, ends) of pending/confirmed bookings overlapping the window (day ordinals)."""
+        rows = get_primary_connection().execute(
+            "SELECT guesthouse_id, start_date, end_date FROM bookings "
+            f"WHERE status IN ({ACTIVE_STATUS_PLACEHOLDERS}) AND start_date <= ? AND end_date >= ?",
+            [*ACTIVE_BOOKING_STATUSES, date.fromordinal(window_end).isoformat(), date.fromordinal(window_start).isoformat()]
+        ).fetchall()
+        if not rows:
+            return [], [], []
+        guesthouse_ids, starts, ends = zip(*rows)
+        # ISO dates convert to day numbers in one vectorized pass
+        epoch = date(1970, 1, 1).toordinal()
+        starts = np.array(starts, dtype='datetime64[D]').astype(np.int64) + epoch
+        ends = np.array(ends, dtype='datetime64[D]').astype(np.int64) + epoch
+        return list(guesthouse_ids), starts, ends
+
+    def update_booking_status(self, booking_id, new_status, admin_username=None):
+        conn = get_primary_connection()
+        delta = SummaryDelta()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            booking = conn.execute(BOOKING_SELECT_BY_ID, (booking_id,)).fetchone()
+            if booking is None:
+                conn.rollback()
+                return False, "Booking ID not found."
+
+            if new_status == 'confirmed' and not self._is_available(
+                conn, booking['guesthouse_id'], booking['start_date'], booking['end_date'], booking_id
+            ):
+                conn.rollback()
+                return False, "Cannot confirm: Guesthouse became unavailable due to another overlapping booking."
+
+            self._set_status(conn, delta, booking, new_status)
+            promoted = 0
+            if booking['status'] in ACTIVE_BOOKING_STATUSES and new_status not in ACTIVE_BOOKING_STATUSES:
+                promoted = self._promote_waitlisted(
+                    conn, delta, [(booking['guesthouse_id'], booking['start_date'], booking['end_date'])]
+                )
+            self._commit(conn, delta)
+        except Exception:
+            conn.rollback()
+            raise
+        message = f"Booking {booking_id} status updated to {new_status}."
+        if promoted:
+            message += f" {promoted} waitlisted request(s) promoted to pending."
+        return True, message
+
+    def bulk_create_bookings(self, items):
+        """Validates and creates many bookings in one transaction; see BookingService.bulk_create_bookings."""
+        conn = get_primary_connection()
+        results = []
+        delta = SummaryDelta()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            known_ids = {row['id'] for row in conn.execute("SELECT id FROM guesthouses")}
+            known_usernames = {row['username'] for row in conn.execute("SELECT username FROM users")}
+            for i, item in enumerate(items):
+                error = validate_bulk_booking_item(item, known_ids, known_usernames)
+                # Earlier inserts of this batch are visible to the check inside the transaction
+                if error is None and not self._is_available(
+                    conn, item['guesthouse_id'], to_iso_date(item['start_date']), to_iso_date(item['end_date'])
+                ):
+                    error = "Guesthouse not available for selected dates."
+                if error:
+                    results.append({'index': i, 'ok': False, 'msg': error})
+                    continue
+                booking_id = self._insert_pending_booking(
+                    conn, delta, item['guesthouse_id'], item['username'], item['start_date'], item['end_date'],
+                    status=item.get('status') or 'pending'
+                )
+                results.append({'index': i, 'ok': True, 'booking_id': booking_id, 'msg': "Booking created."})
+            self._commit(conn, delta)
+        except Exception:
+            conn.rollback()
+            raise
+        return results
+
+    def bulk_update_status(self, changes):
+        """Applies many (booking_id, new_status) changes in one transaction; rejections first."""
+        conn = get_primary_connection()
+        order = sorted(range(len(changes)), key=lambda i: changes[i][1] == 'confirmed')
+        results = [None] * len(changes)
+        freed = []
+        delta = SummaryDelta()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for i in order:
+                booking_id, new_status = changes[i]
+                booking = conn.execute(BOOKING_SELECT_BY_ID, (booking_id,)).fetchone()
+                if booking is None:
+                    results[i] = {'booking_id': booking_id, 'ok': False, 'msg': "Booking ID not found."}
+                    continue
+                if new_status == 'confirmed' and not self._is_available(
+                    conn, booking['guesthouse_id'], booking['start_date'], booking['end_date'], booking_id
+                ):
+                    results[i] = {'booking_id': booking_id, 'ok': False,
+                                  'msg': "Cannot confirm: Guesthouse became unavailable due to another overlapping booking."}
+                    continue
+                self._set_status(conn, delta, booking, new_status)
+                if booking['status'] in ACTIVE_BOOKING_STATUSES and new_status not in ACTIVE_BOOKING_STATUSES:
+                    freed.append((booking['guesthouse_id'], booking['start_date'], booking['end_date']))
+                results[i] = {'booking_id': booking_id, 'ok': True, 'msg': f"Status updated to {new_status}."}
+            self._promote_waitlisted(conn, delta, freed) # After the batch's own confirmations
+            self._commit(conn, delta)
+        except Exception:
+            conn.rollback()
+            raise
+        return results
+
+    def cancel_booking(self, booking_id, username):
+        conn = get_primary_connection()
+        delta = SummaryDelta()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            booking = conn.execute(BOOKING_SELECT_BY_ID + " AND username = ?", (booking_id, username)).fetchone()
+            if booking is None:
+                conn.rollback()
+                return False, "Booking not found or you don't have permission to cancel."
+
+            current_status = booking['status']
+            if current_status == 'cancelled':
+                conn.rollback()
+                return False, "Booking already cancelled."
+            if current_status not in ACTIVE_BOOKING_STATUSES and current_status != WAITLIST_STATUS:
+                conn.rollback()
+                return False, f"Cannot cancel booking with status: {current_status}."
+
+            self._set_status(conn, delta, booking, 'cancelled')
+            if current_status in ACTIVE_BOOKING_STATUSES: # The freed dates go to the waitlist in the same transaction
+                self._promote_waitlisted(conn, delta, [(booking['guesthouse_id'], booking['start_date'], booking['end_date'])])
+            self._commit(conn, delta)
+        except Exception:
+            conn.rollback()
+            raise
+        return True, "Booking cancelled successfully."
+
+    @contextmanager
+    def report_db(self):
+        """(connection, version) for the reports: the primary store, whose summaries each booking transaction updates.
+
+        They are only rebuilt from every booking when missing or from an older version.
+        """
+        conn = get_primary_connection()
+        if not report_tables_current(conn):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if not report_tables_current(conn): # Another thread or worker may have rebuilt them meanwhile
+                    rows = conn.execute(f"SELECT {', '.join(BOOKING_COLUMNS)} FROM bookings")
+                    rebuild_report_tables(conn, [booking_from_db_row(row) for row in rows])
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        yield conn, get_data_version(conn, 'bookings')
+
+    def export_db(self):
+        """In sqlite mode the DB is the source of truth; export writes bookings.csv from it."""
+        try:
+            export_primary_bookings_to_csv(get_primary_connection())
+            return True, f"Bookings exported from {PRIMARY_DATABASE_FILE} to {BOOKINGS_FILE} successfully."
+        except Exception as e:
+            logger.error("Failed to export bookings to CSV: %s", e)
+            return False, f"Error exporting bookings to CSV: {str(e)}"
@@ -0,0 +1,523 @@
+import csv
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError: # Windows: only threads within one process are serialized
+    fcntl = None
+from .metrics import metrics, timed
+from .utils import (
+    USERS_FILE, GUESTHOUSES_FILE, BOOKINGS_FILE, DATABASE_FILE, PRIMARY_DATABASE_FILE,
+    BOOKING_COLUMNS, to_iso_date, from_iso_date
+)
+from .reports import (
+    REPORT_TABLES_SQL, update_report_tables, rebuild_report_tables, pending_booking_ids, report_tables_current
+)
+
+logger = logging.getLogger(__name__)
+
+# bookings.csv is an append-only log: a new booking appends one row and a status
+# change appends the updated row again. When loading, the last row for a
+# booking_id wins. compact_bookings_csv() rewrites the file with one row per booking.
+
+BOOKINGS_LOCK_FILE = f'{BOOKINGS_FILE}.lock'
+
+
+class InterProcessLock:
+    """Re-entrant reader/writer lock shared by threads in this process and, via flock, by other worker processes.
+
+    Shared holders run concurrently, in this process and across processes;
+    an exclusive holder excludes everyone. Waiting writers block new readers,
+    so a stream of reads cannot starve a booking. While any thread here holds
+    the lock, the process holds one flock on the lock file: LOCK_SH taken by
+    the first reader and released by the last, or LOCK_EX for the writer.
+
+    Nested acquisitions in a thread only count depth, so nested calls (e.g.
+    compaction during a save, a shared read inside a write) do not deadlock
+    against themselves. Asking for exclusive while holding shared raises
+    RuntimeError: two readers upgrading at once would deadlock.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._cond = threading.Condition()
+        self._local = threading.local() # .depth, .shared of this thread's hold
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+        self._file = None
+        self._file_mutex = threading.Lock() # Readers arriving together take the flock once
+
+    def held(self):
+        """True if the calling thread holds the lock (shared or exclusive)."""
+        return getattr(self._local, 'depth', 0) > 0
+
+    def _open_and_flock(self, shared):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._file = open(self.path, 'a+')
+        if fcntl is not None:
+            try:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            except BaseException:
+                self._file.close()
+                self._file = None
+                raise
+
+    def _unflock_and_close(self):
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        self._file.close()
+        self._file = None
+
+    def _acquire_shared(self):
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            # Outside the condition: the first reader may wait here for other processes
+            with self._file_mutex:
+                if self._file is None:
+                    self._open_and_flock(shared=True)
+        except BaseException:
+            self._release_shared()
+            raise
+
+    def _release_shared(self):
+        with self._cond:
+            self._readers -= 1
+            if self._readers == 0:
+                with self._file_mutex:
+                    if self._file is not None:
+                        self._unflock_and_close()
+                self._cond.notify_all()
+
+    def _acquire_exclusive(self):
+        with self._cond:
+            self._writers_waiting += 1
+            try:
+                while self._writer or self._readers:
+                    self._cond.wait()
+            finally:
+                self._writers_waiting -= 1
+            self._writer = True
+        try:
+            self._open_and_flock(shared=False)
+        except BaseException:
+            self._release_exclusive()
+            raise
+
+    def _release_exclusive(self):
+        with self._cond:
+            if self._file is not None:
+                self._unflock_and_close()
+            self._writer = False
+            self._cond.notify_all()
+
+    @contextmanager
+    def hold(self, shared=False):
+        local = self._local
+        depth = getattr(local, 'depth', 0)
+        if depth:
+            if local.shared and not shared:
+                raise RuntimeError(f"Cannot upgrade a shared hold on {self.path} to exclusive.")
+            local.depth += 1
+            try:
+                yield
+            finally:
+                local.depth -= 1
+            return
+
+        started = time.perf_counter()
+        if shared:
+            self._acquire_shared()
+        else:
+            self._acquire_exclusive()
+        metrics.observe(
+            'guesthouse_lock_wait_seconds', time.perf_counter() - started,
+            lock=os.path.basename(self.path), mode='shared' if shared else 'exclusive'
+        )
+        local.depth, local.shared = 1, shared
+        try:
+            yield
+        finally:
+            local.depth = 0
+            if shared:
+                self._release_shared()
+            else:
+                self._release_exclusive()
+
+
+def file_stamp(path):
+    """(inode, size, mtime_ns) of a file, or None if it does not exist.
+
+    A grown size with the same inode means rows were appended; a new inode
+    means the file was replaced (e.g. compacted) and must be reloaded.
+    """
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+def read_booking_rows_from(offset, path=BOOKINGS_FILE):
+    """Reads booking rows appended to the CSV log after byte `offset`."""
+    with open(path, newline='') as f:
+        header = next(csv.reader([f.readline()]), BOOKING_COLUMNS)
+        f.seek(max(offset, f.tell()))
+        return [dict(zip(header, row)) for row in csv.reader(f) if row]
+
+
+def init_bookings_csv():
+    """Creates bookings.csv with headers if it is missing, empty or lacks columns.
+
+    Only the header line is read, so this stays cheap however long the history is.
+    """
+    if not os.path.exists(BOOKINGS_FILE):
+        compact_bookings_csv([])
+        logger.debug("%s created.", BOOKINGS_FILE)
+        return
+    with open(BOOKINGS_FILE, newline='') as f:
+        header = next(csv.reader(f), None)
+    if not header:
+        logger.warning("%s is empty. Initializing with headers.", BOOKINGS_FILE)
+        compact_bookings_csv([])
+    elif not all(col in header for col in BOOKING_COLUMNS):
+        logger.warning("%s has missing columns. Re-initializing with headers.", BOOKINGS_FILE)
+        compact_bookings_csv([])
+
+
+BOOKINGS_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS bookings (
+    booking_id TEXT PRIMARY KEY,
+    guesthouse_id TEXT,
+    username TEXT,
+    start_date TEXT,
+    end_date TEXT,
+    status TEXT,
+    booked_at TEXT
+)
+"""
+
+# Which bookings.csv state (file stamp + booking count) the export table reflects,
+# so startup can skip the full re-export when nothing changed.
+SYNC_STATE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS sync_state (
+    source TEXT PRIMARY KEY,
+    stamp TEXT,
+    row_count INTEGER
+)
+"""
+
+UPSERT_BOOKING_SQL = f"""
+INSERT INTO bookings ({', '.join(BOOKING_COLUMNS)})
+VALUES ({', '.join('?' for _ in BOOKING_COLUMNS)})
+ON CONFLICT(booking_id) DO UPDATE SET
+    {', '.join(f'{col} = excluded.{col}' for col in BOOKING_COLUMNS if col != 'booking_id')}
+"""
+
+
+def booking_row(record):
+    """Converts a booking dict into a list of CSV/SQLite values in BOOKING_COLUMNS order."""
+    row = []
+    for col in BOOKING_COLUMNS:
+        value = record.get(col)
+        # NaN (float) and None are both written as empty strings
+        row.append('' if value is None or value != value else str(value))
+    return row
+
+
+@timed('csv_append')
+def append_booking_rows(records, path=BOOKINGS_FILE):
+    """Appends booking records to the CSV log, writing the header if the file is new."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    needs_header = not os.path.exists(path) or os.path.getsize(path) == 0
+    needs_newline = False
+    if not needs_header:
+        with open(path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            needs_newline = f.read(1) not in (b'\n', b'\r')
+
+    with open(path, 'a', newline='') as f:
+        if needs_newline:
+            f.write('\n')
+        writer = csv.writer(f, lineterminator='\n')
+        if needs_header:
+            writer.writerow(BOOKING_COLUMNS)
+        writer.writerows(booking_row(record) for record in records)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+@timed('csv_compact')
+def compact_bookings_csv(records, path=BOOKINGS_FILE):
+    """Rewrites the CSV log with exactly one row per booking (atomic replace)."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', newline='') as f:
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow(BOOKING_COLUMNS)
+        writer.writerows(booking_row(record) for record in records)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def connect_db(path=DATABASE_FILE):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.execute(BOOKINGS_TABLE_SQL)
+    conn.execute(SYNC_STATE_TABLE_SQL)
+    conn.executescript(REPORT_TABLES_SQL)
+    return conn
+
+
+def stamp_to_text(stamp):
+    return ':'.join(str(part) for part in stamp) if stamp else None
+
+
+def parse_stamp_text(text):
+    """Inverse of stamp_to_text; None for a missing or malformed stamp."""
+    try:
+        return tuple(int(part) for part in text.split(':'))
+    except (AttributeError, ValueError):
+        return None
+
+
+def _write_sync_state(conn, stamp, row_count):
+    conn.execute(
+        "INSERT OR REPLACE INTO sync_state (source, stamp, row_count) VALUES ('bookings.csv', ?, ?)",
+        (stamp_to_text(stamp), row_count)
+    )
+
+
+def _read_sync_state(conn):
+    try:
+        row = conn.execute("SELECT stamp, row_count FROM sync_state WHERE source = 'bookings.csv'").fetchone()
+        return tuple(row) if row and report_tables_current(conn) else None
+    except sqlite3.OperationalError: # No sync_state table yet (export from an older version)
+        return None
+
+
+def read_sync_state(path=DATABASE_FILE):
+    """(stamp text, row_count) recorded by the last export/upsert, or None if unknown.
+
+    Also None when the report summaries are missing or outdated, so the next
+    sync does a full export that rebuilds them.
+    """
+    if not os.path.exists(path):
+        return None
+    conn = sqlite3.connect(path)
+    try:
+        return _read_sync_state(conn)
+    finally:
+        conn.close()
+
+
+_UNCHECKED = object()
+
+
+def _begin_if_sync_state(conn, expected):
+    """Opens a write transaction; returns False (rolled back) if sync_state no longer reads `expected`.
+
+    Syncs snapshot bookings.csv under the bookings lock but write the DB after
+    releasing it, so another process may have synced in between; its newer
+    rows must not be overwritten with older ones.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    if expected is not _UNCHECKED and _read_sync_state(conn) != expected:
+        conn.rollback()
+        return False
+    return True
+
+
+def record_sync_state(stamp, row_count, path=DATABASE_FILE):
+    conn = connect_db(path)
+    try:
+        with conn:
+            _write_sync_state(conn, stamp, row_count)
+    finally:
+        conn.close()
+
+
+def replace_bookings_table(records, path=DATABASE_FILE, stamp=None, expected_state=_UNCHECKED):
+    """Recreates the bookings table and the report summaries from scratch (used for full exports only).
+
+    With `expected_state` (a read_sync_state() result) nothing is written
+    unless the DB still records that state; returns whether it was written.
+    """
+    records = list(records)
+    conn = connect_db(path)
+    try:
+        with conn:
+            if not _begin_if_sync_state(conn, expected_state):
+                return False
+            rebuild_report_tables(conn, records, pending_ids=pending_booking_ids(conn))
+            # Drop first so older exports without a primary key get the keyed schema
+            conn.execute("DROP TABLE IF EXISTS bookings")
+            conn.execute(BOOKINGS_TABLE_SQL)
+            conn.execute(SYNC_STATE_TABLE_SQL)
+            conn.executemany(UPSERT_BOOKING_SQL, (booking_row(record) for record in records))
+            row_count = conn.execute("SELECT COUNT(*) FROM bookings").fetchone()[0]
+            _write_sync_state(conn, stamp, row_count)
+        return True
+    finally:
+        conn.close()
+
+
+@timed('sqlite_upsert')
+def upsert_bookings(records, path=DATABASE_FILE, stamp=None, row_count=None, expected_state=_UNCHECKED):
+    """Inserts or updates booking rows by booking_id in a single transaction.
+
+    When the caller passes the CSV stamp the rows were read up to, it is
+    recorded in the same transaction, with `row_count` (or the table's count).
+    The report summaries are updated in that transaction too. `expected_state`
+    works as in replace_bookings_table; returns whether the rows were written.
+    """
+    records = list(records)
+    conn = connect_db(path)
+    try:
+        with conn:
+            if not _begin_if_sync_state(conn, expected_state):
+                return False
+            update_report_tables(conn, records)
+            conn.executemany(UPSERT_BOOKING_SQL, (booking_row(record) for record in records))
+            if stamp is not None:
+                if row_count is None:
+                    row_count = conn.execute("SELECT COUNT(*) FROM bookings").fetchone()[0]
+                _write_sync_state(conn, stamp, row_count)
+        return True
+    finally:
+        conn.close()
+
+
+# --- SQLite primary store (STORAGE_BACKEND=sqlite) ---
+# Dates are stored as ISO YYYY-MM-DD so range predicates can use the indexes;
+# the API keeps speaking DD-MM-YYYY. CSV files are only used for import/export.
+
+PRIMARY_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    password TEXT NOT NULL,
+    role TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS guesthouses (
+    id TEXT PRIMARY KEY,
+    location TEXT,
+    name TEXT,
+    capacity INTEGER
+);
+CREATE TABLE IF NOT EXISTS bookings (
+    booking_id TEXT PRIMARY KEY,
+    guesthouse_id TEXT NOT NULL,
+    username TEXT NOT NULL,
+    start_date TEXT NOT NULL,
+    end_date TEXT NOT NULL,
+    status TEXT NOT NULL,
+    booked_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_bookings_availability ON bookings (guesthouse_id, status, start_date, end_date);
+CREATE INDEX IF NOT EXISTS idx_bookings_username ON bookings (username);
+CREATE INDEX IF NOT EXISTS idx_bookings_status ON bookings (status);
+CREATE INDEX IF NOT EXISTS idx_guesthouses_location_capacity ON guesthouses (location COLLATE NOCASE, capacity);
+CREATE TABLE IF NOT EXISTS data_versions (
+    collection TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+);
+INSERT OR IGNORE INTO data_versions (collection, version) VALUES ('users', 0), ('guesthouses', 0), ('bookings', 0);
+"""
+
+# Every write to a table bumps its counter in data_versions, whichever process
+# made it, so caches can be keyed on (collection, version).
+for _table in ('users', 'guesthouses', 'bookings'):
+    for _event in ('INSERT', 'UPDATE', 'DELETE'):
+        PRIMARY_SCHEMA_SQL += (
+            f"CREATE TRIGGER IF NOT EXISTS {_table}_version_{_event.lower()} AFTER {_event} ON {_table} "
+            f"BEGIN UPDATE data_versions SET version = version + 1 WHERE collection = '{_table}'; END;\n"
+        )
+
+_primary_local = threading.local()
+
+
+def get_primary_connection(path=PRIMARY_DATABASE_FILE):
+    """Returns this thread's connection to the primary store, creating the schema on first use."""
+    conn = getattr(_primary_local, 'conn', None)
+    if conn is None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = sqlite3.connect(path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(PRIMARY_SCHEMA_SQL)
+        conn.executescript(REPORT_TABLES_SQL)
+        _primary_local.conn = conn
+    return conn
+
+
+def get_data_version(conn, collection):
+    return conn.execute("SELECT version FROM data_versions WHERE collection = ?", (collection,)).fetchone()[0]
+
+
+def booking_to_db_row(record):
+    """Booking dict (DD-MM-YYYY dates) -> primary store row (ISO dates)."""
+    row = booking_row(record)
+    for col in ('start_date', 'end_date', 'booked_at'):
+        i = BOOKING_COLUMNS.index(col)
+        row[i] = to_iso_date(row[i])
+    return row
+
+
+def booking_from_db_row(row):
+    """Primary store row -> booking dict in the API's DD-MM-YYYY format."""
+    record = dict(row)
+    for col in ('start_date', 'end_date', 'booked_at'):
+        if col in record:
+            record[col] = from_iso_date(record[col])
+    return record
+
+
+def read_csv_records(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, newline='') as f:
+        return list(csv.DictReader(f))
+
+
+def import_csvs_to_primary(conn, force=False):
+    """Loads users, guesthouses and bookings CSVs into the primary store.
+
+    Only runs when the store is empty unless force=True. Rows are upserted in
+    file order, so the latest row of the bookings log wins. The report
+    summaries are rebuilt in the same transaction.
+    """
+    if not force and conn.execute("SELECT EXISTS (SELECT 1 FROM users)").fetchone()[0]:
+        return False
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO users (username, password, role) VALUES (?, ?, ?)",
+            ((r['username'], r['password'], r['role']) for r in read_csv_records(USERS_FILE))
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO guesthouses (id, location, name, capacity) VALUES (?, ?, ?, ?)",
+            ((str(r['id']), r['location'], r['name'], int(r['capacity'] or 0)) for r in read_csv_records(GUESTHOUSES_FILE))
+        )
+        conn.executemany(
+            f"INSERT OR REPLACE INTO bookings ({', '.join(BOOKING_COLUMNS)}) VALUES ({', '.join('?' for _ in BOOKING_COLUMNS)})",
+            (booking_to_db_row(r) for r in read_csv_records(BOOKINGS_FILE) if r.get('booking_id'))
+        )
+        # From here on each booking transaction keeps the report summaries up to date
+        rows = conn.execute(f"SELECT {', '.join(BOOKING_COLUMNS)} FROM bookings")
+        rebuild_report_tables(conn, [booking_from_db_row(row) for row in rows])
+    logger.debug("Imported CSV data into %s.", PRIMARY_DATABASE_FILE)
+    return True
+
+
+def export_primary_bookings_to_csv(conn, path=BOOKINGS_FILE):
+    """Writes every booking in the primary store to bookings.csv (DD-MM-YYYY dates)."""
+    cursor = conn.execute(f"SELECT {', '.join(BOOKING_COLUMNS)} FROM bookings ORDER BY rowid")
+    compact_bookings_csv((booking_from_db_row(row) for row in cursor), path=path)
@@ -0,0 +1,181 @@
+import csv
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from .utils import REVOKED_TOKENS_FILE
+from .storage import InterProcessLock, file_stamp
+from .metrics import record_cache_lookup
+
+# Server-side state for access tokens. ClaimsCache remembers tokens that
+# already passed full verification (signature, expiry, revocation), so a
+# client polling with the same token skips the decode and HMAC until the
+# token's exp; auth.py still checks every hit against the revocation list.
+# TokenRevocationList holds revoked
+# token ids (logout) and per-user cutoffs (revoke every token issued to a user
+# so far); it is kept in memory and appended to a small CSV that every worker
+# re-reads when its stamp changes, so a revocation in one process applies to
+# all of them. Tokens carry an iat_ms claim (see auth.init_app) because the
+# standard iat has whole-second precision: compared against a cutoff it would
+# also revoke a token issued right after it, in the same second.
+
+JWT_CLAIMS_CACHE_SIZE = int(os.getenv('JWT_CLAIMS_CACHE_SIZE', '4096'))
+REVOCATION_COLUMNS = ['kind', 'key', 'revoked_at', 'expires_at']
+REVOCATION_COMPACT_ROWS = 256 # Rewrite the file without expired entries once this many pile up
+
+
+class ClaimsCache:
+    """LRU of verified tokens: digest -> (expires at epoch or None, claims)."""
+
+    def __init__(self, max_entries=JWT_CLAIMS_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(token, secret):
+        # The signing key is part of the digest, so a token is never served from another app's entry
+        return hashlib.sha256(f'{secret}\0{token}'.encode('utf-8')).digest()
+
+    def get(self, key):
+        if self.max_entries <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] is not None and entry[0] <= time.time():
+                del self._entries[key] # Expired: full verification reports it as such
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+        record_cache_lookup('jwt_claims', entry is not None)
+        return entry[1] if entry is not None else None
+
+    def put(self, key, expires_at, claims):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (expires_at, claims)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+claims_cache = ClaimsCache()
+
+
+def issued_at(claims):
+    """When the token was issued, in epoch seconds (millisecond precision when it has iat_ms)."""
+    if 'iat_ms' in claims:
+        return claims['iat_ms'] / 1000
+    return claims.get('iat', 0) # Tokens issued before iat_ms existed
+
+
+def _epoch(text):
+    return float(text) if text else None
+
+
+def _text(epoch):
+    return '' if epoch is None else epoch
+
+
+class TokenRevocationList:
+    """Revoked token ids and per-user cutoffs, checked in O(1) and shared across workers via a CSV file.
+
+    Entries are dropped once every token they could match has expired.
+    """
+
+    def __init__(self, path=REVOKED_TOKENS_FILE):
+        self.path = path
+        self._file_lock = InterProcessLock(f'{path}.lock')
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._tokens = {} # jti -> expires at (None: never)
+        self._users = {}  # username -> (revoked at, expires at); tokens issued at or before it are revoked
+        self._expired_rows = 0
+
+    def _refresh(self):
+        stamp = file_stamp(self.path)
+        if stamp == self._stamp:
+            return
+        with self._lock:
+            if stamp != self._stamp:
+                self._load(stamp)
+
+    def _load(self, stamp):
+        tokens, users, expired, now = {}, {}, 0, time.time()
+        if stamp is not None:
+            with open(self.path, newline='') as f:
+                for row in csv.DictReader(f):
+                    expires_at = _epoch(row.get('expires_at'))
+                    if expires_at is not None and expires_at <= now:
+                        expired += 1
+                    elif row.get('kind') == 'token':
+                        tokens[row['key']] = expires_at
+                    elif row.get('kind') == 'user':
+                        entry = (float(row['revoked_at']), expires_at)
+                        users[row['key']] = max(users.get(row['key'], entry), entry, key=lambda e: e[0]) # The newest cutoff covers older ones
+        self._tokens, self._users, self._expired_rows, self._stamp = tokens, users, expired, stamp
+
+    def is_revoked(self, claims, identity_claim='sub'):
+        self._refresh()
+        if claims.get('jti') in self._tokens:
+            return True
+        entry = self._users.get(claims.get(identity_claim))
+        return entry is not None and issued_at(claims) <= entry[0]
+
+    def revoke_token(self, jti, expires_at=None):
+        self._write(['token', jti, time.time(), _text(expires_at)])
+
+    def revoke_user(self, username, token_lifetime=None):
+        """Revokes every token issued to `username` until now (`token_lifetime` in seconds, None if tokens never expire)."""
+        now = time.time()
+        self._write(['user', username, now, _text(None if token_lifetime is None else now + token_lifetime)])
+
+    def _write(self, row):
+        with self._file_lock.hold():
+            with self._lock:
+                self._load(file_stamp(self.path)) # Pick up entries other workers wrote
+                if self._expired_rows >= REVOCATION_COMPACT_ROWS:
+                    self._rewrite(row)
+                else:
+                    self._append(row)
+                self._load(file_stamp(self.path))
+
+    def _append(self, row):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        needs_header = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        with open(self.path, 'a', newline='') as f:
+            writer = csv.writer(f, lineterminator='\n')
+            if needs_header:
+                writer.writerow(REVOCATION_COLUMNS)
+            writer.writerow(row)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _rewrite(self, row):
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w', newline='') as f:
+            writer = csv.writer(f, lineterminator='\n')
+            writer.writerow(REVOCATION_COLUMNS)
+            writer.writerows(['token', jti, '', _text(expires_at)] for jti, expires_at in self._tokens.items())
+            writer.writerows(['user', username, revoked_at, _text(expires_at)] for username, (revoked_at, expires_at) in self._users.items())
+            writer.writerow(row)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def counts(self):
+        self._refresh()
+        return {'tokens': len(self._tokens), 'users': len(self._users)}
+
+
+token_revocations = TokenRevocationList()
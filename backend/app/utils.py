@@ -1,34 +1,112 @@
-import pandas as pd
-from datetime import datetime
+from datetime import date, datetime
+from functools import lru_cache
 
 DATA_DIR = 'data'
 USERS_FILE = f'{DATA_DIR}/users.csv'
 GUESTHOUSES_FILE = f'{DATA_DIR}/guesthouses.csv'
 BOOKINGS_FILE = f'{DATA_DIR}/bookings.csv'
-DATABASE_FILE = 'instance/bookings.db' # SQLite DB path
+ARCHIVE_DIR = f'{DATA_DIR}/archive' # Columnar archive of finished bookings (see archive.py)
+DATABASE_FILE = 'instance/bookings.db' # SQLite DB path (reporting export in csv mode)
+PRIMARY_DATABASE_FILE = 'instance/guesthouse.db' # SQLite primary store (sqlite mode)
+REVOKED_TOKENS_FILE = 'instance/revoked_tokens.csv' # Logged-out tokens and per-user revocations (see tokens.py)
+
+BOOKING_COLUMNS = ['booking_id', 'guesthouse_id', 'username', 'start_date', 'end_date', 'status', 'booked_at']
+
+# Bookings in these states block the guesthouse for their date range
+ACTIVE_BOOKING_STATUSES = ('confirmed', 'pending')
+
+# Requests queued for dates that were taken; promoted to pending when a clashing booking is cancelled or rejected
+WAITLIST_STATUS = 'waitlisted'
+
+MAX_BULK_ITEMS = 5000 # Largest batch accepted by the bulk booking endpoints
+
+# How "any free guesthouse" requests choose among guesthouses with enough capacity:
+# best-fit = smallest sufficient capacity, worst-fit = largest, first-fit = guesthouses.csv order
+ALLOCATION_POLICIES = ('best-fit', 'first-fit', 'worst-fit')
 
 DATE_FORMAT = "%d-%m-%Y" # As per your screenshot for bookings.csv
 
-def parse_date_string(date_str):
-    if not date_str or pd.isna(date_str):
-        return None
+# Dates are parsed once into day ordinals (date.toordinal()), the canonical form
+# used for every comparison; DD-MM-YYYY strings are only the wire/CSV format.
+# Bookings reuse a small set of date strings, so parses are memoized.
+DATE_CACHE_SIZE = 8192 # Distinct date strings (about 22 years of days) kept by the parse/format caches
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def _parse_day(text):
+    # Fast path for zero-padded DD-MM-YYYY; strptime handles the rest (e.g. "1-6-2025")
+    digits = text[:2] + text[3:5] + text[6:]
+    if len(text) == 10 and text[2] == '-' and text[5] == '-' and digits.isascii() and digits.isdigit():
+        try:
+            return date(int(text[6:]), int(text[3:5]), int(text[:2])).toordinal()
+        except ValueError:
+            return None
     try:
-        return datetime.strptime(str(date_str), DATE_FORMAT).date()
+        return datetime.strptime(text, DATE_FORMAT).toordinal()
     except ValueError:
-        return None # Or raise an error
+        return None
+
+def date_string_to_ordinal(date_str):
+    """Parses a DD-MM-YYYY string into a day ordinal (int), or None if invalid."""
+    if not date_str or date_str != date_str: # Empty, None or NaN (NaN != NaN)
+        return None
+    return _parse_day(str(date_str))
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def format_day(ordinal):
+    """Day ordinal -> DD-MM-YYYY."""
+    return date.fromordinal(ordinal).strftime(DATE_FORMAT)
+
+def parse_date_string(date_str):
+    ordinal = date_string_to_ordinal(date_str)
+    return date.fromordinal(ordinal) if ordinal is not None else None # Or raise an error
+
+def to_iso_date(date_str):
+    """DD-MM-YYYY -> YYYY-MM-DD (sortable). Unparseable values are returned unchanged."""
+    ordinal = date_string_to_ordinal(date_str)
+    return date.fromordinal(ordinal).isoformat() if ordinal is not None else date_str
+
+def from_iso_date(iso_str):
+    """YYYY-MM-DD -> DD-MM-YYYY for the API. Anything else is returned unchanged."""
+    if iso_str and len(iso_str) == 10 and iso_str[4] == '-' and iso_str[7] == '-':
+        return f"{iso_str[8:10]}-{iso_str[5:7]}-{iso_str[0:4]}"
+    return iso_str
 
 def format_date_obj(date_obj):
     if not date_obj:
         return None
     return date_obj.strftime(DATE_FORMAT)
 
+def validate_date_range(start_date_str, end_date_str):
+    """Returns an error message for an invalid DD-MM-YYYY range, or None if it is valid."""
+    start = date_string_to_ordinal(start_date_str)
+    end = date_string_to_ordinal(end_date_str)
+    if start is None or end is None:
+        return "Invalid date format. Use DD-MM-YYYY"
+    if start > end:
+        return "Start date cannot be after end date."
+    return None
+
+def validate_bulk_booking_item(item, known_guesthouse_ids, known_usernames):
+    """Returns an error message for a malformed bulk booking item, or None."""
+    if not isinstance(item, dict):
+        return "Each booking must be an object."
+    if not all(item.get(field) for field in ('guesthouse_id', 'username', 'start_date', 'end_date')):
+        return "Missing required fields: guesthouse_id, username, start_date, end_date"
+    if str(item['guesthouse_id']) not in known_guesthouse_ids:
+        return f"Unknown guesthouse_id: {item['guesthouse_id']}"
+    if item['username'] not in known_usernames:
+        return f"Unknown username: {item['username']}"
+    if (item.get('status') or 'pending') not in ACTIVE_BOOKING_STATUSES:
+        return "status must be pending or confirmed."
+    return validate_date_range(item['start_date'], item['end_date'])
+
 def check_date_overlap(start1, end1, start2, end2):
-    """Checks if two date ranges overlap."""
-    s1 = parse_date_string(start1)
-    e1 = parse_date_string(end1)
-    s2 = parse_date_string(start2)
-    e2 = parse_date_string(end2)
+    """Checks if two date ranges (DD-MM-YYYY strings) overlap."""
+    s1 = date_string_to_ordinal(start1)
+    e1 = date_string_to_ordinal(end1)
+    s2 = date_string_to_ordinal(start2)
+    e2 = date_string_to_ordinal(end2)
 
-    if not all([s1, e1, s2, e2]): # If any date is invalid, assume no overlap to be safe
+    if None in (s1, e1, s2, e2): # If any date is invalid, assume no overlap to be safe
         return False
     return s1 <= e2 and s2 <= e1
\ No newline at end of file
@@ -0,0 +1,158 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Runs slow side effects (the SQLite reporting sync, admin exports) on a
+# background thread instead of in the request. Tasks are keyed by name and
+# coalesced: submitting a task that is already queued just replaces it, so a
+# burst of bookings becomes one sync. Tasks must bring the target up to date
+# with the current state (not apply a single change), which makes coalescing
+# and retrying safe. For the SQLite export the durable outbox is bookings.csv
+# itself: the DB records how far into the log it has synced (sync_state), so
+# anything not yet synced when the process dies is picked up on the next start.
+
+WRITE_BEHIND_ENABLED = os.getenv('WRITE_BEHIND_ENABLED', '1').lower() not in ('0', 'false', 'no')
+WRITE_BEHIND_DELAY_MS = int(os.getenv('WRITE_BEHIND_DELAY_MS', '200'))
+WRITE_BEHIND_MAX_PENDING = int(os.getenv('WRITE_BEHIND_MAX_PENDING', '16'))
+WRITE_BEHIND_MAX_BACKOFF_SECONDS = 60
+
+
+def _timestamp(epoch):
+    return datetime.fromtimestamp(epoch).isoformat(timespec='seconds') if epoch else None
+
+
+class WriteBehindWorker:
+    """A daemon thread draining a bounded, coalescing queue of named tasks.
+
+    When disabled, or when more than `max_pending` distinct tasks are queued,
+    submit() runs the task inline instead, so work is never dropped.
+    """
+
+    def __init__(self, enabled=WRITE_BEHIND_ENABLED, delay_ms=WRITE_BEHIND_DELAY_MS, max_pending=WRITE_BEHIND_MAX_PENDING):
+        self.enabled = enabled
+        self.delay = delay_ms / 1000
+        self.max_pending = max_pending
+        self._cond = threading.Condition()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._thread = None
+        self._tasks = OrderedDict() # name -> (fn, first queued at, attempt)
+        self._active = None
+        self._submitted = 0
+        self._coalesced = 0
+        self._completed = 0
+        self._failed = 0
+        self._last_success = None
+        self._last_error = None
+
+    def submit(self, name, fn):
+        """Queues fn() under `name`; returns False if it had to run inline."""
+        if not self.enabled:
+            self._run(name, fn)
+            return False
+        with self._cond:
+            if self._pid != os.getpid(): # Forked worker process: the parent's thread is not ours
+                self._reset()
+            self._submitted += 1
+            if name in self._tasks:
+                _, queued_at, attempt = self._tasks[name]
+                self._tasks[name] = (fn, queued_at, attempt)
+                self._coalesced += 1
+                return True
+            if len(self._tasks) < self.max_pending:
+                self._tasks[name] = (fn, time.time(), 0)
+                self._ensure_thread()
+                self._cond.notify()
+                return True
+        self._run(name, fn) # Queue full: do the work in the caller rather than lose it
+        return False
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._loop, name='write-behind', daemon=True)
+            self._thread.start()
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while not self._tasks:
+                    self._cond.wait()
+            time.sleep(self.delay) # Let the rest of a burst coalesce into the queued task
+            with self._cond:
+                if not self._tasks:
+                    continue
+                name, (fn, queued_at, attempt) = self._tasks.popitem(last=False)
+                self._active = name
+            ok = self._run(name, fn)
+            with self._cond:
+                self._active = None
+                if not ok and name not in self._tasks:
+                    self._tasks[name] = (fn, queued_at, attempt + 1)
+                self._cond.notify_all()
+            if not ok: # Back off before retrying; the outbox keeps the work
+                time.sleep(min(WRITE_BEHIND_MAX_BACKOFF_SECONDS, 2 ** attempt))
+
+    def _run(self, name, fn):
+        try:
+            fn()
+        except Exception as e:
+            logger.exception("Background task %s failed: %s", name, e)
+            metrics.inc('guesthouse_write_behind_tasks_total', task=name, result='error')
+            with self._cond:
+                self._failed += 1
+                self._last_error = {'task': name, 'error': str(e), 'at': _timestamp(time.time())}
+            return False
+        metrics.inc('guesthouse_write_behind_tasks_total', task=name, result='ok')
+        with self._cond:
+            self._completed += 1
+            self._last_success = time.time()
+            if self._last_error and self._last_error['task'] == name: # Recovered
+                self._last_error = None
+        return True
+
+    def flush(self, timeout=None):
+        """Waits until the queue is empty and no task is running. Returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._tasks or self._active:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def pending(self):
+        with self._cond:
+            return len(self._tasks) + (1 if self._active else 0)
+
+    def status(self):
+        with self._cond:
+            oldest = min((queued_at for _, queued_at, _ in self._tasks.values()), default=None)
+            return {
+                'enabled': self.enabled,
+                'running': bool(self._thread and self._thread.is_alive()),
+                'pending': sorted(self._tasks),
+                'active': self._active,
+                'oldest_pending_seconds': round(time.time() - oldest, 3) if oldest else 0,
+                'submitted': self._submitted,
+                'coalesced': self._coalesced,
+                'completed': self._completed,
+                'failed': self._failed,
+                'last_success': _timestamp(self._last_success),
+                'last_error': self._last_error,
+            }
+
+
+write_behind = WriteBehindWorker()
+
+# On a clean shutdown, give queued syncs a moment to finish (anything left is replayed on the next start)
+atexit.register(write_behind.flush, 5)
@@ -0,0 +1 @@
+# Benchmark and load-test harness for the booking API. See bench/__main__.py for usage.
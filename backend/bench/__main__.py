@@ -0,0 +1,92 @@
+import argparse
+import json
+import os
+import sys
+
+from .datasets import generate_dataset
+from .harness import run_benchmarks, compare_results, SCENARIOS, DEFAULT_SCENARIOS
+
+# Usage (from backend/):
+#   python -m bench generate /tmp/bench-10k --bookings 10000
+#   python -m bench run /tmp/bench-10k --clients 8 --requests 500 --out results.json
+#   python -m bench run /tmp/bench-10k --url http://127.0.0.1:5001 --out results.json
+#   python -m bench compare baseline.json results.json --threshold 0.2
+#
+# `run` without --url copies the dataset to a temp dir and drives the app through
+# Flask's test client. With --url it drives a server already started from the
+# dataset dir (e.g. `cd /tmp/bench-10k && flask --app /path/to/backend/run.py run`).
+# `compare` exits with status 1 when any scenario regressed beyond the threshold.
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m bench')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    gen = commands.add_parser('generate', help='write a synthetic dataset')
+    gen.add_argument('out_dir')
+    gen.add_argument('--bookings', type=int, default=1000)
+    gen.add_argument('--users', type=int, default=None, help='default: bookings / 100 (at least 10)')
+    gen.add_argument('--guesthouses', type=int, default=None, help='default: bookings / 1000 (at least 20)')
+    gen.add_argument('--superseded', type=float, default=0.0, help='share of bookings with a later status row in the log')
+    gen.add_argument('--seed', type=int, default=42)
+
+    run = commands.add_parser('run', help='benchmark the API against a generated dataset')
+    run.add_argument('data_dir')
+    run.add_argument('--scenarios', default=','.join(DEFAULT_SCENARIOS), help=f"comma-separated: {', '.join(SCENARIOS)}")
+    run.add_argument('--requests', type=int, default=200, help='requests per scenario')
+    run.add_argument('--clients', type=int, default=4, help='concurrent client threads')
+    run.add_argument('--seed', type=int, default=1)
+    run.add_argument('--url', default=None, help='drive a running server instead of the in-process test client')
+    run.add_argument('--storage', choices=('csv', 'sqlite'), default=None, help='STORAGE_BACKEND for the in-process app')
+    run.add_argument('--in-place', action='store_true', help='use the dataset dir directly instead of a temp copy')
+    run.add_argument('--out', default=None, help='write results JSON here (default: stdout)')
+
+    cmp = commands.add_parser('compare', help='report regressions between two result files')
+    cmp.add_argument('baseline')
+    cmp.add_argument('current')
+    cmp.add_argument('--threshold', type=float, default=0.2, help='allowed relative slowdown (0.2 = 20%%)')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'generate':
+        manifest = generate_dataset(
+            args.out_dir, bookings=args.bookings, users=args.users, guesthouses=args.guesthouses,
+            seed=args.seed, superseded_fraction=args.superseded
+        )
+        print(f"Wrote {manifest['booking_rows']} booking rows, {manifest['users']} users and "
+              f"{manifest['guesthouses']} guesthouses to {args.out_dir}.")
+        return 0
+
+    if args.command == 'run':
+        out_path = os.path.abspath(args.out) if args.out else None # The in-process run changes directory
+        scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+        unknown = [name for name in scenarios if name not in SCENARIOS]
+        if unknown:
+            parser.error(f"unknown scenarios: {', '.join(unknown)}")
+        results = run_benchmarks(
+            args.data_dir, scenarios=scenarios, requests=args.requests, clients=args.clients,
+            seed=args.seed, url=args.url, in_place=args.in_place, storage_backend=args.storage
+        )
+        text = json.dumps(results, indent=2)
+        if out_path:
+            with open(out_path, 'w') as f:
+                f.write(text + '\n')
+            print(f"Results written to {out_path}.")
+        else:
+            print(text)
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    regressions = compare_results(baseline, current, args.threshold)
+    for line in regressions:
+        print(f"REGRESSION: {line}")
+    if not regressions:
+        print("No regressions.")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
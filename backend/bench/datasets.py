@@ -0,0 +1,136 @@
+import csv
+import json
+import os
+import random
+import uuid
+from datetime import date
+
+# Reproducible synthetic users.csv / guesthouses.csv / bookings.csv for the
+# benchmarks. The same seed and sizes always produce byte-identical files.
+# Bookings are laid out one after another per guesthouse, so pending and
+# confirmed bookings never overlap (as the app itself guarantees), and rows are
+# streamed to disk so 10M-booking datasets do not have to fit in memory.
+
+LOCATIONS = ('Shillong', 'Guwahati', 'Agartala', 'Itanagar', 'Kohima', 'Aizawl', 'Imphal', 'Delhi')
+STATUS_WEIGHTS = (('confirmed', 40), ('pending', 10), ('cancelled', 30), ('rejected', 20))
+FIRST_BOOKING_DATE = date(2015, 1, 1)
+MAX_STAY_DAYS = 7
+MAX_GAP_DAYS = 3
+
+ADMIN_USERNAME = 'bench_admin'
+ADMIN_PASSWORD = 'bench_admin_pass'
+MANIFEST_FILE = 'manifest.json'
+
+
+def user_credentials(i):
+    return f'user{i:06d}', f'pass{i:06d}'
+
+
+def default_guesthouse_count(bookings):
+    # Roughly 1000 bookings per guesthouse keeps the date span to a few decades
+    return max(20, bookings // 1000)
+
+
+def generate_dataset(out_dir, bookings=1000, users=None, guesthouses=None, seed=42, superseded_fraction=0.0):
+    """Writes data/users.csv, data/guesthouses.csv and data/bookings.csv under out_dir.
+
+    superseded_fraction appends that share of bookings a second time with a
+    later status, like status changes do in the append-only log. Returns the
+    manifest (sizes, seed, date range) that is also saved as manifest.json.
+    """
+    users = users or max(10, bookings // 100)
+    guesthouses = guesthouses or default_guesthouse_count(bookings)
+    rng = random.Random(seed)
+    data_dir = os.path.join(out_dir, 'data')
+    os.makedirs(data_dir, exist_ok=True)
+    os.makedirs(os.path.join(out_dir, 'instance'), exist_ok=True)
+
+    with open(os.path.join(data_dir, 'users.csv'), 'w', newline='') as f:
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow(['username', 'password', 'role'])
+        writer.writerow([ADMIN_USERNAME, ADMIN_PASSWORD, 'admin'])
+        writer.writerows((*user_credentials(i), 'user') for i in range(users))
+
+    with open(os.path.join(data_dir, 'guesthouses.csv'), 'w', newline='') as f:
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow(['id', 'location', 'name', 'capacity'])
+        for i in range(guesthouses):
+            location = LOCATIONS[i % len(LOCATIONS)]
+            writer.writerow([i + 1, location, f'{location} Guest House {i + 1}', rng.randint(2, 20)])
+
+    statuses = [status for status, _ in STATUS_WEIGHTS]
+    weights = [weight for _, weight in STATUS_WEIGHTS]
+    next_free_day = [FIRST_BOOKING_DATE.toordinal()] * guesthouses
+    last_day = FIRST_BOOKING_DATE.toordinal()
+    rows_written = 0
+    with open(os.path.join(data_dir, 'bookings.csv'), 'w', newline='') as f:
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow(['booking_id', 'guesthouse_id', 'username', 'start_date', 'end_date', 'status', 'booked_at'])
+        superseded = []
+        for _ in range(bookings):
+            g = rng.randrange(guesthouses)
+            start = next_free_day[g] + rng.randint(0, MAX_GAP_DAYS)
+            end = start + rng.randint(0, MAX_STAY_DAYS - 1)
+            next_free_day[g] = end + 1
+            last_day = max(last_day, end)
+            row = [
+                str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+                g + 1,
+                user_credentials(rng.randrange(users))[0],
+                format_day(start),
+                format_day(end),
+                rng.choices(statuses, weights)[0],
+                format_day(start - rng.randint(1, 30)),
+            ]
+            writer.writerow(row)
+            rows_written += 1
+            if superseded_fraction and rng.random() < superseded_fraction:
+                superseded.append(row)
+            if len(superseded) >= 10000: # Flush status-change rows in batches to bound memory
+                rows_written += _write_status_changes(writer, superseded, rng)
+        rows_written += _write_status_changes(writer, superseded, rng)
+
+    manifest = {
+        'seed': seed,
+        'users': users,
+        'guesthouses': guesthouses,
+        'bookings': bookings,
+        'booking_rows': rows_written,
+        'superseded_fraction': superseded_fraction,
+        'first_date': format_day(FIRST_BOOKING_DATE.toordinal()),
+        'last_date': format_day(last_day),
+        'admin': [ADMIN_USERNAME, ADMIN_PASSWORD],
+    }
+    with open(os.path.join(out_dir, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def _write_status_changes(writer, rows, rng):
+    for row in rows:
+        # pending -> confirmed/cancelled, confirmed -> cancelled; dates never change, so no overlaps appear
+        if row[5] in ('pending', 'confirmed'):
+            row[5] = rng.choice(('confirmed', 'cancelled')) if row[5] == 'pending' else 'cancelled'
+        writer.writerow(row)
+    count = len(rows)
+    rows.clear()
+    return count
+
+
+def load_manifest(data_root):
+    with open(os.path.join(data_root, MANIFEST_FILE)) as f:
+        return json.load(f)
+
+
+def format_day(ordinal):
+    return date.fromordinal(ordinal).strftime('%d-%m-%Y')
+
+
+def date_range(manifest):
+    """(first, last) booking day ordinals of a generated dataset."""
+    return tuple(_parse(manifest[key]) for key in ('first_date', 'last_date'))
+
+
+def _parse(date_str):
+    day, month, year = (int(part) for part in date_str.split('-'))
+    return date(year, month, day).toordinal()
@@ -0,0 +1,334 @@
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from .datasets import load_manifest, user_credentials, date_range, format_day, ADMIN_USERNAME, ADMIN_PASSWORD
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_VERSION = 1
+LOGIN_USERS = 200 # Distinct users logged in during setup and by the login benchmark
+
+
+class TestClientTransport:
+    """Drives the app in-process through Flask's test client (one client per thread)."""
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def request(self, method, path, json=None, headers=None):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(path, method=method, json=json, headers=headers)
+        return response.status_code, response.get_json(silent=True)
+
+
+class HttpTransport:
+    """Drives a running server (flask run, gunicorn, ...) over HTTP."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def request(self, method, path, json=None, headers=None):
+        body = None
+        headers = dict(headers or {})
+        if json is not None:
+            body = _json_bytes(json)
+            headers['Content-Type'] = 'application/json'
+        req = urllib.request.Request(self.base_url + path, data=body, headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(req, timeout=60) as response:
+                return response.status, _parse_json(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, _parse_json(e.read())
+
+
+def _json_bytes(payload):
+    return json.dumps(payload).encode('utf-8')
+
+
+def _parse_json(raw):
+    try:
+        return json.loads(raw)
+    except ValueError:
+        return None
+
+
+class BenchContext:
+    """Dataset facts and auth tokens shared by the endpoint scenarios."""
+
+    def __init__(self, transport, manifest, service_registry=None):
+        self.transport = transport
+        self.manifest = manifest
+        self.registry = service_registry # Only set in-process, for service-level scenarios
+        self.admin_headers = None
+        self.user_headers = []
+        self.first_day, self.last_day = date_range(manifest)
+        self._booking_offset = 0
+        self._offset_lock = threading.Lock()
+
+    def login(self, username, password):
+        status, body = self.transport.request('POST', '/api/login', json={'username': username, 'password': password})
+        if status != 200:
+            raise RuntimeError(f"Login failed for {username}: HTTP {status} {body}")
+        return {'Authorization': f"Bearer {body['access_token']}"}
+
+    def set_up(self):
+        self.admin_headers = self.login(ADMIN_USERNAME, ADMIN_PASSWORD)
+        count = min(LOGIN_USERS, self.manifest['users'])
+        self.user_headers = [self.login(*user_credentials(i)) for i in range(count)]
+
+    def next_booking_window(self):
+        """A future date range no earlier benchmark request has used, so requests mostly succeed."""
+        with self._offset_lock:
+            self._booking_offset += 1
+            offset = self._booking_offset
+        # Spread requests over the guesthouses before moving to later dates
+        guesthouse_id = offset % self.manifest['guesthouses'] + 1
+        start = self.last_day + 30 + (offset // self.manifest['guesthouses']) * 10
+        return guesthouse_id, format_day(start), format_day(start + 2)
+
+    def random_window(self, rng, length_days):
+        """A random (start, end) range of `length_days` inside the dataset's booked period."""
+        start = rng.randint(self.first_day, max(self.first_day, self.last_day - length_days + 1))
+        return format_day(start), format_day(start + length_days - 1)
+
+
+# Each scenario runs one request and returns the HTTP status (service scenarios return 200).
+# EXPECTED_STATUSES lists the statuses that do not count as errors.
+
+def _login(ctx, rng):
+    username, password = user_credentials(rng.randrange(min(LOGIN_USERS, ctx.manifest['users'])))
+    return ctx.transport.request('POST', '/api/login', json={'username': username, 'password': password})[0]
+
+
+def _guesthouses(ctx, rng):
+    return ctx.transport.request('GET', '/api/guesthouses', headers=rng.choice(ctx.user_headers))[0]
+
+
+def _availability_check(ctx, rng):
+    start, end = ctx.random_window(rng, rng.randint(1, 7))
+    guesthouse_id = str(rng.randint(1, ctx.manifest['guesthouses']))
+    ctx.registry.bookings.is_guesthouse_available(guesthouse_id, start, end)
+    return 200
+
+
+def _availability_window(ctx, rng):
+    start, end = ctx.random_window(rng, 30)
+    return ctx.transport.request('GET', f'/api/availability?from={start}&to={end}', headers=rng.choice(ctx.user_headers))[0]
+
+
+def _booking_request(ctx, rng):
+    guesthouse_id, start, end = ctx.next_booking_window()
+    payload = {'guesthouse_id': str(guesthouse_id), 'start_date': start, 'end_date': end}
+    return ctx.transport.request('POST', '/api/bookings/request', json=payload, headers=rng.choice(ctx.user_headers))[0]
+
+
+def _my_bookings(ctx, rng):
+    return ctx.transport.request('GET', '/api/bookings/my', headers=rng.choice(ctx.user_headers))[0]
+
+
+def _all_bookings(ctx, rng):
+    return ctx.transport.request('GET', '/api/admin/bookings/all', headers=ctx.admin_headers)[0]
+
+
+def _all_bookings_page(ctx, rng):
+    return ctx.transport.request('GET', '/api/admin/bookings/all?limit=100&sort=-start_date', headers=ctx.admin_headers)[0]
+
+
+def _pending_bookings(ctx, rng):
+    return ctx.transport.request('GET', '/api/admin/bookings/pending', headers=ctx.admin_headers)[0]
+
+
+SCENARIOS = {
+    'login': _login,
+    'guesthouses': _guesthouses,
+    'availability.check': _availability_check, # BookingService.is_guesthouse_available, in-process only
+    'availability.window': _availability_window,
+    'bookings.request': _booking_request,
+    'bookings.my': _my_bookings,
+    'admin.bookings.all': _all_bookings,
+    'admin.bookings.page': _all_bookings_page,
+    'admin.bookings.pending': _pending_bookings,
+}
+SERVICE_SCENARIOS = {'availability.check'}
+EXPECTED_STATUSES = {'bookings.request': (201, 409)}
+DEFAULT_SCENARIOS = tuple(SCENARIOS)
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(fraction * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def run_scenario(ctx, name, requests, clients, seed):
+    """Runs `requests` calls of one scenario spread over `clients` threads."""
+    fn = SCENARIOS[name]
+    expected = EXPECTED_STATUSES.get(name, (200,))
+    per_client = [requests // clients + (1 if i < requests % clients else 0) for i in range(clients)]
+
+    def client_loop(client_index):
+        rng = random.Random(f'{seed}:{name}:{client_index}')
+        latencies, statuses = [], {}
+        for _ in range(per_client[client_index]):
+            started = time.perf_counter()
+            try:
+                status = fn(ctx, rng)
+            except Exception as e:
+                status = f'exception:{type(e).__name__}'
+            latencies.append(time.perf_counter() - started)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        return latencies, statuses
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        outcomes = list(pool.map(client_loop, range(clients)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for client_latencies, _ in outcomes for latency in client_latencies)
+    status_counts = {}
+    for _, statuses in outcomes:
+        for status, count in statuses.items():
+            status_counts[status] = status_counts.get(status, 0) + count
+    errors = sum(count for status, count in status_counts.items() if not status.isdigit() or int(status) not in expected)
+    ms = lambda seconds: round(seconds * 1000, 3) if seconds is not None else None
+    return {
+        'requests': len(latencies),
+        'clients': clients,
+        'errors': errors,
+        'status_counts': status_counts,
+        'elapsed_s': round(elapsed, 4),
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else None,
+        'latency_ms': {
+            'mean': ms(sum(latencies) / len(latencies)) if latencies else None,
+            'p50': ms(percentile(latencies, 0.50)),
+            'p90': ms(percentile(latencies, 0.90)),
+            'p99': ms(percentile(latencies, 0.99)),
+            'max': ms(latencies[-1] if latencies else None),
+        },
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+            capture_output=True, text=True, timeout=10
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _max_rss_mb():
+    try:
+        import resource
+    except ImportError: # Windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1) # bytes on macOS, KiB elsewhere
+
+
+def _start_in_process_app(data_root, in_place, storage_backend):
+    """chdir into a copy of the dataset (the app uses relative data/ and instance/ paths) and build the app."""
+    work_dir = data_root if in_place else tempfile.mkdtemp(prefix='guesthouse-bench-')
+    if not in_place:
+        shutil.copytree(data_root, work_dir, dirs_exist_ok=True)
+    os.chdir(work_dir)
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    if storage_backend:
+        os.environ['STORAGE_BACKEND'] = storage_backend
+
+    started = time.perf_counter()
+    from app import create_app
+    from app.registry import registry
+    app = create_app()
+    app_ready = time.perf_counter()
+    registry.warm_up()
+    services_ready = time.perf_counter()
+    startup = {
+        'create_app_ms': round((app_ready - started) * 1000, 1),
+        'warm_up_ms': round((services_ready - app_ready) * 1000, 1),
+    }
+    return app, registry, work_dir, startup
+
+
+def run_benchmarks(data_root, scenarios=DEFAULT_SCENARIOS, requests=200, clients=4, seed=1,
+                   url=None, in_place=False, storage_backend=None):
+    """Runs the scenarios against a generated dataset and returns the results dict."""
+    data_root = os.path.abspath(data_root)
+    manifest = load_manifest(data_root)
+    startup, work_dir, service_registry = None, None, None
+    if url:
+        transport = HttpTransport(url)
+        skipped = [name for name in scenarios if name in SERVICE_SCENARIOS]
+        scenarios = [name for name in scenarios if name not in SERVICE_SCENARIOS]
+        if skipped:
+            print(f"Skipping in-process scenarios against {url}: {', '.join(skipped)}")
+    else:
+        app, service_registry, work_dir, startup = _start_in_process_app(data_root, in_place, storage_backend)
+        transport = TestClientTransport(app)
+
+    ctx = BenchContext(transport, manifest, service_registry)
+    ctx.set_up()
+
+    results = {}
+    for name in scenarios:
+        results[name] = run_scenario(ctx, name, requests, clients, seed)
+        latency = results[name]['latency_ms']
+        print(f"{name:<24} p50 {latency['p50']:>9} ms  p99 {latency['p99']:>9} ms  "
+              f"{results[name]['throughput_rps']:>9} req/s  errors {results[name]['errors']}")
+
+    return {
+        'version': RESULTS_VERSION,
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'git_commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'target': url or 'test-client',
+            'storage_backend': storage_backend or os.getenv('STORAGE_BACKEND', 'csv'),
+            'work_dir': work_dir,
+            'requests_per_scenario': requests,
+            'clients': clients,
+            'seed': seed,
+        },
+        'dataset': manifest,
+        'startup': startup,
+        'max_rss_mb': None if url else _max_rss_mb(),
+        'results': results,
+    }
+
+
+def compare_results(baseline, current, threshold=0.2):
+    """Regressions between two result files: p50/p99 slower or throughput lower by more than `threshold`."""
+    regressions = []
+    for name, new in current['results'].items():
+        old = baseline['results'].get(name)
+        if not old:
+            continue
+        for stat in ('p50', 'p99'):
+            before, after = old['latency_ms'][stat], new['latency_ms'][stat]
+            if before and after and after > before * (1 + threshold):
+                regressions.append(f"{name} {stat} {before} ms -> {after} ms (+{(after / before - 1) * 100:.0f}%)")
+        before, after = old['throughput_rps'], new['throughput_rps']
+        if before and after and after < before / (1 + threshold):
+            regressions.append(f"{name} throughput {before} -> {after} req/s ({(after / before - 1) * 100:.0f}%)")
+        if new['errors'] > old['errors']:
+            regressions.append(f"{name} errors {old['errors']} -> {new['errors']}")
+    return regressions
@@ -1,8 +1,30 @@
+import os
+import time
+
+_process_start = time.perf_counter()
+
 from app import create_app
 
 app = create_app()
+_app_ready = time.perf_counter()
 
 if __name__ == '__main__':
-    # Ensure services are loaded, especially if they initialize files like bookings.csv
-    from app.services import user_service, guesthouse_service, booking_service 
-    app.run(debug=True, port=5001) # Changed port to 5001 to avoid conflict with React default
\ No newline at end of file
+    # Build services (CSV load / DB sync) before serving, and report the cold-start cost
+    from app.registry import registry
+    registry.warm_up()
+    _services_ready = time.perf_counter()
+
+    cold_start_ms = (_services_ready - _process_start) * 1000
+    budget_ms = float(os.getenv('COLD_START_BUDGET_MS', '1500'))
+    print(f"Cold start: {cold_start_ms:.0f} ms "
+          f"(imports + create_app {(_app_ready - _process_start) * 1000:.0f} ms, "
+          f"services {(_services_ready - _app_ready) * 1000:.0f} ms; budget {budget_ms:.0f} ms)")
+    if cold_start_ms > budget_ms:
+        print(f"WARNING: Cold start exceeded COLD_START_BUDGET_MS ({budget_ms:.0f} ms).")
+
+    # Flask's development server. For production serve `run:app` (from backend/) with a threaded WSGI server:
+    #   gunicorn -w 4 --threads 8 -b :5001 run:app
+    #   waitress-serve --threads=16 --port=5001 run:app
+    # Handlers block on CSV/SQLite I/O and the bookings lock, so concurrency comes from threads and workers
+    # (there is no ASGI mode; see Deployment in README.md).
+    app.run(debug=True, port=5001) # Changed port to 5001 to avoid conflict with React default
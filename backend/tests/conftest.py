@@ -0,0 +1,118 @@
+import csv
+import os
+from datetime import date, timedelta
+
+# Settings read at import time; set before any app module is imported so
+# backend/.env (loaded by create_app without overriding) does not apply them.
+os.environ.setdefault('JWT_SECRET_KEY', 'test-secret-key-that-is-long-enough-for-hs256')
+os.environ.setdefault('PASSWORD_HASH_ITERATIONS', '1000')
+os.environ.setdefault('WRITE_BEHIND_ENABLED', '0')
+os.environ.setdefault('BOOKINGS_COMPACT_THRESHOLD', '0')
+os.environ.setdefault('ARCHIVE_AFTER_DAYS', '0')
+os.environ.setdefault('STORAGE_BACKEND', 'csv')
+
+import pytest
+
+from app import storage, services, tokens, auth, availability, reports
+from app.archive import BookingArchive
+from app.availability import WindowCache
+from app.registry import registry
+from app.tokens import ClaimsCache, TokenRevocationList
+from app.utils import DATE_FORMAT
+from app.write_behind import write_behind
+
+USERS = [
+    ('alice', 'alicepass', 'user'),
+    ('bob', 'bobpass', 'user'),
+    ('admin', 'adminpass', 'admin'),
+]
+GUESTHOUSES = [
+    ('1', 'Shillong', 'Hill View', '10'),
+    ('2', 'Shillong', 'Pine Lodge', '4'),
+    ('3', 'Tezpur', 'River House', '8'),
+]
+
+
+def day(offset):
+    """DD-MM-YYYY date `offset` days from today."""
+    return (date.today() + timedelta(days=offset)).strftime(DATE_FORMAT)
+
+
+def _write_csv(path, header, rows):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+def close_primary_connection():
+    conn = getattr(storage._primary_local, 'conn', None)
+    if conn is not None:
+        conn.close()
+        storage._primary_local.conn = None
+
+
+def init_store(path, monkeypatch):
+    """Makes `path` the working directory holding an empty CSV store, with fresh module-level singletons."""
+    monkeypatch.chdir(path)
+    os.makedirs('data')
+    os.makedirs('instance')
+    _write_csv('data/users.csv', ['username', 'password', 'role'], USERS)
+    _write_csv('data/guesthouses.csv', ['id', 'location', 'name', 'capacity'], GUESTHOUSES)
+    storage.init_bookings_csv()
+
+    # Module-level singletons would otherwise carry state between tests
+    monkeypatch.setattr(write_behind, 'enabled', False)
+    monkeypatch.setattr(services, 'booking_archive', BookingArchive())
+    # Keyed on data versions, which restart with every store
+    monkeypatch.setattr(availability, 'availability_cache', WindowCache())
+    monkeypatch.setattr(reports, 'report_cache', WindowCache())
+    revocations = TokenRevocationList()
+    monkeypatch.setattr(tokens, 'token_revocations', revocations)
+    monkeypatch.setattr(auth, 'token_revocations', revocations)
+    monkeypatch.setattr(auth, 'claims_cache', ClaimsCache())
+    registry.reset()
+    monkeypatch.setattr(registry, 'backend', None) # Chosen from STORAGE_BACKEND again, as create_app() would
+    close_primary_connection()
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """An empty CSV store in a temporary working directory (all data paths are relative)."""
+    init_store(tmp_path, monkeypatch)
+    yield tmp_path
+    registry.reset()
+    close_primary_connection()
+
+
+@pytest.fixture
+def booking_service(data_dir):
+    return services.BookingService(services.GuesthouseService())
+
+
+@pytest.fixture(params=['csv', 'sqlite'])
+def backend(request, data_dir, monkeypatch):
+    """Runs a test against both storage backends."""
+    monkeypatch.setenv('STORAGE_BACKEND', request.param)
+    return request.param
+
+
+@pytest.fixture
+def app(data_dir):
+    from app import create_app
+    flask_app = create_app()
+    flask_app.config['TESTING'] = True
+    return flask_app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def login(client, username, password=None):
+    """Logs in and returns the Authorization header for the user."""
+    password = password or dict((u, p) for u, p, _ in USERS)[username]
+    response = client.post('/api/login', json={'username': username, 'password': password})
+    assert response.status_code == 200, response.get_json()
+    return {'Authorization': f"Bearer {response.get_json()['access_token']}"}
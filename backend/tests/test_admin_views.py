@@ -0,0 +1,50 @@
+import os
+
+from app.storage import append_booking_rows
+
+from conftest import GUESTHOUSES, _write_csv, day, login
+
+
+def test_pending_queue_follows_status_changes(backend, client):
+    alice, admin = login(client, 'alice'), login(client, 'admin')
+    ids = [
+        client.post('/api/bookings/request', headers=alice,
+                    json={'guesthouse_id': gid, 'start_date': day(10), 'end_date': day(12)}).get_json()['booking_id']
+        for gid in ('1', '2', '3')
+    ]
+    pending = client.get('/api/admin/bookings/pending', headers=admin).get_json()
+    assert [b['booking_id'] for b in pending] == ids
+    assert [b['guesthouse_name'] for b in pending] == ['Hill View', 'Pine Lodge', 'River House']
+
+    client.post(f'/api/admin/bookings/approve/{ids[0]}', headers=admin)
+    client.post(f'/api/admin/bookings/reject/{ids[2]}', headers=admin)
+    pending = client.get('/api/admin/bookings/pending', headers=admin).get_json()
+    assert [b['booking_id'] for b in pending] == [ids[1]]
+
+    client.post(f'/api/bookings/cancel/{ids[1]}', headers=alice)
+    assert client.get('/api/admin/bookings/pending', headers=admin).get_json() == []
+
+
+def test_pending_queue_picks_up_rows_from_other_workers(booking_service):
+    first, _ = booking_service.create_booking_request('1', 'alice', day(10), day(12))
+    second, _ = booking_service.create_booking_request('2', 'bob', day(10), day(12))
+    # Another worker approves the first booking by appending to the log
+    append_booking_rows([{'booking_id': first, 'guesthouse_id': '1', 'username': 'alice', 'status': 'confirmed',
+                          'start_date': day(10), 'end_date': day(12), 'booked_at': day(0)}])
+    assert [b['booking_id'] for b in booking_service.get_pending_bookings()] == [second]
+
+
+def test_guesthouse_names_are_cached_until_the_file_changes(booking_service):
+    guesthouses = booking_service.guesthouse_service
+    booking_service.create_booking_request('1', 'alice', day(10), day(12))
+    names = guesthouses.get_guesthouse_names()
+    assert guesthouses.get_guesthouse_names() is names # No re-read while guesthouses.csv is unchanged
+    version = guesthouses.current_version()
+
+    renamed = [('1', 'Shillong', 'Hill View Annexe', '10')] + GUESTHOUSES[1:]
+    _write_csv('data/guesthouses.csv.new', ['id', 'location', 'name', 'capacity'], renamed)
+    os.replace('data/guesthouses.csv.new', 'data/guesthouses.csv')
+
+    assert guesthouses.current_version() > version
+    assert booking_service.get_pending_bookings()[0]['guesthouse_name'] == 'Hill View Annexe'
+    assert booking_service.get_all_bookings()[0]['guesthouse_name'] == 'Hill View Annexe'
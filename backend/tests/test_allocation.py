@@ -0,0 +1,55 @@
+import csv
+
+import pytest
+
+from app.registry import registry
+
+from conftest import day, login
+
+
+@pytest.fixture
+def shillong(backend, data_dir):
+    """Three Shillong guesthouses, in file order: 1 (capacity 10), 2 (4) and 4 (6)."""
+    with open('data/guesthouses.csv', 'a', newline='') as f:
+        csv.writer(f, lineterminator='\n').writerow(['4', 'Shillong', 'Cedar Cottage', '6'])
+    return backend
+
+
+@pytest.mark.parametrize('policy, guests, expected', [
+    ('first-fit', 1, ['1', '2', '4']),
+    ('best-fit', 1, ['2', '4', '1']),
+    ('worst-fit', 1, ['1', '4', '2']),
+    ('best-fit', 5, ['4', '1']),
+    ('first-fit', 7, ['1']),
+    ('best-fit', 11, []),
+])
+def test_candidate_order_follows_the_policy(shillong, policy, guests, expected):
+    assert registry.guesthouses.find_candidate_guesthouses('shillong', guests, policy) == expected
+
+
+def _request(client, headers, **body):
+    body = {'location': 'Shillong', 'start_date': day(10), 'end_date': day(12), **body}
+    return client.post('/api/bookings/request', headers=headers, json=body)
+
+
+def test_location_request_books_the_best_free_fit(shillong, client):
+    alice = login(client, 'alice')
+    booked = [_request(client, alice, guests=5).get_json()['guesthouse_id'] for _ in range(2)]
+    assert booked == ['4', '1'] # The smallest fitting guesthouse first, then the next one still free
+    response = _request(client, alice, guests=5)
+    assert response.status_code == 409
+    assert _request(client, alice, guests=2).get_json()['guesthouse_id'] == '2'
+    assert _request(client, alice, guests=20).status_code == 409
+
+
+def test_location_request_honours_the_policy_parameter(shillong, client):
+    alice = login(client, 'alice')
+    assert _request(client, alice, policy='worst-fit').get_json()['guesthouse_id'] == '1'
+    assert _request(client, alice, policy='first-fit').get_json()['guesthouse_id'] == '2'
+    assert _request(client, alice, policy='random').status_code == 400
+
+
+@pytest.mark.parametrize('guests', [2.5, 2.0, True, '2', None, 0, -1])
+def test_guests_must_be_a_positive_integer(shillong, client, guests):
+    response = _request(client, login(client, 'alice'), guests=guests)
+    assert response.status_code == 400
@@ -0,0 +1,72 @@
+import os
+
+import pytest
+
+from app.archive import BookingArchive, INDEX_FILE
+from app.records import Booking
+from app.utils import ARCHIVE_DIR
+
+from conftest import day
+
+
+def _booking(booking_id, username, year, status='confirmed'):
+    return Booking(booking_id, '1', username, f'01-03-{year}', f'03-03-{year}', status, f'01-01-{year}')
+
+
+@pytest.fixture
+def archive(data_dir, monkeypatch):
+    archive = BookingArchive()
+    archive.add([_booking('a1', 'alice', 2020), _booking('b1', 'bob', 2020), _booking('a2', 'alice', 2021, 'rejected')])
+    archive.add([_booking('b2', 'bob', 2022), _booking('a1', 'alice', 2020, 'cancelled')]) # Overwrites a1
+
+    reads = []
+    read_partition = archive._read_partition
+    monkeypatch.setattr(archive, '_read_partition', lambda path: reads.append(os.path.basename(path)) or read_partition(path))
+    archive.partition_reads = reads
+    return archive
+
+
+def test_round_trip(archive):
+    assert archive.count() == 4
+    assert {b.booking_id: b.status for b in archive.iter_bookings()} == {
+        'a1': 'cancelled', 'b1': 'confirmed', 'a2': 'rejected', 'b2': 'confirmed'
+    }
+    booking = archive.find('a2')
+    assert (booking.username, booking.start_date, booking.status) == ('alice', '01-03-2021', 'rejected')
+
+    reopened = BookingArchive() # Everything comes back from the files
+    assert sorted(b.booking_id for b in reopened.iter_bookings()) == ['a1', 'a2', 'b1', 'b2']
+    assert reopened.find('a1').status == 'cancelled'
+
+
+def test_unknown_id_reads_no_partition(archive):
+    assert archive.find('nope') is None
+    assert archive.partition_reads == []
+
+
+def test_lookups_read_only_matching_partitions(archive):
+    assert archive.find('b2').booking_id == 'b2'
+    assert archive.partition_reads == ['bookings-2022.npz']
+    assert [b.booking_id for b in archive.iter_bookings(username='bob')] == ['b1', 'b2']
+    assert archive.partition_reads == ['bookings-2022.npz', 'bookings-2020.npz'] # 2022 was cached
+    assert list(archive.iter_bookings(username='carol')) == []
+    assert 'bookings-2021.npz' not in archive.partition_reads
+
+
+def test_missing_index_is_rebuilt(archive):
+    os.remove(os.path.join(ARCHIVE_DIR, INDEX_FILE))
+    reopened = BookingArchive()
+    assert reopened.find('b1').username == 'bob'
+    assert sorted(b.booking_id for b in reopened.iter_bookings(username='alice')) == ['a1', 'a2']
+
+
+def test_booking_service_finds_archived_bookings(booking_service):
+    booking_id, _ = booking_service.create_booking_request('1', 'alice', day(10), day(12))
+    booking_service.create_booking_request('2', 'bob', day(10), day(12)) # Stays live
+    booking_service.update_booking_status(booking_id, 'rejected')
+    assert booking_service.archive_cold_bookings(after_days=0) == 1
+
+    success, message = booking_service.cancel_booking(booking_id, 'alice')
+    assert not success and 'archived' in message
+    assert [b['booking_id'] for b in booking_service.get_user_bookings('alice')] == [booking_id]
+    assert booking_service.update_booking_status('unknown-id', 'confirmed')[0] is False
@@ -0,0 +1,88 @@
+import time
+
+from app import auth, tokens
+from app.tokens import ClaimsCache, TokenRevocationList, issued_at
+
+from conftest import login
+
+
+def test_logout_revokes_only_that_token(client):
+    first, second = login(client, 'alice'), login(client, 'alice')
+    assert client.post('/api/logout', headers=first).status_code == 200
+    assert client.get('/api/bookings/my', headers=first).status_code == 401
+    assert client.get('/api/bookings/my', headers=second).status_code == 200
+
+
+def test_revoking_a_user_rejects_older_tokens_but_not_a_new_login(client):
+    old = login(client, 'alice')
+    admin = login(client, 'admin')
+    assert client.post('/api/admin/users/alice/revoke-tokens', headers=admin).status_code == 200
+    new = login(client, 'alice') # Usually within the same second as the revocation
+    assert client.get('/api/bookings/my', headers=old).status_code == 401
+    assert client.get('/api/bookings/my', headers=new).status_code == 200
+    assert client.get('/api/bookings/my', headers=login(client, 'bob')).status_code == 200
+
+
+def test_admin_required_checks_the_role(client):
+    assert client.get('/api/admin/bookings/pending', headers=login(client, 'alice')).status_code == 403
+    assert client.get('/api/admin/bookings/pending', headers=login(client, 'admin')).status_code == 200
+    assert client.get('/api/admin/bookings/pending').status_code == 401
+
+
+def test_revocations_are_shared_through_the_file(data_dir):
+    tokens.token_revocations.revoke_token('jti-1', expires_at=None)
+    tokens.token_revocations.revoke_user('alice', token_lifetime=3600)
+    cutoff = tokens.token_revocations._users['alice'][0]
+
+    other_worker = TokenRevocationList()
+    assert other_worker.is_revoked({'jti': 'jti-1', 'sub': 'bob'})
+    assert other_worker.is_revoked({'jti': 'x', 'sub': 'alice', 'iat_ms': int(cutoff * 1000) - 1})
+    assert not other_worker.is_revoked({'jti': 'x', 'sub': 'alice', 'iat_ms': int(cutoff * 1000) + 1})
+    assert other_worker.is_revoked({'jti': 'x', 'sub': 'alice', 'iat': int(cutoff)}) # Legacy token without iat_ms
+
+
+def test_issued_at_prefers_millisecond_claim():
+    assert issued_at({'iat': 100, 'iat_ms': 100_250}) == 100.25
+    assert issued_at({'iat': 100}) == 100
+
+
+def _count_full_verifications(monkeypatch):
+    calls = []
+    verify = auth.verify_jwt_in_request
+    monkeypatch.setattr(auth, 'verify_jwt_in_request', lambda: calls.append(1) or verify())
+    return calls
+
+
+def test_repeat_requests_are_served_from_the_claims_cache(client, monkeypatch):
+    calls = _count_full_verifications(monkeypatch)
+    alice = login(client, 'alice')
+    for _ in range(3):
+        assert client.get('/api/bookings/my', headers=alice).status_code == 200
+    assert len(calls) == 1
+    # Identity comes from the cached claims too
+    response = client.post('/api/bookings/request', headers=alice,
+                           json={'guesthouse_id': '1', 'start_date': '01-01-2099', 'end_date': '02-01-2099'})
+    assert response.status_code == 201
+    assert [b['username'] for b in client.get('/api/bookings/my', headers=alice).get_json()] == ['alice']
+
+
+def test_cached_tokens_are_checked_against_revocations(client, monkeypatch):
+    calls = _count_full_verifications(monkeypatch)
+    alice, admin = login(client, 'alice'), login(client, 'admin')
+    assert client.get('/api/bookings/my', headers=alice).status_code == 200
+    assert client.post('/api/admin/users/alice/revoke-tokens', headers=admin).status_code == 200
+    response = client.get('/api/bookings/my', headers=alice)
+    assert response.status_code == 401
+    assert response.get_json()['msg'] == 'Token has been revoked'
+    assert len(calls) == 3 # alice, admin, then alice again once her cached entry was found revoked
+
+
+def test_claims_cache_honours_exp_and_size():
+    cache = ClaimsCache(max_entries=2)
+    cache.put('expired', time.time() - 1, {'sub': 'a'})
+    assert cache.get('expired') is None
+    for key in ('a', 'b', 'c'):
+        cache.put(key, None, {'sub': key})
+    assert cache.get('a') is None # Least recently used entry was evicted
+    assert cache.get('c') == {'sub': 'c'}
+    assert ClaimsCache(max_entries=0).get('c') is None
@@ -0,0 +1,163 @@
+import random
+from datetime import date, timedelta
+
+from app.availability import MAX_WINDOW_DAYS, get_availability, occupancy_matrix
+from app.interval_index import IntervalIndex
+from app.registry import registry
+
+from conftest import day, login
+
+
+def day_number(offset):
+    return (date.today() + timedelta(days=offset)).toordinal()
+
+
+def test_interval_index_overlaps_are_inclusive():
+    index = IntervalIndex()
+    index.add('1', 'a', 10, 20)
+    index.add('1', 'b', 30, 40)
+    index.add('2', 'c', 10, 40)
+
+    assert index.overlaps('1', 20, 25) # Touching the last day counts
+    assert index.overlaps('1', 5, 10)
+    assert not index.overlaps('1', 21, 29)
+    assert sorted(index.overlapping('1', 15, 35)) == ['a', 'b']
+    assert not index.overlaps('1', 15, 25, exclude='a')
+    assert index.overlaps('1', 15, 35, exclude='a')
+    assert list(index.overlapping('3', 0, 100)) == []
+
+
+def test_interval_index_remove_and_move():
+    index = IntervalIndex()
+    index.add('1', 'a', 10, 20)
+    index.add('1', 'b', 1, 100) # The long interval must still be found after shorter ones are added
+    index.add('1', 'c', 50, 60)
+    assert index.overlaps('1', 70, 80)
+
+    index.remove('b')
+    assert not index.overlaps('1', 70, 80)
+    assert len(index) == 2
+
+    index.add('2', 'a', 70, 80) # Re-adding moves the booking
+    assert 'a' in index
+    assert not index.overlaps('1', 10, 20)
+    assert index.overlaps('2', 75, 75)
+
+
+def test_interval_index_matches_a_linear_scan():
+    rng = random.Random(7)
+    index, intervals = IntervalIndex(), {}
+    loaded = [(str(rng.randrange(3)), f'l{i}', start, start + rng.randrange(30))
+              for i, start in enumerate(rng.sample(range(1000), 200))]
+    index.load(loaded)
+    intervals.update((booking_id, (gid, start, end)) for gid, booking_id, start, end in loaded)
+    for step in range(3000):
+        booking_id = f'b{rng.randrange(400)}'
+        if rng.random() < 0.3 and booking_id in intervals:
+            index.remove(booking_id)
+            del intervals[booking_id]
+        else:
+            start = rng.randrange(1000)
+            end = start + (rng.randrange(500) if step % 50 == 0 else rng.randrange(10)) # Some long stays
+            gid = str(rng.randrange(3))
+            index.add(gid, booking_id, start, end)
+            intervals[booking_id] = (gid, start, end)
+        gid, start = str(rng.randrange(3)), rng.randrange(1000)
+        end = start + rng.randrange(20)
+        expected = {b for b, (g, s, e) in intervals.items() if g == gid and s <= end and e >= start}
+        assert set(index.overlapping(gid, start, end)) == expected
+    assert len(index) == len(intervals)
+
+
+def _height(node):
+    return 0 if node is None else 1 + max(_height(node.left), _height(node.right))
+
+
+def test_interval_index_stays_balanced_behind_a_long_stay():
+    index = IntervalIndex()
+    index.load([('1', 'long', 0, 10**6)] + [('1', f'b{i}', 10 + i * 3, 11 + i * 3) for i in range(10_000)])
+    for i in range(10_000, 20_000): # Appends in date order, the worst case for an unbalanced tree
+        index.add('1', f'b{i}', 10 + i * 3, 11 + i * 3)
+    assert sorted(index.overlapping('1', 30_000, 30_001)) == ['b9997', 'long']
+    assert _height(index._roots['1']) < 4 * (20_001).bit_length()
+
+
+def test_booking_blocks_overlapping_dates_until_cancelled(booking_service):
+    booking_id, _ = booking_service.create_booking_request('1', 'alice', day(10), day(15))
+    assert booking_id
+
+    assert not booking_service.is_guesthouse_available('1', day(15), day(20))
+    assert not booking_service.is_guesthouse_available('1', day(5), day(10))
+    assert booking_service.is_guesthouse_available('1', day(16), day(20))
+    assert booking_service.is_guesthouse_available('2', day(10), day(15))
+    assert booking_service.create_booking_request('1', 'bob', day(12), day(13))[0] is None
+
+    ok, _ = booking_service.cancel_booking(booking_id, 'alice')
+    assert ok
+    assert booking_service.is_guesthouse_available('1', day(10), day(15))
+
+
+def test_rejected_booking_frees_dates_and_confirm_rechecks(booking_service):
+    first, _ = booking_service.create_booking_request('1', 'alice', day(10), day(15))
+    assert booking_service.update_booking_status(first, 'rejected')[0]
+    second, _ = booking_service.create_booking_request('1', 'bob', day(12), day(20))
+    assert second
+
+    # The rejected booking cannot be confirmed over the dates now held by bob
+    ok, message = booking_service.update_booking_status(first, 'confirmed')
+    assert not ok and 'unavailable' in message
+
+
+def test_occupancy_matrix_clips_bookings_to_the_window():
+    occupancy = occupancy_matrix(
+        ['1', '2'], ['1', '1', '2', '9'], [8, 12, 11, 10], [10, 20, 11, 12], window_start=10, window_end=14
+    )
+    assert occupancy.tolist() == [
+        [1, 0, 1, 1, 1], # Days 10..14: the first stay ends on day 10, the second runs past the window
+        [0, 1, 0, 0, 0],
+    ] # Guesthouse 9 is not in the window's list and is ignored
+    assert occupancy_matrix(['1'], [], [], [], 10, 12).tolist() == [[0, 0, 0]]
+
+
+def _availability(client, headers, start, end, **params):
+    return client.get('/api/availability', headers=headers, query_string={'from': day(start), 'to': day(end), **params})
+
+
+def test_availability_endpoint_reports_occupancy(backend, client):
+    alice = login(client, 'alice')
+    client.post('/api/bookings/request', headers=alice, json={'guesthouse_id': '1', 'start_date': day(11), 'end_date': day(12)})
+    response = _availability(client, alice, 10, 13)
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['dates'] == [day(offset) for offset in range(10, 14)]
+    rows = {row['id']: row for row in body['guesthouses']}
+    assert rows['1']['occupancy'] == [0, 1, 1, 0] and not rows['1']['available']
+    assert rows['2']['occupancy'] == [0, 0, 0, 0] and rows['2']['available']
+
+    by_location = _availability(client, alice, 10, 13, location='tezpur').get_json()
+    assert [row['id'] for row in by_location['guesthouses']] == ['3']
+
+
+def test_availability_endpoint_validates_the_window(backend, client):
+    alice = login(client, 'alice')
+    assert _availability(client, alice, 0, MAX_WINDOW_DAYS - 1).status_code == 200
+    assert _availability(client, alice, 0, MAX_WINDOW_DAYS).status_code == 400
+    assert _availability(client, alice, 5, 4).status_code == 400
+    assert client.get('/api/availability', headers=alice, query_string={'from': '2030-01-01', 'to': day(1)}).status_code == 400
+    assert client.get('/api/availability').status_code == 401
+
+
+def test_availability_cache_follows_booking_changes(backend, data_dir):
+    bookings, guesthouses = registry.bookings, registry.guesthouses
+    assert type(bookings).__name__ == {'csv': 'BookingService', 'sqlite': 'SqliteBookingService'}[backend]
+    first = get_availability(bookings, guesthouses, day_number(10), day_number(12))
+    assert get_availability(bookings, guesthouses, day_number(10), day_number(12)) is first # Served from the cache
+
+    booking_id, _ = bookings.create_booking_request('2', 'bob', day(10), day(10))
+    changed = get_availability(bookings, guesthouses, day_number(10), day_number(12))
+    assert changed is not first
+    assert next(row for row in changed['guesthouses'] if row['id'] == '2')['occupancy'] == [1, 0, 0]
+
+    bookings.cancel_booking(booking_id, 'bob')
+    freed = get_availability(bookings, guesthouses, day_number(10), day_number(12))
+    assert next(row for row in freed['guesthouses'] if row['id'] == '2')['available']
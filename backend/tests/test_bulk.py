@@ -0,0 +1,89 @@
+import pytest
+
+from app.utils import MAX_BULK_ITEMS
+
+from conftest import day, login
+
+
+def _item(guesthouse_id='1', username='alice', start=10, end=12, **extra):
+    return {'guesthouse_id': guesthouse_id, 'username': username, 'start_date': day(start), 'end_date': day(end), **extra}
+
+
+@pytest.fixture
+def admin(backend, client):
+    return login(client, 'admin')
+
+
+def test_bulk_import_reports_each_item(admin, client):
+    items = [
+        _item(),
+        _item(username='bob', start=11, end=13),      # Overlaps the first item of the same batch
+        _item(guesthouse_id='2', username='bob', status='confirmed'),
+        _item(username='x', start=20, end=21),        # No such user
+        _item(guesthouse_id='99', start=20, end=21),  # No such guesthouse
+        _item(start=25, end=24),                      # Ends before it starts
+        _item(status='cancelled', start=30, end=31),
+        {'guesthouse_id': '3', 'username': 'alice'},
+        'not an object',
+    ]
+    response = client.post('/api/admin/bookings/bulk-import', headers=admin, json={'bookings': items})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['msg'] == f"2 of {len(items)} bookings created."
+    results = body['results']
+    assert [result['index'] for result in results] == list(range(len(items)))
+    assert [result['ok'] for result in results] == [True, False, True, False, False, False, False, False, False]
+    assert results[1]['msg'] == "Guesthouse not available for selected dates."
+    assert results[3]['msg'] == "Unknown username: x"
+    assert results[4]['msg'] == "Unknown guesthouse_id: 99"
+
+    bookings = {b['booking_id']: b for b in client.get('/api/admin/bookings/all', headers=admin).get_json()}
+    assert bookings[results[0]['booking_id']]['status'] == 'pending'
+    assert bookings[results[2]['booking_id']]['status'] == 'confirmed'
+    assert len(bookings) == 2
+
+
+@pytest.mark.parametrize('body', [{}, {'bookings': []}, {'bookings': 'x'}, {'bookings': [_item()] * (MAX_BULK_ITEMS + 1)}])
+def test_bulk_import_rejects_malformed_bodies(admin, client, body):
+    assert client.post('/api/admin/bookings/bulk-import', headers=admin, json=body).status_code == 400
+
+
+def test_bulk_endpoints_are_admin_only(backend, client):
+    alice = login(client, 'alice')
+    assert client.post('/api/admin/bookings/bulk-import', headers=alice, json={'bookings': [_item()]}).status_code == 403
+    assert client.post('/api/admin/bookings/bulk-status', headers=alice, json={'approve': ['x']}).status_code == 403
+
+
+def test_bulk_status_rejects_before_confirming(admin, client):
+    created = client.post('/api/admin/bookings/bulk-import', headers=admin, json={'bookings': [
+        _item(), _item(guesthouse_id='2', username='bob'),
+    ]}).get_json()['results']
+    first, second = (result['booking_id'] for result in created)
+    response = client.post('/api/admin/bookings/bulk-status', headers=admin,
+                           json={'approve': [second, 'missing'], 'reject': [first]})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['msg'] == "2 of 3 bookings updated."
+    assert [result['ok'] for result in body['results']] == [True, False, True]
+
+    statuses = {b['booking_id']: b['status'] for b in client.get('/api/admin/bookings/all', headers=admin).get_json()}
+    assert statuses == {first: 'rejected', second: 'confirmed'}
+    assert client.get('/api/admin/bookings/pending', headers=admin).get_json() == []
+
+
+def test_bulk_status_can_free_and_claim_dates_in_one_batch(admin, client):
+    alice = login(client, 'alice')
+    holder = client.post('/api/admin/bookings/bulk-import', headers=admin,
+                         json={'bookings': [_item(status='confirmed')]}).get_json()['results'][0]['booking_id']
+    # A rejected request for the same dates, to be confirmed once the holder is rejected
+    claimant = client.post('/api/bookings/request', headers=alice,
+                           json={'guesthouse_id': '1', 'start_date': day(10), 'end_date': day(12), 'waitlist': True}).get_json()['booking_id']
+    assert client.post(f'/api/admin/bookings/reject/{claimant}', headers=admin).status_code == 200
+
+    response = client.post('/api/admin/bookings/bulk-status', headers=admin, json={'approve': [claimant], 'reject': [holder]})
+    assert [result['ok'] for result in response.get_json()['results']] == [True, True]
+
+
+@pytest.mark.parametrize('body', [{}, {'approve': 'x'}, {'approve': [], 'reject': []}])
+def test_bulk_status_rejects_malformed_bodies(admin, client, body):
+    assert client.post('/api/admin/bookings/bulk-status', headers=admin, json=body).status_code == 400
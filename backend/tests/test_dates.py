@@ -0,0 +1,51 @@
+from datetime import date, datetime
+
+import pytest
+
+from app.utils import (
+    DATE_FORMAT, _parse_day, date_string_to_ordinal, format_day, from_iso_date, to_iso_date, validate_date_range
+)
+
+
+def _strptime_ordinal(text):
+    """What the uncached parser (datetime.strptime with DATE_FORMAT) accepted."""
+    if not text or text != text:
+        return None
+    try:
+        return datetime.strptime(str(text), DATE_FORMAT).toordinal()
+    except ValueError:
+        return None
+
+
+@pytest.mark.parametrize('text', [
+    '01-06-2025', '1-6-2025', '29-02-2024', '31-12-9999', '01-01-0001',
+    '29-02-2023', '31-04-2025', '00-01-2025', '01-13-2025',
+    '2025-06-01', '01/06/2025', '01-06-25', ' 01-06-2025', '01-06-2025 ', '01-06-2025x',
+    '٠١-٠٦-٢٠٢٥', '+1-06-2025', '', None, float('nan'),
+])
+def test_cached_parser_accepts_what_strptime_accepts(text):
+    assert date_string_to_ordinal(text) == _strptime_ordinal(text)
+    assert date_string_to_ordinal(text) == _strptime_ordinal(text) # Second call is a cache hit
+
+
+def test_repeat_parses_hit_the_cache():
+    date_string_to_ordinal('17-10-2031')
+    before = _parse_day.cache_info().hits
+    for _ in range(5):
+        assert date_string_to_ordinal('17-10-2031') == date(2031, 10, 17).toordinal()
+    assert _parse_day.cache_info().hits == before + 5
+
+
+def test_wire_format_round_trips():
+    ordinal = date(2025, 6, 1).toordinal()
+    assert format_day(ordinal) == '01-06-2025'
+    assert date_string_to_ordinal(format_day(ordinal)) == ordinal
+    assert to_iso_date('1-6-2025') == '2025-06-01'
+    assert from_iso_date(to_iso_date('01-06-2025')) == '01-06-2025'
+    assert to_iso_date('not a date') == 'not a date'
+
+
+def test_validate_date_range():
+    assert validate_date_range('01-06-2025', '01-06-2025') is None
+    assert validate_date_range('02-06-2025', '01-06-2025') == "Start date cannot be after end date."
+    assert validate_date_range('2025-06-01', '01-06-2025') == "Invalid date format. Use DD-MM-YYYY"
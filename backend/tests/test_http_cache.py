@@ -0,0 +1,76 @@
+from app.http_cache import make_etag
+
+from conftest import day, login
+
+
+def _book(client, headers, guesthouse_id='1', start=10, end=12):
+    response = client.post('/api/bookings/request', headers=headers,
+                           json={'guesthouse_id': guesthouse_id, 'start_date': day(start), 'end_date': day(end)})
+    assert response.status_code == 201
+    return response.get_json()['booking_id']
+
+
+def _revalidate(client, url, headers, response):
+    return client.get(url, headers={**headers, 'If-None-Match': response.headers['ETag']})
+
+
+def test_make_etag_joins_the_parts():
+    assert make_etag('u', 'abc', 3) == 'u-abc-3'
+
+
+def test_unchanged_listing_is_answered_with_304(backend, client):
+    alice = login(client, 'alice')
+    _book(client, alice)
+    first = client.get('/api/bookings/my', headers=alice)
+    assert first.status_code == 200
+    assert first.headers['ETag'] and first.headers['Cache-Control'] == 'private, no-cache'
+
+    again = _revalidate(client, '/api/bookings/my', alice, first)
+    assert again.status_code == 304
+    assert again.data == b''
+    assert again.headers['ETag'] == first.headers['ETag']
+    # Weak validators match too
+    weak = client.get('/api/bookings/my', headers={**alice, 'If-None-Match': f"W/{first.headers['ETag']}"})
+    assert weak.status_code == 304
+
+
+def test_write_changes_the_etag_and_body(backend, client):
+    alice = login(client, 'alice')
+    first = client.get('/api/bookings/my', headers=alice)
+    assert first.get_json() == []
+
+    booking_id = _book(client, alice)
+    after_booking = _revalidate(client, '/api/bookings/my', alice, first)
+    assert after_booking.status_code == 200
+    assert after_booking.headers['ETag'] != first.headers['ETag']
+    assert [b['booking_id'] for b in after_booking.get_json()] == [booking_id]
+
+    assert client.post(f'/api/bookings/cancel/{booking_id}', headers=alice).status_code == 200
+    after_cancel = _revalidate(client, '/api/bookings/my', alice, after_booking)
+    assert after_cancel.status_code == 200
+    assert after_cancel.get_json()[0]['status'] == 'cancelled'
+
+
+def test_admin_listings_follow_status_changes(backend, client):
+    alice, admin = login(client, 'alice'), login(client, 'admin')
+    booking_id = _book(client, alice)
+    pending = client.get('/api/admin/bookings/pending', headers=admin)
+    listing = client.get('/api/admin/bookings/all', headers=admin)
+    assert [b['booking_id'] for b in pending.get_json()] == [booking_id]
+    assert _revalidate(client, '/api/admin/bookings/all', admin, listing).status_code == 304
+
+    assert client.post(f'/api/admin/bookings/approve/{booking_id}', headers=admin).status_code == 200
+    pending_after = _revalidate(client, '/api/admin/bookings/pending', admin, pending)
+    assert pending_after.status_code == 200 and pending_after.get_json() == []
+    listing_after = _revalidate(client, '/api/admin/bookings/all', admin, listing)
+    assert listing_after.status_code == 200
+    assert listing_after.get_json()[0]['status'] == 'confirmed'
+
+
+def test_guesthouse_listing_is_conditional(backend, client):
+    alice = login(client, 'alice')
+    first = client.get('/api/guesthouses', headers=alice)
+    assert len(first.get_json()) == 3
+    # Bookings do not change the guesthouse list
+    _book(client, alice)
+    assert _revalidate(client, '/api/guesthouses', alice, first).status_code == 304
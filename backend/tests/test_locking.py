@@ -0,0 +1,131 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from app.storage import InterProcessLock
+
+from conftest import day
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _run_python(code):
+    """Runs `code` in a separate worker process in the current (test data) directory."""
+    env = dict(os.environ, PYTHONPATH=BACKEND_DIR)
+    return subprocess.Popen([sys.executable, '-c', code], env=env, stdout=subprocess.PIPE, text=True)
+
+
+def test_shared_holders_run_concurrently(data_dir):
+    lock = InterProcessLock('data/test.lock')
+    both_inside = threading.Barrier(2, timeout=5)
+    errors = []
+
+    def reader():
+        try:
+            with lock.hold(shared=True):
+                both_inside.wait() # Only passes if the other reader is inside at the same time
+        except threading.BrokenBarrierError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=reader) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+
+
+def test_exclusive_holder_excludes_readers(data_dir):
+    lock = InterProcessLock('data/test.lock')
+    entered = threading.Event()
+
+    def reader():
+        with lock.hold(shared=True):
+            entered.set()
+
+    with lock.hold():
+        thread = threading.Thread(target=reader)
+        thread.start()
+        assert not entered.wait(0.2)
+    assert entered.wait(5)
+    thread.join()
+
+
+def test_nested_holds_and_upgrade(data_dir):
+    lock = InterProcessLock('data/test.lock')
+    with lock.hold():
+        with lock.hold(shared=True): # A read inside a write keeps the exclusive hold
+            with lock.hold():
+                assert lock.held()
+    assert not lock.held()
+
+    with lock.hold(shared=True):
+        with pytest.raises(RuntimeError):
+            with lock.hold():
+                pass
+        assert lock.held()
+    assert not lock.held()
+
+    with lock.hold(): # Nothing leaked from the failed upgrade
+        pass
+
+
+def test_exclusive_lock_is_shared_with_other_processes(data_dir):
+    child = _run_python(
+        "import time\n"
+        "from app.storage import InterProcessLock\n"
+        "with InterProcessLock('data/test.lock').hold():\n"
+        "    open('data/child-locked', 'w').close()\n"
+        "    time.sleep(0.5)\n"
+    )
+    try:
+        deadline = time.monotonic() + 10
+        while not os.path.exists('data/child-locked'):
+            assert time.monotonic() < deadline and child.poll() is None
+            time.sleep(0.01)
+        started = time.monotonic()
+        with InterProcessLock('data/test.lock').hold(shared=True):
+            waited = time.monotonic() - started
+    finally:
+        child.wait(10)
+    assert waited >= 0.3
+
+
+def test_rows_appended_by_another_process_are_replayed(booking_service):
+    mine, _ = booking_service.create_booking_request('1', 'alice', day(10), day(12))
+    child = _run_python(
+        "from app import services\n"
+        "service = services.BookingService(services.GuesthouseService())\n"
+        f"booking_id, _ = service.create_booking_request('2', 'bob', '{day(10)}', '{day(12)}')\n"
+        f"service.update_booking_status('{mine}', 'confirmed')\n"
+        "print(booking_id)\n"
+    )
+    theirs = child.communicate(timeout=30)[0].strip().splitlines()[-1]
+    assert child.returncode == 0
+
+    # Appended rows are replayed on the next call: the new booking and the status change
+    assert not booking_service.is_guesthouse_available('2', day(11), day(11))
+    assert {b['booking_id']: b['status'] for b in booking_service.get_user_bookings('bob')} == {theirs: 'pending'}
+    assert booking_service.get_user_bookings('alice')[0]['status'] == 'confirmed'
+    assert len(booking_service.bookings) == 2
+
+
+def test_log_replaced_by_another_process_is_reloaded(booking_service):
+    booking_id, _ = booking_service.create_booking_request('1', 'alice', day(10), day(12))
+    booking_service.update_booking_status(booking_id, 'rejected')
+    child = _run_python(
+        "from app import services\n"
+        "service = services.BookingService(services.GuesthouseService())\n"
+        f"service.update_booking_status('{booking_id}', 'confirmed')\n"
+        "service.compact()\n"
+    )
+    child.communicate(timeout=30)
+    assert child.returncode == 0
+
+    assert not booking_service.is_guesthouse_available('1', day(10), day(10))
+    assert booking_service.superseded_rows == 0
+    assert [b.status for b in booking_service.bookings] == ['confirmed']
@@ -0,0 +1,21 @@
+import logging
+
+from conftest import login
+
+
+def test_metrics_require_an_admin_or_the_metrics_token(app, client):
+    assert client.get('/api/metrics').status_code == 401
+    assert client.get('/api/metrics', headers=login(client, 'alice')).status_code == 403
+    response = client.get('/api/metrics', headers=login(client, 'admin'))
+    assert response.status_code == 200
+    assert 'guesthouse_write_behind_pending' in response.get_data(as_text=True)
+
+    app.config['METRICS_TOKEN'] = 's3cret'
+    assert client.get('/api/metrics', headers={'Authorization': 'Bearer s3cret'}).status_code == 200
+    assert client.get('/api/metrics', headers={'Authorization': 'Bearer wrong'}).status_code in (401, 422)
+
+
+def test_service_messages_go_through_the_app_logger(booking_service, caplog):
+    with caplog.at_level(logging.DEBUG, logger='app'):
+        booking_service.compact()
+    assert any(record.name == 'app.services' and 'Compacted' in record.getMessage() for record in caplog.records)
@@ -0,0 +1,114 @@
+import threading
+
+import pytest
+
+from app import auth
+from app import services
+from app.passwords import (
+    DUMMY_PASSWORD_HASH, PASSWORD_HASH_ITERATIONS, PasswordVerifier, PasswordVerifierBusy, PasswordCheckTimeout,
+    hash_password, verify_password
+)
+from app.registry import registry
+from app.storage import read_csv_records
+
+
+class SlowVerifier(PasswordVerifier):
+    """Checks block until the test releases them."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.release = threading.Event()
+
+    def _check(self, password, stored):
+        self.release.wait(10)
+        return super()._check(password, stored)
+
+
+def test_hash_round_trip_and_legacy_plaintext():
+    stored = hash_password('s3cret')
+    assert verify_password('s3cret', stored)[0]
+    assert not verify_password('wrong', stored)[0]
+    assert verify_password('plain', 'plain') == (True, True) # Plaintext matches but needs a rehash
+
+
+def test_timeout_raises_and_keeps_the_slot_until_the_check_finishes():
+    verifier = SlowVerifier(workers=1, max_pending=1)
+    stored = hash_password('s3cret')
+    with pytest.raises(PasswordCheckTimeout):
+        verifier.verify('s3cret', stored, timeout=0.01)
+    # The abandoned check still runs, so the bound must still count it
+    with pytest.raises(PasswordVerifierBusy):
+        verifier.verify('s3cret', stored, timeout=0.01)
+
+    verifier.release.set()
+    for _ in range(100): # The slot is released by the finished check's callback
+        try:
+            assert verifier.verify('s3cret', stored, timeout=5) == (True, None)
+            break
+        except PasswordVerifierBusy:
+            threading.Event().wait(0.01)
+    else:
+        pytest.fail("Slot was never released")
+
+
+def test_timed_out_check_that_never_started_frees_its_slot():
+    verifier = SlowVerifier(workers=1, max_pending=2)
+    stored = hash_password('s3cret')
+    blocker = threading.Thread(target=lambda: verifier.verify('s3cret', stored, timeout=5))
+    blocker.start()
+    with pytest.raises(PasswordCheckTimeout): # Queued behind the blocker, then cancelled
+        verifier.verify('s3cret', stored, timeout=0.05)
+    with pytest.raises(PasswordCheckTimeout): # A slot is free again, so this is not "busy"
+        verifier.verify('s3cret', stored, timeout=0.05)
+    verifier.release.set()
+    blocker.join()
+
+
+def test_login_returns_503_with_retry_after_on_timeout(client, monkeypatch):
+    verifier = SlowVerifier(workers=1, max_pending=4, timeout=0.01)
+    monkeypatch.setattr(auth, 'password_verifier', verifier)
+    try:
+        response = client.post('/api/login', json={'username': 'alice', 'password': 'alicepass'})
+    finally:
+        verifier.release.set()
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+
+
+def test_login_returns_503_when_the_pool_is_full(client, monkeypatch):
+    verifier = SlowVerifier(workers=1, max_pending=1, timeout=5)
+    monkeypatch.setattr(auth, 'password_verifier', verifier)
+    verifier._slots.acquire() # Another login holds the only slot
+    response = client.post('/api/login', json={'username': 'alice', 'password': 'alicepass'})
+    assert response.status_code == 503
+    assert 'Retry-After' in response.headers
+
+
+def test_login_upgrades_plaintext_password(client):
+    response = client.post('/api/login', json={'username': 'alice', 'password': 'alicepass'})
+    assert response.status_code == 200
+    assert client.post('/api/login', json={'username': 'alice', 'password': 'nope'}).status_code == 401
+    assert registry.users.get_user('alice')['password'].startswith('pbkdf2_sha256$')
+
+
+def test_upgraded_hash_is_written_to_users_csv(client):
+    assert client.post('/api/login', json={'username': 'alice', 'password': 'alicepass'}).status_code == 200
+    stored = {row['username']: row['password'] for row in read_csv_records('data/users.csv')}
+    assert stored['alice'].startswith('pbkdf2_sha256$')
+    assert stored['bob'] == 'bobpass' # Other users are left alone until they log in
+
+    # Another worker (or a restart) reads the hash instead of rehashing the plaintext
+    other_worker = services.UserService()
+    assert other_worker.get_user('alice')['password'] == stored['alice']
+    assert client.post('/api/login', json={'username': 'alice', 'password': 'alicepass'}).status_code == 200
+    assert {row['username']: row['password'] for row in read_csv_records('data/users.csv')}['alice'] == stored['alice']
+
+
+def test_unknown_user_costs_a_full_password_check(client, monkeypatch):
+    checked = []
+    verify = auth.password_verifier.verify
+    monkeypatch.setattr(auth.password_verifier, 'verify', lambda password, stored: checked.append(stored) or verify(password, stored))
+    assert client.post('/api/login', json={'username': 'nobody', 'password': 'x'}).status_code == 401
+    assert checked == [DUMMY_PASSWORD_HASH]
+    assert DUMMY_PASSWORD_HASH.split('$')[1] == str(PASSWORD_HASH_ITERATIONS) # Same work factor as fresh hashes
+    assert verify_password('', DUMMY_PASSWORD_HASH)[0] is False
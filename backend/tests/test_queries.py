@@ -0,0 +1,90 @@
+import base64
+import json
+
+import pytest
+
+from app.queries import decode_cursor, encode_cursor
+from app.registry import registry
+
+from conftest import day, login
+
+
+def _raw_cursor(value):
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode().rstrip('=')
+
+
+def _book(client, headers, guesthouse_id, start, end):
+    response = client.post('/api/bookings/request', headers=headers,
+                           json={'guesthouse_id': guesthouse_id, 'start_date': start, 'end_date': end})
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()['booking_id']
+
+
+def _pages(client, headers, sort, limit=2):
+    """Follows X-Next-Cursor to the end; returns the booking ids of each page."""
+    pages, after = [], None
+    while True:
+        url = f'/api/admin/bookings/all?limit={limit}&sort={sort}' + (f'&after={after}' if after else '')
+        response = client.get(url, headers=headers)
+        assert response.status_code == 200, response.get_json()
+        pages.append([b['booking_id'] for b in response.get_json()])
+        after = response.headers.get('X-Next-Cursor')
+        if not after:
+            return pages
+
+
+@pytest.fixture
+def bookings(backend, client):
+    """Seven bookings; several share a start date so pages break on the booking_id tiebreak."""
+    headers = login(client, 'alice')
+    ids = []
+    for offset, guesthouse_id in ((10, '1'), (10, '2'), (10, '3'), (20, '1'), (20, '2'), (5, '1'), (30, '3')):
+        ids.append(_book(client, headers, guesthouse_id, day(offset), day(offset + 1)))
+    return ids
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(738000, 'abc')) == (738000, 'abc')
+    assert decode_cursor(encode_cursor(-1, 'abc')) == (-1, 'abc') # Bookings without a parsable date
+
+
+@pytest.mark.parametrize('sort', ['start_date', '-start_date', 'created', '-end_date'])
+def test_pages_cover_every_booking_once(bookings, client, sort):
+    admin = login(client, 'admin')
+    pages = _pages(client, admin, sort)
+    flat = [booking_id for page in pages for booking_id in page]
+    assert sorted(flat) == sorted(bookings)
+    assert all(len(page) <= 2 for page in pages)
+
+    unpaged = client.get(f'/api/admin/bookings/all?limit=100&sort={sort}', headers=admin).get_json()
+    assert flat == [b['booking_id'] for b in unpaged]
+
+
+@pytest.mark.parametrize('value', [['x', 1], [None, 1], [[1], 1], [True, 'a'], [1, 2], [1, 'a', 'b'], {'a': 1}, 5])
+def test_malformed_cursor_is_rejected(backend, client, value):
+    response = client.get(f'/api/bookings/my?limit=2&after={_raw_cursor(value)}', headers=login(client, 'alice'))
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize('cursor', ['!!!', 'bm90IGpzb24', ''])
+def test_garbage_cursor_is_rejected(client, cursor):
+    response = client.get(f'/api/bookings/my?limit=2&after={cursor}', headers=login(client, 'alice'))
+    # An empty cursor is the same as no cursor
+    assert response.status_code == (200 if cursor == '' else 400)
+
+
+def test_cursor_survives_compaction_and_archival(data_dir, client):
+    headers = login(client, 'alice')
+    ids = [_book(client, headers, gh, day(10), day(11)) for gh in ('1', '2', '3')]
+    ids += [_book(client, headers, gh, day(20), day(21)) for gh in ('1', '2')]
+    first = client.get('/api/bookings/my?limit=2&sort=start_date', headers=headers)
+    seen = [b['booking_id'] for b in first.get_json()]
+
+    service = registry.bookings
+    service.update_booking_status(seen[0], 'rejected')
+    assert service.compact()
+    assert service.archive_cold_bookings(after_days=0) == 1 # The rejected booking moves to the archive
+
+    rest = client.get(f"/api/bookings/my?sort=start_date&after={first.headers['X-Next-Cursor']}", headers=headers)
+    assert rest.status_code == 200
+    assert sorted(seen + [b['booking_id'] for b in rest.get_json()]) == sorted(ids)
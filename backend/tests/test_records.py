@@ -0,0 +1,48 @@
+from datetime import date
+
+from app.records import MISSING_DAY, Booking, Guesthouse
+from app.utils import BOOKING_COLUMNS
+
+ROW = {'booking_id': 'b1', 'guesthouse_id': '1', 'username': 'alice', 'start_date': '10-06-2030',
+       'end_date': '12-06-2030', 'status': 'pending', 'booked_at': '01-06-2030'}
+
+
+def test_booking_round_trips_and_normalizes_dates():
+    booking = Booking.from_dict(ROW)
+    assert booking.to_dict() == ROW
+    assert list(booking.to_dict()) == BOOKING_COLUMNS
+    assert booking.start_day == date(2030, 6, 10).toordinal()
+    assert booking.day('booked_at') == date(2030, 6, 1).toordinal()
+    assert not hasattr(booking, '__dict__') # Slotted: no per-record dict
+
+
+def test_booking_from_a_legacy_row():
+    booking = Booking.from_dict({'booking_id': 'b2', 'guesthouse_id': 3, 'username': 'bob',
+                                 'start_date': float('nan'), 'end_date': None, 'status': 'pending'})
+    assert booking.guesthouse_id == '3'
+    assert (booking.start_date, booking.end_date, booking.booked_at) == ('', '', '')
+    assert booking.start_day == booking.end_day == booking.booked_day == MISSING_DAY
+
+
+def test_records_share_interned_values():
+    first = Booking.from_dict(ROW)
+    # Built from fresh strings, as a CSV reader would produce them
+    second = Booking.from_dict({key: ''.join(value) for key, value in {**ROW, 'booking_id': 'b3'}.items()})
+    assert first.username is second.username
+    assert first.status is second.status
+    assert first.start_date is second.start_date
+
+
+def test_with_status_builds_a_new_record():
+    booking = Booking.from_dict(ROW)
+    confirmed = booking.with_status('confirmed')
+    assert booking.status == 'pending' # Records are never changed in place
+    assert confirmed.to_dict() == {**ROW, 'status': 'confirmed'}
+    assert confirmed.start_day == booking.start_day
+
+
+def test_guesthouse_capacity_parsing():
+    assert Guesthouse.from_dict({'id': '1', 'location': 'Tezpur', 'name': 'River House', 'capacity': '8'}).capacity == 8
+    assert Guesthouse.from_dict({'id': '1', 'capacity': '4.0'}).capacity == 4
+    assert Guesthouse.from_dict({'id': '1', 'capacity': 'many'}).capacity == 0
+    assert Guesthouse.from_dict({'id': 2}).to_dict() == {'id': '2', 'location': '', 'name': '', 'capacity': 0}
@@ -0,0 +1,131 @@
+import pytest
+
+from app import create_app, sqlite_services
+from app.registry import registry
+from app.reports import rebuild_report_tables
+from app.sqlite_services import SqliteBookingService
+from app.storage import append_booking_rows, booking_from_db_row, get_primary_connection
+from app.utils import BOOKING_COLUMNS
+
+from conftest import close_primary_connection, day, init_store, login
+
+
+def _summaries(conn):
+    return (
+        sorted(tuple(row) for row in conn.execute("SELECT * FROM report_occupancy")),
+        sorted(tuple(row) for row in conn.execute("SELECT * FROM report_lead_days")),
+    )
+
+
+def _rebuilt_summaries(conn):
+    conn.execute("SAVEPOINT check_rebuild")
+    rows = conn.execute(f"SELECT {', '.join(BOOKING_COLUMNS)} FROM bookings")
+    rebuild_report_tables(conn, [booking_from_db_row(row) for row in rows])
+    summaries = _summaries(conn)
+    conn.execute("ROLLBACK TO check_rebuild")
+    conn.execute("RELEASE check_rebuild")
+    return summaries
+
+
+@pytest.fixture
+def sqlite_bookings(data_dir):
+    return SqliteBookingService()
+
+
+def test_sqlite_summaries_follow_each_transaction(sqlite_bookings, monkeypatch):
+    service = sqlite_bookings
+    conn = get_primary_connection()
+    with service.report_db():
+        pass # Built once from the (empty) import
+
+    def no_rebuild(*args, **kwargs):
+        raise AssertionError("report_db rebuilt the summaries")
+
+    monkeypatch.setattr(sqlite_services, 'rebuild_report_tables', no_rebuild)
+    first, _ = service.create_booking_request('1', 'alice', day(10), day(14))
+    second, _ = service.create_booking_request('2', 'bob', day(30), day(40))
+    waiting, status, _ = service.join_waitlist('1', 'bob', day(12), day(13))
+    assert status == 'waitlisted'
+    service.update_booking_status(second, 'confirmed')
+    service.bulk_create_bookings([{'guesthouse_id': '3', 'username': 'alice', 'start_date': day(5), 'end_date': day(6)}])
+    service.cancel_booking(first, 'alice') # Promotes the waitlisted request in the same transaction
+    service.bulk_update_status([(waiting, 'rejected')])
+
+    with service.report_db() as (report_conn, version):
+        assert _summaries(report_conn) == _rebuilt_summaries(conn)
+        decisions = dict(report_conn.execute("SELECT booking_id, status FROM booking_decisions"))
+    assert decisions == {second: 'confirmed', waiting: 'rejected'}
+
+
+def test_sqlite_summaries_are_built_on_import(data_dir):
+    append_booking_rows([{'booking_id': 'x', 'guesthouse_id': '1', 'username': 'alice', 'status': 'confirmed',
+                          'start_date': day(1), 'end_date': day(2), 'booked_at': day(0)}])
+    SqliteBookingService()
+    conn = get_primary_connection()
+    occupancy, _ = _summaries(conn)
+    # Two days of one stay (possibly split over two months)
+    assert sum(days for _, gid, status, days, _ in occupancy if (gid, status) == ('1', 'confirmed')) == 2
+
+
+def _report_scenario(client):
+    """The same bookings and decisions on any backend; returns every report over days 0..60."""
+    alice, bob, admin = login(client, 'alice'), login(client, 'bob'), login(client, 'admin')
+
+    def book(headers, guesthouse_id, start, end, **extra):
+        body = {'guesthouse_id': guesthouse_id, 'start_date': day(start), 'end_date': day(end), **extra}
+        return client.post('/api/bookings/request', headers=headers, json=body).get_json()['booking_id']
+
+    client.post(f"/api/admin/bookings/approve/{book(alice, '1', 10, 12)}", headers=admin)
+    book(bob, '2', 20, 29)
+    client.post(f"/api/admin/bookings/reject/{book(alice, '3', 5, 6)}", headers=admin)
+    book(bob, '1', 11, 11, waitlist=True)
+    client.post(f"/api/bookings/cancel/{book(alice, '2', 40, 41)}", headers=alice)
+    client.post('/api/admin/bookings/bulk-import', headers=admin, json={'bookings': [
+        {'guesthouse_id': '3', 'username': 'bob', 'start_date': day(30), 'end_date': day(31), 'status': 'confirmed'},
+    ]})
+
+    window = {'from': day(0), 'to': day(60)}
+    results = {
+        'occupancy': client.get('/api/admin/reports/occupancy', headers=admin, query_string=window),
+        'occupancy_by_location': client.get('/api/admin/reports/occupancy', headers=admin,
+                                            query_string={**window, 'by': 'location'}),
+        'lead_time': client.get('/api/admin/reports/lead-time', headers=admin),
+        'lead_time_confirmed': client.get('/api/admin/reports/lead-time', headers=admin,
+                                          query_string={'status': 'confirmed', 'location': 'Shillong'}),
+        'turnaround': client.get('/api/admin/reports/turnaround', headers=admin),
+    }
+    assert all(response.status_code == 200 for response in results.values())
+    results = {name: response.get_json() for name, response in results.items()}
+    del results['turnaround']['tracked_since'] # When the decision log started, differs per run
+    return results
+
+
+def _days(report, key, field):
+    return {row[key]: sum(row[field]) for row in report['rows']}
+
+
+def test_csv_reports_follow_writes(data_dir):
+    results = _report_scenario(create_app().test_client())
+    assert _days(results['occupancy'], 'guesthouse_id', 'booked_days') == {'1': 3, '2': 0, '3': 2}
+    assert _days(results['occupancy'], 'guesthouse_id', 'pending_days') == {'1': 0, '2': 10, '3': 0}
+    assert _days(results['occupancy_by_location'], 'location', 'booked_days') == {'Shillong': 3, 'Tezpur': 2}
+    assert results['lead_time']['bookings'] == 6
+    assert results['lead_time_confirmed']['bookings'] == 1 # Only the Shillong booking is confirmed
+    assert results['lead_time_confirmed']['p50_days'] == 10
+    assert results['turnaround']['confirmed']['bookings'] == 1
+    assert results['turnaround']['rejected']['bookings'] == 1
+
+
+def test_backends_report_the_same_numbers(tmp_path, monkeypatch):
+    results = {}
+    for backend in ('csv', 'sqlite'):
+        (tmp_path / backend).mkdir()
+        init_store(tmp_path / backend, monkeypatch)
+        monkeypatch.setenv('STORAGE_BACKEND', backend)
+        try:
+            results[backend] = _report_scenario(create_app().test_client())
+        finally:
+            registry.reset()
+            close_primary_connection()
+    assert _days(results['sqlite']['occupancy'], 'guesthouse_id', 'booked_days') == {'1': 3, '2': 0, '3': 2}
+    assert results['csv'] == results['sqlite']
@@ -0,0 +1,46 @@
+from app import services
+from app.registry import registry
+from app.storage import append_booking_rows
+
+from conftest import day, login
+
+
+def test_create_app_builds_no_services(app, client):
+    assert [registry.get_if_built(name) for name in ('users', 'guesthouses', 'bookings')] == [None, None, None]
+    assert client.get('/api/health').status_code == 200
+    assert registry.get_if_built('users') is None
+
+    login(client, 'alice') # Needs the users only
+    assert registry.get_if_built('users') is not None
+    assert registry.get_if_built('bookings') is None
+    client.get('/api/bookings/my', headers=login(client, 'alice'))
+    assert registry.get_if_built('bookings') is not None
+
+
+def test_warm_up_builds_every_service(data_dir):
+    users, guesthouses, bookings = registry.warm_up()
+    assert registry.get_if_built('bookings') is bookings
+    assert bookings.guesthouse_service is guesthouses and bookings.user_service is users
+
+
+def _startup_syncs(monkeypatch):
+    syncs = []
+    original = services.BookingService._queue_db_sync
+    monkeypatch.setattr(services.BookingService, '_queue_db_sync', lambda self: syncs.append(1) or original(self))
+    return syncs
+
+
+def test_startup_sync_is_skipped_when_the_db_is_current(data_dir, monkeypatch):
+    append_booking_rows([{'booking_id': 'b1', 'guesthouse_id': '1', 'username': 'alice', 'status': 'pending',
+                          'start_date': day(1), 'end_date': day(2), 'booked_at': day(0)}])
+    syncs = _startup_syncs(monkeypatch)
+    services.BookingService(services.GuesthouseService())
+    assert len(syncs) == 1 # Fresh DB: exported once (inline, as write-behind is off in tests)
+
+    services.BookingService(services.GuesthouseService())
+    assert len(syncs) == 1 # The DB records this bookings.csv stamp and count
+
+    append_booking_rows([{'booking_id': 'b2', 'guesthouse_id': '2', 'username': 'bob', 'status': 'pending',
+                          'start_date': day(1), 'end_date': day(2), 'booked_at': day(0)}])
+    services.BookingService(services.GuesthouseService())
+    assert len(syncs) == 2 # Another process appended a booking
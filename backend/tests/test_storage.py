@@ -0,0 +1,126 @@
+import sqlite3
+
+from app import services, storage
+from app.storage import read_csv_records, read_sync_state, upsert_bookings
+from app.utils import BOOKINGS_FILE, DATABASE_FILE
+from app.write_behind import WriteBehindWorker
+
+from conftest import day
+
+
+def _statuses(service):
+    return {booking.booking_id: booking.status for booking in service.bookings}
+
+
+def test_compaction_keeps_last_row_per_booking(booking_service):
+    ids = [booking_service.create_booking_request(str(gh), 'alice', day(10), day(12))[0] for gh in (1, 2, 3)]
+    booking_service.update_booking_status(ids[0], 'confirmed')
+    booking_service.update_booking_status(ids[1], 'rejected')
+    booking_service.cancel_booking(ids[0], 'alice') # confirmed -> cancelled: three rows for one booking
+    assert len(read_csv_records(BOOKINGS_FILE)) == 6
+    before = _statuses(booking_service)
+
+    assert booking_service.compact()
+    rows = read_csv_records(BOOKINGS_FILE)
+    assert [row['booking_id'] for row in rows] == ids # One row each, in creation order
+    assert {row['booking_id']: row['status'] for row in rows} == before == {
+        ids[0]: 'cancelled', ids[1]: 'rejected', ids[2]: 'pending'
+    }
+
+    reloaded = services.BookingService(services.GuesthouseService())
+    assert _statuses(reloaded) == before
+    assert reloaded.superseded_rows == 0
+    assert reloaded.is_guesthouse_available('1', day(10), day(12))
+    assert not reloaded.is_guesthouse_available('3', day(10), day(12))
+
+
+def test_replay_without_compaction_is_last_row_wins(booking_service):
+    booking_id, _ = booking_service.create_booking_request('1', 'alice', day(10), day(12))
+    booking_service.update_booking_status(booking_id, 'confirmed')
+    booking_service.update_booking_status(booking_id, 'rejected')
+
+    reloaded = services.BookingService(services.GuesthouseService())
+    assert _statuses(reloaded) == {booking_id: 'rejected'}
+    assert reloaded.superseded_rows == 2
+
+
+def test_threshold_compaction_runs_on_write_behind_worker(booking_service, monkeypatch):
+    worker = WriteBehindWorker(enabled=True, delay_ms=0)
+    monkeypatch.setattr(services, 'write_behind', worker)
+    booking_service.compact_threshold = 2
+    booking_id, _ = booking_service.create_booking_request('1', 'alice', day(10), day(12))
+    booking_service.update_booking_status(booking_id, 'confirmed')
+    booking_service.update_booking_status(booking_id, 'pending')
+
+    # The request only queued the rewrite; the worker performs it
+    assert worker.flush(timeout=10)
+    assert len(read_csv_records(BOOKINGS_FILE)) == 1
+    assert booking_service.superseded_rows == 0
+    assert worker.status()['completed'] >= 1
+
+
+def test_threshold_compaction_is_inline_when_write_behind_is_disabled(booking_service):
+    booking_service.compact_threshold = 1
+    booking_id, _ = booking_service.create_booking_request('1', 'alice', day(10), day(12))
+    booking_service.update_booking_status(booking_id, 'confirmed')
+    assert len(read_csv_records(BOOKINGS_FILE)) == 1
+
+
+def _manual_db_sync(service, monkeypatch):
+    """Stops mutations from syncing the DB themselves (inline while write-behind is disabled)."""
+    monkeypatch.setattr(service, '_queue_db_sync', lambda: None)
+    services.sync_bookings_to_sqlite(service.lock) # Initial full export
+
+
+def _db_statuses():
+    conn = sqlite3.connect(DATABASE_FILE)
+    try:
+        return dict(conn.execute("SELECT booking_id, status FROM bookings"))
+    finally:
+        conn.close()
+
+
+def test_sqlite_sync_writes_the_db_outside_the_lock(booking_service, monkeypatch):
+    _manual_db_sync(booking_service, monkeypatch)
+    booking_id, _ = booking_service.create_booking_request('1', 'alice', day(10), day(12))
+    held_while_writing = []
+
+    def upsert(*args, **kwargs):
+        held_while_writing.append(booking_service.lock.held())
+        return upsert_bookings(*args, **kwargs)
+
+    monkeypatch.setattr(services, 'upsert_bookings', upsert)
+    services.sync_bookings_to_sqlite(booking_service.lock)
+    assert held_while_writing == [False]
+    assert _db_statuses() == {booking_id: 'pending'}
+
+
+def test_stale_sqlite_sync_does_not_overwrite_a_newer_one(booking_service, monkeypatch):
+    _manual_db_sync(booking_service, monkeypatch)
+    booking_id, _ = booking_service.create_booking_request('1', 'alice', day(10), day(12))
+    calls = []
+
+    def upsert(records, **kwargs):
+        if not calls: # Another process syncs (and moves on) between our snapshot and our write
+            calls.append('other')
+            booking_service.update_booking_status(booking_id, 'confirmed')
+            services.sync_bookings_to_sqlite(booking_service.lock)
+        calls.append('ours')
+        return upsert_bookings(records, **kwargs)
+
+    monkeypatch.setattr(services, 'upsert_bookings', upsert)
+    services.sync_bookings_to_sqlite(booking_service.lock)
+    assert calls == ['other', 'ours', 'ours']
+    assert _db_statuses() == {booking_id: 'confirmed'} # Our older snapshot was discarded, not written
+    assert read_sync_state()[0] == storage.stamp_to_text(storage.file_stamp(BOOKINGS_FILE))
+
+
+def test_conditional_upsert_checks_the_recorded_state(booking_service):
+    services.sync_bookings_to_sqlite(booking_service.lock)
+    state = read_sync_state()
+    row = {'booking_id': 'x', 'guesthouse_id': '1', 'username': 'alice', 'status': 'pending',
+           'start_date': day(1), 'end_date': day(2), 'booked_at': day(0)}
+    assert not upsert_bookings([row], stamp=(1, 2, 3), expected_state=('0:0:0', 0))
+    assert _db_statuses() == {}
+    assert upsert_bookings([row], stamp=(1, 2, 3), expected_state=state)
+    assert _db_statuses() == {'x': 'pending'}
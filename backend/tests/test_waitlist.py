@@ -0,0 +1,68 @@
+import pytest
+
+from app.storage import append_booking_rows
+
+from conftest import day, login
+
+
+def _request(client, headers, start, end, waitlist=False):
+    body = {'guesthouse_id': '1', 'start_date': day(start), 'end_date': day(end)}
+    if waitlist:
+        body['waitlist'] = True
+    return client.post('/api/bookings/request', json=body, headers=headers)
+
+
+def _status(client, headers, booking_id):
+    bookings = client.get('/api/bookings/my', headers=headers).get_json()
+    return next(booking['status'] for booking in bookings if booking['booking_id'] == booking_id)
+
+
+@pytest.fixture
+def blocked(backend, client):
+    """alice holds days 10-15 of guesthouse 1 and bob waits for days 12-13."""
+    alice, bob = login(client, 'alice'), login(client, 'bob')
+    response = _request(client, alice, 10, 15)
+    assert response.status_code == 201
+    assert _request(client, bob, 12, 13).status_code == 409
+
+    waiting = _request(client, bob, 12, 13, waitlist=True)
+    assert waiting.status_code == 202
+    assert waiting.get_json()['status'] == 'waitlisted'
+    return alice, bob, response.get_json()['booking_id'], waiting.get_json()['booking_id']
+
+
+def test_waitlist_on_free_dates_books_right_away(backend, client):
+    response = _request(client, login(client, 'alice'), 10, 15, waitlist=True)
+    assert response.status_code == 201
+    assert response.get_json()['status'] == 'pending'
+
+
+def test_duplicate_waitlist_entry_is_rejected(blocked, client):
+    _, bob, _, _ = blocked
+    assert _request(client, bob, 11, 12, waitlist=True).status_code == 409
+
+
+def test_cancel_promotes_waitlisted_request(blocked, client):
+    alice, bob, booking_id, waiting_id = blocked
+    assert client.post(f'/api/bookings/cancel/{booking_id}', headers=alice).status_code == 200
+    assert _status(client, bob, waiting_id) == 'pending'
+    # The promoted request now holds the dates
+    assert _request(client, alice, 13, 14).status_code == 409
+
+
+def test_reject_promotes_waitlisted_request(blocked, client):
+    _, bob, booking_id, waiting_id = blocked
+    admin = login(client, 'admin')
+    assert client.post(f'/api/admin/bookings/reject/{booking_id}', headers=admin).status_code == 200
+    assert _status(client, bob, waiting_id) == 'pending'
+
+
+@pytest.mark.parametrize('start, end', [('', ''), ('2030/01/01', '2030/01/05')])
+def test_cancelling_malformed_legacy_booking(backend, data_dir, start, end):
+    append_booking_rows([{'booking_id': 'legacy-1', 'guesthouse_id': '1', 'username': 'alice', 'status': 'pending',
+                          'start_date': start, 'end_date': end, 'booked_at': ''}])
+    from app import create_app
+    client = create_app().test_client()
+    alice = login(client, 'alice')
+    response = client.post('/api/bookings/cancel/legacy-1', headers=alice)
+    assert response.status_code == 200, response.get_json()
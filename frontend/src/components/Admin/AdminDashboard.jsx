@@ -1,10 +1,11 @@
 import React, { useState } from 'react';
 import AllBookingsTable from './AllBookingsTable';
 import PendingApprovalsTable from './PendingApprovalsTable';
+import ReportsPanel from './ReportsPanel';
 // import { exportDatabaseAdmin } from '../../services/api'; // No longer needed
 
 const AdminDashboard = () => {
-  const [activeTab, setActiveTab] = useState('pending'); // 'pending' or 'all'
+  const [activeTab, setActiveTab] = useState('pending'); // 'pending', 'all' or 'reports'
   // const [exportMessage, setExportMessage] = useState(''); // No longer needed for this button
 
   /* // This handler is no longer needed as the button is removed
@@ -56,11 +57,23 @@ const AdminDashboard = () => {
           >
             All Bookings
           </button>
+          <button
+            onClick={() => setActiveTab('reports')}
+            className={`${
+              activeTab === 'reports'
+                ? 'border-indigo-500 text-indigo-600'
+                : 'border-transparent text-gray-500 hover:text-gray-700 hover:border-gray-300'
+            } whitespace-nowrap py-4 px-1 border-b-2 font-medium text-sm focus:outline-none`}
+            aria-current={activeTab === 'reports' ? 'page' : undefined}
+          >
+            Reports
+          </button>
         </nav>
       </div>
 
       {activeTab === 'pending' && <PendingApprovalsTable />}
       {activeTab === 'all' && <AllBookingsTable />}
+      {activeTab === 'reports' && <ReportsPanel />}
     </div>
   );
 };
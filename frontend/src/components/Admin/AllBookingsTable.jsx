@@ -79,6 +79,7 @@ const AllBookingsTable = () => {
                         booking.status === 'pending' ? 'bg-yellow-100 text-yellow-800' :
                         booking.status === 'cancelled' ? 'bg-red-100 text-red-800' :
                         booking.status === 'rejected' ? 'bg-pink-100 text-pink-800' :
+                        booking.status === 'waitlisted' ? 'bg-blue-100 text-blue-800' :
                         'bg-gray-100 text-gray-800'
                       }`}
                     >
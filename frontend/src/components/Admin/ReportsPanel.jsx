@@ -0,0 +1,120 @@
+import React, { useState, useEffect, useCallback } from 'react';
+import { fetchOccupancyReport, fetchLeadTimeReport, fetchTurnaroundReport } from '../../services/api';
+
+const percent = (rate) => `${Math.round(rate * 1000) / 10}%`;
+
+const DistributionCard = ({ title, distribution }) => (
+  <div className="p-4 border border-gray-200 rounded-md bg-white">
+    <h3 className="font-semibold text-gray-700 mb-2">{title}</h3>
+    {distribution.bookings === 0 ? (
+      <p className="text-sm text-gray-500">No data yet.</p>
+    ) : (
+      <>
+        <p className="text-sm text-gray-600">
+          {distribution.bookings} bookings · mean {distribution.mean_days} days · median {distribution.p50_days} · p90 {distribution.p90_days}
+        </p>
+        <ul className="mt-2 text-xs text-gray-500 space-y-1">
+          {distribution.buckets.map((bucket) => (
+            <li key={bucket.days}>{bucket.days} days: {bucket.bookings}</li>
+          ))}
+        </ul>
+      </>
+    )}
+  </div>
+);
+
+const ReportsPanel = () => {
+  const [by, setBy] = useState('guesthouse'); // 'guesthouse' or 'location'
+  const [occupancy, setOccupancy] = useState(null);
+  const [leadTime, setLeadTime] = useState(null);
+  const [turnaround, setTurnaround] = useState(null);
+  const [loading, setLoading] = useState(true);
+  const [error, setError] = useState('');
+
+  const loadReports = useCallback(async () => {
+    try {
+      setLoading(true);
+      setError('');
+      // Occupancy for the last 12 months, lead time of live bookings, every recorded decision
+      const [occupancyResponse, leadTimeResponse, turnaroundResponse] = await Promise.all([
+        fetchOccupancyReport({ by }),
+        fetchLeadTimeReport({ status: 'confirmed,pending' }),
+        fetchTurnaroundReport(),
+      ]);
+      setOccupancy(occupancyResponse.data);
+      setLeadTime(leadTimeResponse.data);
+      setTurnaround(turnaroundResponse.data);
+    } catch (err) {
+      setError(err.response?.data?.msg || 'Failed to fetch reports.');
+      console.error(err);
+    } finally {
+      setLoading(false);
+    }
+  }, [by]);
+
+  useEffect(() => {
+    loadReports();
+  }, [loadReports]);
+
+  if (loading) return <p className="text-gray-600">Loading reports...</p>;
+  if (error) return <p className="text-red-500">{error}</p>;
+
+  return (
+    <div className="space-y-6">
+      <div className="card overflow-x-auto">
+        <div className="flex justify-between items-center mb-4">
+          <h2 className="text-xl font-semibold text-gray-700">
+            Occupancy {occupancy.from} to {occupancy.to}
+          </h2>
+          <select value={by} onChange={(e) => setBy(e.target.value)} className="input-field w-auto">
+            <option value="guesthouse">By guesthouse</option>
+            <option value="location">By location</option>
+          </select>
+        </div>
+        <table className="min-w-full divide-y divide-gray-200">
+          <thead className="bg-gray-50">
+            <tr>
+              <th className="px-4 py-3 text-left text-xs font-medium text-gray-500 uppercase tracking-wider">
+                {by === 'location' ? 'Location' : 'Guesthouse'}
+              </th>
+              <th className="px-4 py-3 text-left text-xs font-medium text-gray-500 uppercase tracking-wider">Period</th>
+              {occupancy.months.map((month) => (
+                <th key={month} className="px-2 py-3 text-left text-xs font-medium text-gray-500 uppercase tracking-wider">{month}</th>
+              ))}
+            </tr>
+          </thead>
+          <tbody className="bg-white divide-y divide-gray-200">
+            {occupancy.rows.map((row) => (
+              <tr key={row.guesthouse_id || row.location}>
+                <td className="px-4 py-3 whitespace-nowrap text-sm text-gray-900">
+                  {by === 'location' ? `${row.location} (${row.guesthouses})` : row.name || row.guesthouse_id}
+                </td>
+                <td className="px-4 py-3 whitespace-nowrap text-sm font-semibold text-gray-700">{percent(row.occupancy_rate)}</td>
+                {row.occupancy.map((rate, i) => (
+                  <td
+                    key={occupancy.months[i]}
+                    className="px-2 py-3 whitespace-nowrap text-xs text-gray-500"
+                    title={`${row.booked_days[i]} booked days, ${row.pending_days[i]} pending`}
+                  >
+                    {percent(rate)}
+                  </td>
+                ))}
+              </tr>
+            ))}
+          </tbody>
+        </table>
+      </div>
+
+      <div className="grid grid-cols-1 md:grid-cols-3 gap-4">
+        <DistributionCard title="Lead time (booking to arrival)" distribution={leadTime} />
+        <DistributionCard title="Approval turnaround" distribution={turnaround.confirmed} />
+        <DistributionCard title="Rejection turnaround" distribution={turnaround.rejected} />
+      </div>
+      {turnaround.tracked_since && (
+        <p className="text-xs text-gray-500">Decisions tracked since {turnaround.tracked_since}.</p>
+      )}
+    </div>
+  );
+};
+
+export default ReportsPanel;
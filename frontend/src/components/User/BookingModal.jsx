@@ -3,7 +3,7 @@ import DatePicker from 'react-datepicker'; // Import DatePicker
 import "react-datepicker/dist/react-datepicker.css"; // Import default styles
 import { format, parse, isValid, isBefore, startOfDay } from 'date-fns'; // For date manipulation
 
-const BookingModal = ({ isOpen, onClose, guesthouse, onSubmit, bookingStatus }) => {
+const BookingModal = ({ isOpen, onClose, guesthouse, onSubmit, onJoinWaitlist, bookingStatus }) => {
   // State will now hold Date objects for the pickers
   const [selectedStartDate, setSelectedStartDate] = useState(null);
   const [selectedEndDate, setSelectedEndDate] = useState(null);
@@ -18,20 +18,30 @@ const BookingModal = ({ isOpen, onClose, guesthouse, onSubmit, bookingStatus })
     }
   }, [isOpen, guesthouse]);
 
+  // Format Date objects to "dd-MM-yyyy" strings for submission; null if either is missing
+  const formattedDates = () => {
+    if (!selectedStartDate || !selectedEndDate) {
+      setLocalError('Both start and end dates are required.');
+      return null;
+    }
+    return [format(selectedStartDate, 'dd-MM-yyyy'), format(selectedEndDate, 'dd-MM-yyyy')];
+  };
+
   const handleSubmit = (e) => {
     e.preventDefault();
     setLocalError('');
-
-    if (!selectedStartDate || !selectedEndDate) {
-      setLocalError('Both start and end dates are required.');
-      return;
+    const dates = formattedDates();
+    if (dates) {
+      onSubmit(guesthouse.id, ...dates);
     }
+  };
 
-    // Format Date objects to "dd-MM-yyyy" string for submission
-    const formattedStartDate = format(selectedStartDate, 'dd-MM-yyyy');
-    const formattedEndDate = format(selectedEndDate, 'dd-MM-yyyy');
-    
-    onSubmit(guesthouse.id, formattedStartDate, formattedEndDate);
+  const handleJoinWaitlist = () => {
+    setLocalError('');
+    const dates = formattedDates();
+    if (dates) {
+      onJoinWaitlist(guesthouse.id, ...dates);
+    }
   };
 
   if (!isOpen) return null;
@@ -114,6 +124,16 @@ const BookingModal = ({ isOpen, onClose, guesthouse, onSubmit, bookingStatus })
               >
                 {bookingStatus.type === 'info' ? 'Processing...' : 'Request Booking'}
               </button>
+              {bookingStatus.canWaitlist && onJoinWaitlist && (
+                <button
+                  type="button"
+                  onClick={handleJoinWaitlist}
+                  className="btn-secondary w-full mb-2"
+                  disabled={!selectedStartDate || !selectedEndDate}
+                >
+                  Join Waitlist for These Dates
+                </button>
+              )}
               <button
                 type="button"
                 onClick={onClose}
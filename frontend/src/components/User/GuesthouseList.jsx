@@ -1,5 +1,5 @@
 import React, { useState, useEffect } from 'react';
-import { fetchGuesthouses, requestBooking } from '../../services/api';
+import { fetchGuesthouses, requestBooking, joinWaitlist } from '../../services/api';
 import GuesthouseCard from './GuesthouseCard';
 import BookingModal from './BookingModal';
 
@@ -9,7 +9,7 @@ const GuesthouseList = () => {
   const [error, setError] = useState('');
   const [selectedGuesthouse, setSelectedGuesthouse] = useState(null);
   const [isModalOpen, setIsModalOpen] = useState(false);
-  const [bookingStatus, setBookingStatus] = useState({ message: '', type: '' }); // 'success' or 'error'
+  const [bookingStatus, setBookingStatus] = useState({ message: '', type: '' }); // 'success' or 'error'; canWaitlist after a 409
 
   useEffect(() => {
     const loadGuesthouses = async () => {
@@ -49,7 +49,29 @@ const GuesthouseList = () => {
       // setSelectedGuesthouse(null);
       // You might want to refresh MyBookings or show a persistent success message
     } catch (err) {
-      setBookingStatus({ message: err.response?.data?.msg || 'Booking failed. Please check dates or availability.', type: 'error' });
+      const taken = err.response?.status === 409; // Dates already booked: offer the waitlist instead
+      setBookingStatus({
+        message: err.response?.data?.msg || 'Booking failed. Please check dates or availability.',
+        type: 'error',
+        canWaitlist: taken,
+      });
+      console.error(err);
+    }
+  };
+
+  const handleJoinWaitlist = async (guesthouseId, startDate, endDate) => {
+    try {
+      setBookingStatus({ message: 'Joining waitlist...', type: 'info' });
+      const response = await joinWaitlist({ guesthouse_id: guesthouseId, start_date: startDate, end_date: endDate });
+      const waitlisted = response.data.status === 'waitlisted';
+      setBookingStatus({
+        message: waitlisted
+          ? `${response.data.msg} You will be moved to pending automatically if the dates free up.`
+          : response.data.msg, // The dates freed up meanwhile, so it was booked right away
+        type: 'success',
+      });
+    } catch (err) {
+      setBookingStatus({ message: err.response?.data?.msg || 'Could not join the waitlist.', type: 'error' });
       console.error(err);
     }
   };
@@ -82,6 +104,7 @@ const GuesthouseList = () => {
           onClose={handleCloseModal}
           guesthouse={selectedGuesthouse}
           onSubmit={handleBookingSubmit}
+          onJoinWaitlist={handleJoinWaitlist}
           bookingStatus={bookingStatus} // Pass status to modal if needed for display there too
         />
       )}
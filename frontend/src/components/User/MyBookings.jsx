@@ -76,14 +76,20 @@ const MyBookings = () => {
                         booking.status === 'pending' ? 'text-yellow-600' :
                         booking.status === 'cancelled' ? 'text-red-600' :
                         booking.status === 'rejected' ? 'text-red-700' :
+                        booking.status === 'waitlisted' ? 'text-blue-600' :
                         'text-gray-600'
                       }`}
                     >
                       {booking.status.charAt(0).toUpperCase() + booking.status.slice(1)}
                     </span>
                   </p>
+                  {booking.status === 'waitlisted' && (
+                    <p className="text-xs text-gray-500">
+                      Moves to pending automatically if these dates free up.
+                    </p>
+                  )}
                 </div>
-                {(booking.status === 'pending' || booking.status === 'confirmed') && (
+                {(booking.status === 'pending' || booking.status === 'confirmed' || booking.status === 'waitlisted') && (
                   <button
                     onClick={() => handleCancel(booking.booking_id)}
                     className="btn-danger text-xs"
@@ -1,5 +1,6 @@
 import React, { createContext, useState, useContext, useEffect } from 'react';
 import { jwtDecode } from 'jwt-decode'; // Install: npm install jwt-decode
+import { logoutUser } from '../services/api';
 
 const AuthContext = createContext(null);
 
@@ -50,6 +51,10 @@ export const AuthProvider = ({ children }) => {
   };
 
   const logout = () => {
+    if (authState.token) {
+      // Best effort: the local sign-out below happens either way
+      logoutUser(authState.token).catch((error) => console.error("Logout request failed:", error));
+    }
     localStorage.removeItem('accessToken');
     setAuthState({
       token: null,
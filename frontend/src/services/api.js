@@ -21,12 +21,18 @@ apiClient.interceptors.request.use(
 
 // Auth Service
 export const loginUser = (credentials) => apiClient.post('/login', credentials);
+// Revokes the token server-side; passed explicitly because the caller clears localStorage right away
+export const logoutUser = (token) => apiClient.post('/logout', null, { headers: { Authorization: `Bearer ${token}` } });
 
 // Guesthouse Service
 export const fetchGuesthouses = () => apiClient.get('/guesthouses');
+// params: { from: 'DD-MM-YYYY', to: 'DD-MM-YYYY', location?: string }
+export const fetchAvailability = (params) => apiClient.get('/availability', { params });
 
 // Booking Service
 export const requestBooking = (bookingData) => apiClient.post('/bookings/request', bookingData);
+// Queues the request if the dates are taken (202, status 'waitlisted'); it is promoted to pending when they free up
+export const joinWaitlist = (bookingData) => apiClient.post('/bookings/request', { ...bookingData, waitlist: true });
 export const fetchMyBookings = () => apiClient.get('/bookings/my');
 export const cancelUserBooking = (bookingId) => apiClient.post(`/bookings/cancel/${bookingId}`);
 
@@ -35,6 +41,17 @@ export const fetchAllBookingsAdmin = () => apiClient.get('/admin/bookings/all');
 export const fetchPendingBookingsAdmin = () => apiClient.get('/admin/bookings/pending');
 export const approveBookingAdmin = (bookingId) => apiClient.post(`/admin/bookings/approve/${bookingId}`);
 export const rejectBookingAdmin = (bookingId) => apiClient.post(`/admin/bookings/reject/${bookingId}`);
+export const bulkImportBookingsAdmin = (bookings) => apiClient.post('/admin/bookings/bulk-import', { bookings });
+export const bulkStatusAdmin = ({ approve = [], reject = [] }) => apiClient.post('/admin/bookings/bulk-status', { approve, reject });
 export const exportDatabaseAdmin = () => apiClient.post('/admin/export-db');
+export const revokeUserTokensAdmin = (username) => apiClient.post(`/admin/users/${encodeURIComponent(username)}/revoke-tokens`);
+
+// Admin Reports
+// params: { from?: 'DD-MM-YYYY', to?: 'DD-MM-YYYY', by?: 'guesthouse' | 'location', location?: string }
+export const fetchOccupancyReport = (params) => apiClient.get('/admin/reports/occupancy', { params });
+// params: { status?: 'confirmed,pending', location?: string }
+export const fetchLeadTimeReport = (params) => apiClient.get('/admin/reports/lead-time', { params });
+// params: { from?: 'DD-MM-YYYY', to?: 'DD-MM-YYYY' } (decision dates)
+export const fetchTurnaroundReport = (params) => apiClient.get('/admin/reports/turnaround', { params });
 
 export default apiClient;
\ No newline at end of file